@@ -0,0 +1,86 @@
+# app/Model/async_base_model.py
+from typing import Any, Dict, List, Optional
+
+from app.Model.exceptions import DatabaseError
+from app.Model.http_session import get_async_client
+from app.Model.query import Query
+from app.Model.write_buffer import flush_pending
+
+
+class AsyncBaseModel:
+    """
+    Contraparte async (httpx) de BaseModel para las lecturas calientes del turno.
+    - Mismo esquema, URLs, headers y clase de fila que el modelo sync (`model_class`):
+      las consultas se arman con el mismo Query builder y devuelven los mismos *Register.
+    - Transporte: AsyncClient compartido (http_session.get_async_client).
+    - Desde código sync: http_session.gather_sync(a(), b(), ...) para hacer fan-out.
+
+        contacto, consent = gather_sync(
+            AsyncContacts().get_by_phone(phone),
+            AsyncPrivacyConsents().has_consent(dni_hash),
+        )
+    """
+    model_class: type = None  # BaseModel sync de la tabla (lo define cada subclase)
+
+    def __init__(self):
+        self.sync = self.model_class()
+        self.table_name = self.sync.table_name
+        self.headers = self.sync.headers
+        self.row_class = self.sync.row_class
+
+    def query(self) -> Query:
+        return self.sync.query()
+
+    async def rows(self, q: Query) -> List[Dict[str, Any]]:
+        """Ejecuta un Query y devuelve las filas crudas (dicts)."""
+        flush_pending(self.table_name)  # read-your-writes (solo si el caller comparte el contexto del turno)
+        r = await get_async_client().get(q.url(), headers=self.headers)
+        if r.status_code >= 400:
+            raise DatabaseError(f"Error al consultar {self.table_name}: {r.status_code}, {r.text}")
+        return r.json() or []
+
+    async def all(self, q: Query) -> List[Any]:
+        return self.sync._to_registers(await self.rows(q))
+
+    async def first(self, q: Query) -> Optional[Any]:
+        rows = await self.all(q.limit(1))
+        return rows[0] if rows else None
+
+    async def exists(self, q: Query) -> bool:
+        if not any(k == "select" for k, _ in q.params()):
+            q.select(self.sync.select_columns().split(",")[0])
+        return bool(await self.rows(q.limit(1)))
+
+    def _filtered(self, fields: Dict[str, Any], order_field: Optional[str] = None,
+                  select: Optional[str] = None) -> Query:
+        # Mismas validaciones que BaseModel.get_with_multiple_fields
+        for field, value in fields.items():
+            self.sync._check_filter(field, value)
+        self.sync._check_select(select)
+        q = self.query()
+        if select:
+            q.select(select)
+        for field, value in fields.items():
+            q.where(field, value)
+        if order_field:
+            q.order(order_field)
+        return q
+
+    async def get(self, field: str, value: Any, order_field: str = None,
+                  limit: Optional[int] = None, select: Optional[str] = None) -> Optional[List[Any]]:
+        """Igual que BaseModel.get: lista de *Register o None si no hay filas."""
+        try:
+            q = self._filtered({field: value}, order_field, select)
+            if limit is not None:
+                q.limit(limit)
+            return await self.all(q) or None
+        except Exception as e:
+            raise DatabaseError(f"Error al obtener registro por {field} en {self.table_name}: {e}")
+
+    async def get_one(self, fields: Dict[str, Any], order_field: str,
+                      select: Optional[str] = None) -> Optional[Any]:
+        """Igual que BaseModel.get_one: 1 fila (limit=1 en PostgREST) o None."""
+        try:
+            return await self.first(self._filtered(fields, order_field, select))
+        except Exception as e:
+            raise DatabaseError(f"Error al obtener registros en {self.table_name}: {e}")
@@ -1,10 +1,13 @@
 import os
-import requests
 from typing import Optional, List, Dict, Any
 from dotenv import load_dotenv
 import sys
 
 from app.Model.connection import DatabaseManager
+from app.Model.http_session import get_session
+from app.Model.query import Query
+from app.Model.rows import Row, row_class_for
+from app.Model.write_buffer import current_buffer, flush_pending
 from app.Model.field import Field
 from app.Model.enums import *
 from app.Model.exceptions import (
@@ -23,10 +26,18 @@ SUPABASE_API_KEY = os.getenv("SUPABASE_API_KEY")
 
 
 class BaseModel:
+    # True -> add() se encola en el write_buffer del turno si hay uno activo (ver write_buffer.py)
+    buffer_writes = False
+
     def __init__(self, table_name: str, data: Dict[str, Any]) -> None:
         self.table_name = table_name
         self.__data = data
         self.base_url = f"{SUPABASE_URL}/rest/v1/{self.table_name}"
+        # Clase de fila generada 1 vez por tabla desde el esquema (hereda del *Register legado si existe)
+        register_name = f"{snake_to_camel(self.table_name.capitalize())}Register"
+        self.row_class = row_class_for(register_name, data, globals().get(register_name))
+        # Session HTTP compartida (keep-alive + pool + timeouts + reintentos)
+        self.session = get_session()
         self.headers = {
             "apikey": SUPABASE_API_KEY,
             "Authorization": f"Bearer {SUPABASE_API_KEY}",
@@ -40,7 +51,11 @@ class BaseModel:
             if not fields:
                 raise Exception("No hay datos para actualizar.")
             payload = {field: value for field, value in zip(fields, params)}
-            r = requests.post(self.base_url, headers=self.headers, json=payload)
+            buf = current_buffer() if self.buffer_writes else None
+            if buf is not None:
+                # Se inserta en el flush del turno; .id fuerza el flush si alguien lo necesita ya
+                return buf.queue(self, payload)
+            r = self.session.post(self.base_url, headers=self.headers, json=payload)
             if r.status_code >= 400:
                 raise Exception(f"Error: {r.status_code}, {r.text}")
             response_data = r.json()
@@ -55,90 +70,118 @@ class BaseModel:
         except Exception as e:
             raise DatabaseError(f"Error al crear registro en {self.table_name}: {e}")
 
-    def get(self, field: str, value: Any, order_field: str = None) -> Optional[List[Any]]:
+    def _check_filter(self, field: str, value: Any) -> None:
+        if field not in self.__data:
+            raise ValidationError(f"El campo {field} no existe.", field=field, value=value)
+        if not validate(value, self.__data[field].data_type, self.__data[field].optional):
+            raise ValidationError(f"El {field} debe ser de tipo {self.__data[field].data_type}.",
+                                  field=field, value=value)
+
+    def _check_select(self, select: Optional[str]) -> None:
+        # Proyección tipo PostgREST: "id,name,timestamp" (o "*")
+        if not select or select == "*":
+            return
+        for col in select.split(","):
+            col = col.strip()
+            if col not in self.__data:
+                raise ValidationError(f"El campo {col} no existe.", field=col, value=select)
+
+    def query(self) -> Query:
+        """
+        Builder PostgREST (select/where/order/limit/range) sobre esta tabla.
+        Ver app/Model/query.py.
+        """
+        return Query(self)
+
+    def _build_query_url(self, filters: Dict[str, Any], order_field: str = None,
+                         limit: Optional[int] = None, select: Optional[str] = None) -> str:
+        """
+        Arma la URL PostgREST (valores encodeados): filtros eq. (AND), select=,
+        order= (ej: "timestamp.desc,id.desc") y limit=.
+        """
+        q = self.query()
+        if select:
+            q.select(select)
+        for field, value in filters.items():
+            q.where(field, value)
+        if order_field:
+            q.order(order_field)
+        if limit is not None:
+            q.limit(limit)
+        return q.url()
+
+    def _to_registers(self, records: List[Dict[str, Any]]) -> List[Any]:
+        # Envuelve cada dict de la respuesta sin copiarlo
+        wrap = self.row_class.wrap
+        return [wrap(record) for record in records]
+
+    def get(self, field: str, value: Any, order_field: str = None,
+            limit: Optional[int] = None, select: Optional[str] = None) -> Optional[List[Any]]:
         try:
-            if field not in self.__data:
-                raise ValidationError(f"El campo {field} no existe.", field=field, value=value)
-            if not validate(value, self.__data[field].data_type, self.__data[field].optional):
-                raise ValidationError(f"El {field} debe ser de tipo {self.__data[field].data_type}.",
-                                      field=field, value=value)
-            url = f"{self.base_url}?{field}=eq.{value}"
-            if order_field:
-                url += f"&order={order_field}"
-            r = requests.get(url, headers=self.headers)
+            self._check_filter(field, value)
+            self._check_select(select)
+            url = self._build_query_url({field: value}, order_field, limit, select)
+            flush_pending(self.table_name)
+            r = self.session.get(url, headers=self.headers)
             if r.status_code >= 400:
                 raise DatabaseError(f"Error al obtener registro por {field} en {self.table_name}: {r.status_code}, {r.text}")
             records = r.json()
             if not records:
                 return None
-            result_objects = []
-            for record in records:
-                class_name = f"{snake_to_camel(self.table_name.capitalize())}Register"
-                if class_name in globals():
-                    record_obj = globals()[class_name](**record)
-                    result_objects.append(record_obj)
-                else:
-                    raise ValueError(f"Clase {class_name} no encontrada.")
-            return result_objects
+            return self._to_registers(records)
         except Exception as e:
             raise DatabaseError(f"Error al obtener registro por {field} en {self.table_name}: {e}")
 
     def get_all(self, order_field: str = None) -> List[Any]:
         try:
-            url = f"{self.base_url}?select=*"
+            q = self.query()
             if order_field:
-                url += f"&order={order_field}"
-            r = requests.get(url, headers=self.headers)
+                q.order(order_field)
+            url = q.url()
+            flush_pending(self.table_name)
+            r = self.session.get(url, headers=self.headers)
             if r.status_code >= 400:
                 raise DatabaseError(f"Error al obtener todos los registros de {self.table_name}: {r.status_code}, {r.text}")
             records = r.json()
             if not records:
                 return []
-            result_objects = []
-            for record in records:
-                class_name = f"{snake_to_camel(self.table_name.capitalize())}Register"
-                if class_name in globals():
-                    record_obj = globals()[class_name](**record)
-                    result_objects.append(record_obj)
-                else:
-                    raise ValueError(f"Clase {class_name} no encontrada.")
-            return result_objects
+            return self._to_registers(records)
         except Exception as e:
             raise DatabaseError(f"Error al obtener todos los registros de {self.table_name}: {e}")
 
-    def get_with_multiple_fields(self, fields: Dict[str, Any], order_field: str = None) -> Optional[List[Any]]:
+    def get_with_multiple_fields(self, fields: Dict[str, Any], order_field: str = None,
+                                 limit: Optional[int] = None, select: Optional[str] = None) -> Optional[List[Any]]:
         try:
-            filter_str = ""
             for field, value in fields.items():
-                if field not in self.__data:
-                    raise ValidationError(f"El campo {field} no existe.", field=field, value=value)
-                if not validate(value, self.__data[field].data_type, self.__data[field].optional):
-                    raise ValidationError(f"El {field} debe ser de tipo {self.__data[field].data_type}.",
-                                          field=field, value=value)
-                filter_str += f"{field}=eq.{value}&"
-            if filter_str.endswith("&"):
-                filter_str = filter_str[:-1]
-            url = f"{self.base_url}?{filter_str}"
-            if order_field:
-                url += f"&order={order_field}"
-            r = requests.get(url, headers=self.headers)
+                self._check_filter(field, value)
+            self._check_select(select)
+            url = self._build_query_url(fields, order_field, limit, select)
+            flush_pending(self.table_name)
+            r = self.session.get(url, headers=self.headers)
             if r.status_code >= 400:
                 raise DatabaseError(f"Error al obtener registros en {self.table_name}: {r.status_code}, {r.text}")
             records = r.json()
             if not records:
                 return None
-            result_objects = []
-            for record in records:
-                class_name = f"{snake_to_camel(self.table_name.capitalize())}Register"
-                if class_name in globals():
-                    record_obj = globals()[class_name](**record)
-                    result_objects.append(record_obj)
-                else:
-                    raise ValueError(f"Clase {class_name} no encontrada.")
-            return result_objects
+            return self._to_registers(records)
         except Exception as e:
             raise DatabaseError(f"Error al obtener registros con múltiples campos en {self.table_name}: {e}")
 
+    def get_one(self, fields: Dict[str, Any], order_field: str, select: Optional[str] = None) -> Optional[Any]:
+        """
+        Primera fila según order_field (ej: "timestamp.desc,id.desc" = la más reciente).
+        El filtrado/orden/corte lo hace PostgREST (limit=1): viaja una sola fila.
+        """
+        rows = self.get_with_multiple_fields(fields, order_field=order_field, limit=1, select=select)
+        return rows[0] if rows else None
+
+    def select_columns(self, exclude: tuple = ()) -> str:
+        """
+        Lista "a,b,c" de columnas del modelo para select=, sin las de `exclude`
+        (ej: traer una TX sin el JSON pesado de `conversation`).
+        """
+        return ",".join(name for name in self.__data if name not in exclude)
+
     def update(self, unique_field_name: str, unique_field_value: Any) -> None:
         try:
             fields, params = get_fields_and_params(self.__data, for_update=True)
@@ -146,8 +189,8 @@ class BaseModel:
                 raise ValidationError("No hay datos para actualizar.", field=None, value=None)
             actual_fields = [field.replace(" = %s", "") for field in fields]
             payload = {field: value for field, value in zip(actual_fields, params)}
-            url = f"{self.base_url}?{unique_field_name}=eq.{unique_field_value}"
-            r = requests.patch(url, headers=self.headers, json=payload)
+            url = self.query().where(unique_field_name, unique_field_value).url()
+            r = self.session.patch(url, headers=self.headers, json=payload)
             if r.status_code >= 400:
                 error_text = r.text
                 for field, field_obj in self.__data.items():
@@ -171,7 +214,8 @@ class BaseModel:
             "Authorization": f"Bearer {os.environ.get('SUPABASE_API_KEY')}",
             "Content-Type": "application/json"
         }
-        response = requests.get(url, headers=headers)
+        flush_pending(self.table_name)
+        response = self.session.get(url, headers=headers)
         try:
             data = response.json()
             if isinstance(data, list):
@@ -188,7 +232,8 @@ class BaseModel:
                 "Authorization": f"Bearer {os.environ.get('SUPABASE_KEY')}",
                 "Content-Type": "application/json"
             }
-            response = requests.get(url, headers=headers)
+            flush_pending(self.table_name)
+            response = self.session.get(url, headers=headers)
             data = response.json()
             
             return data[0] if data else None
@@ -202,8 +247,8 @@ class BaseModel:
             if not validate(value, self.__data[field].data_type, self.__data[field].optional):
                 raise ValidationError(f"El {field} debe ser de tipo {self.__data[field].data_type}.",
                                       field=field, value=value)
-            url = f"{self.base_url}?{field}=eq.{value}"
-            r = requests.delete(url, headers=self.headers)
+            url = self.query().where(field, value).url()
+            r = self.session.delete(url, headers=self.headers)
             if r.status_code >= 400:
                 raise DatabaseError(f"Error al eliminar registro en {self.table_name}: {r.status_code}, {r.text}")
             if not r.json():
@@ -225,7 +270,7 @@ class BaseModel:
                 prefer = f"{prefer},resolution=merge-duplicates"
             headers["Prefer"] = prefer
 
-            r = requests.post(url, headers=headers, json=row, timeout=10)
+            r = self.session.post(url, headers=headers, json=row, timeout=10)
             if r.status_code >= 400:
                 raise DatabaseError(f"Upsert error {r.status_code}: {r.text}")
             data = r.json()
@@ -235,113 +280,42 @@ class BaseModel:
 
 
 
-# Definición de la clase UsersRegister para convertir registros de la tabla "users"
-class UsersRegister:
-
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
-
-    def __repr__(self):
-        return f"UsersRegister({self.__dict__})"
-
-globals()["UsersRegister"] = UsersRegister
-
-# --- DEFINICIÓN DE LA CLASE ContactsRegister ---
-class ContactsRegister:
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
-    def __repr__(self):
-        return f"ContactsRegister({self.__dict__})"
-
-# Registrar ContactsRegister en globals() para asegurar su disponibilidad global
-globals()["ContactsRegister"] = ContactsRegister
-
-
-
-
-
-class TransactionsRegister:
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
-    def __repr__(self):
-        return f"TransactionsRegister({self.__dict__})"
-
-# Register the class in globals() so that BaseModel can find it
-globals()["TransactionsRegister"] = TransactionsRegister
-
-
-class MessagesRegister:
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
-    def __repr__(self):
-        return f"MessagesRegister({self.__dict__})"
-
-# Register the class in globals() so that BaseModel can find it
-globals()["MessagesRegister"] = MessagesRegister
-
-class LogRegister:
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
-    def __repr__(self):
-        return f"LogRegister({self.__dict__})"
-
-# Register the class in globals() so that BaseModel can find it
-globals()["LogRegister"] = LogRegister
+# *Register legados: hoy son bases slotted de las filas que genera rows.row_class_for
+# (se mantienen por isinstance / imports existentes y por XxxRegister(**kwargs)).
 
+class UsersRegister(Row):
+    __slots__ = ()
 
-class EngineRegister:
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
-    def __repr__(self):
-        return f"EngineRegister({self.__dict__})"
+class ContactsRegister(Row):
+    __slots__ = ()
 
-# Register the class in globals() so that BaseModel can find it
-globals()["EngineRegister"] = EngineRegister
+class TransactionsRegister(Row):
+    __slots__ = ()
 
-class QuestionsRegister:
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
-    def __repr__(self):
-        return f"QuestionsRegister({self.__dict__})"
-globals()["QuestionsRegister"] = QuestionsRegister
-
-
-class EventsRegister:
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
-    def __repr__(self):
-        return f"EventsRegister({self.__dict__})"
-
-# Registrar en globals para que BaseModel la encuentre
-globals()["EventsRegister"] = EventsRegister
-
-
-class TransactionsRegister:
     def __init__(self, **kwargs):
         # Soporte retrocompatible con '_id'
         if "_id" in kwargs:
             kwargs["id"] = kwargs.pop("_id")
-        self.__dict__.update(kwargs)
+        super().__init__(**kwargs)
 
-    def __repr__(self):
-        return f"TransactionsRegister({self.__dict__})"
-    
+class MessagesRegister(Row):
+    __slots__ = ()
 
-#  CoveragesRegister (para la tabla 'coverages')
-class CoveragesRegister:
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
-    def __repr__(self):
-        return f"CoveragesRegister({self.__dict__})"
-globals()["CoveragesRegister"] = CoveragesRegister
+class LogRegister(Row):
+    __slots__ = ()
 
+class EngineRegister(Row):
+    __slots__ = ()
 
-class PrivacyConsentsRegister:
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
+class QuestionsRegister(Row):
+    __slots__ = ()
 
-    def __repr__(self):
-        return f"PrivacyConsentsRegister({self.__dict__})"
+class EventsRegister(Row):
+    __slots__ = ()
 
-globals()["PrivacyConsentsRegister"] = PrivacyConsentsRegister
+#  CoveragesRegister (para la tabla 'coverages')
+class CoveragesRegister(Row):
+    __slots__ = ()
 
+class PrivacyConsentsRegister(Row):
+    __slots__ = ()
@@ -1,8 +1,10 @@
 import os
-import requests
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
 
+from app.Model.http_session import get_session
+from app.Model.exceptions import DatabaseError, RpcNotFoundError
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -12,6 +14,8 @@ class DatabaseManager:
     def __init__(self):
         # Base URL para la REST API de Supabase (PostgREST)
         self.base_url = f"{SUPABASE_URL}/rest/v1"
+        # Misma session compartida que BaseModel (pool de conexiones keep-alive)
+        self.session = get_session()
         self.headers = {
             "apikey": SUPABASE_API_KEY,
             "Authorization": f"Bearer {SUPABASE_API_KEY}",
@@ -31,7 +35,7 @@ class DatabaseManager:
         if params:
             filters = [f"{key}=eq.{value}" for key, value in params.items()]
             url += "&" + "&".join(filters)
-        r = requests.get(url, headers=self.headers)
+        r = self.session.get(url, headers=self.headers)
         if r.status_code >= 400:
             raise Exception(f"Error en fetch_one: {r.status_code}, {r.text}")
         data = r.json()
@@ -50,7 +54,7 @@ class DatabaseManager:
         if params:
             filters = [f"{key}=eq.{value}" for key, value in params.items()]
             url += "&" + "&".join(filters)
-        r = requests.get(url, headers=self.headers)
+        r = self.session.get(url, headers=self.headers)
         if r.status_code >= 400:
             raise Exception(f"Error en fetch_all: {r.status_code}, {r.text}")
         data = r.json()
@@ -73,17 +77,33 @@ class DatabaseManager:
             url += "?" + "&".join(filters)
         method = method.upper()
         if method == "POST":
-            r = requests.post(url, headers=self.headers, json=payload)
+            r = self.session.post(url, headers=self.headers, json=payload)
         elif method == "PATCH":
-            r = requests.patch(url, headers=self.headers, json=payload)
+            r = self.session.patch(url, headers=self.headers, json=payload)
         elif method == "DELETE":
-            r = requests.delete(url, headers=self.headers)
+            r = self.session.delete(url, headers=self.headers)
         else:
             raise ValueError("Método no soportado, use POST, PATCH o DELETE.")
         if r.status_code >= 400:
             raise Exception(f"Error en execute_command: {r.status_code}, {r.text}")
         return r.json() if r.text else None
 
+    def rpc(self, fn: str, params: Optional[Dict] = None):
+        """
+        Llama a una función de Postgres expuesta por PostgREST (POST /rest/v1/rpc/<fn>).
+        :param fn: Nombre de la función (ver app/Model/sql/).
+        :param params: Argumentos nombrados de la función.
+        :return: El JSON devuelto por la función.
+        :raises RpcNotFoundError: Si la función no existe (SQL sin aplicar).
+        """
+        url = f"{self.base_url}/rpc/{fn}"
+        r = self.session.post(url, headers=self.headers, json=params or {})
+        if r.status_code == 404 or (r.status_code >= 400 and "PGRST202" in r.text):
+            raise RpcNotFoundError(f"Función RPC {fn} no encontrada: {r.status_code}, {r.text}")
+        if r.status_code >= 400:
+            raise DatabaseError(f"Error en rpc {fn}: {r.status_code}, {r.text}")
+        return r.json() if r.text else None
+
     def close_connection(self):
         """
         No es necesario cerrar conexión en una API REST.
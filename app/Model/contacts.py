@@ -1,6 +1,7 @@
 from typing import Optional, List, Dict
 from app.Model.enums import DataType
 from app.Model.base_model import BaseModel, ContactsRegister
+from app.Model.async_base_model import AsyncBaseModel
 from app.Model.field import Field
 from app.Model.exceptions import DatabaseError
 
@@ -192,6 +193,17 @@ class Contacts(BaseModel):
             raise DatabaseError(f"Error en set_coverage: {e}")
 
 
+class AsyncContacts(AsyncBaseModel):
+    """Lecturas calientes de contacts en async (ver async_base_model.py)."""
+    model_class = Contacts
+
+    async def get_by_phone(self, phone: str) -> Optional[ContactsRegister]:
+        try:
+            result = await self.get("phone", phone, limit=1)
+            return result[0] if result else None
+        except Exception as e:
+            raise DatabaseError(f"Error en get_by_phone: {e}")
+
 
 
 
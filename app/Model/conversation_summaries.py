@@ -0,0 +1,43 @@
+# app/Model/conversation_summaries.py
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from app.Model.base_model import BaseModel, Field, DataType
+
+
+class ConversationSummaries(BaseModel):
+    """Resumen clínico incremental de la conversación, por TX (ver app/Model/sql/conversation_summaries.sql)."""
+
+    def __init__(self):
+        data = {
+            "tx_id":          Field(None, DataType.INTEGER,   False, True),   # PK: 1 fila por TX
+            "summary":        Field(None, DataType.STRING,    False, False),
+            "covered_until":  Field(None, DataType.INTEGER,   False, False),  # índice (exclusivo) del historial resumido
+            "covered_sha256": Field(None, DataType.STRING,    True,  False),  # hash de history[:covered_until]
+            "updated_at":     Field(None, DataType.TIMESTAMP, True,  False),
+        }
+        super().__init__("conversation_summaries", data)
+        self.data = self._BaseModel__data
+
+    def get_for_tx(self, tx_id: int) -> Optional[Any]:
+        return self.query().select("tx_id", "summary", "covered_until", "covered_sha256").where("tx_id", tx_id).first()
+
+    def save(self, tx_id: int, summary: str, covered_until: int, covered_sha256: str,
+             replace: bool = False) -> bool:
+        """
+        Guarda el resumen solo si cubre más historial que el que ya está (dos folds en paralelo:
+        gana el más largo). Devuelve False si ya había uno igual o más nuevo.
+        replace=True pisa lo que haya (el resumen guardado era de un historial que se reescribió).
+        """
+        payload = {"summary": summary, "covered_until": covered_until, "covered_sha256": covered_sha256,
+                   "updated_at": datetime.now(timezone.utc).isoformat()}
+        if replace:
+            self.upsert({"tx_id": tx_id, **payload}, on_conflict="tx_id")
+            return True
+        if self.query().where("tx_id", tx_id).where("covered_until", covered_until, op="lt").update(payload):
+            return True
+        if self.query().where("tx_id", tx_id).exists():
+            return False
+        self.upsert({"tx_id": tx_id, "summary": summary, "covered_until": covered_until,
+                     "covered_sha256": covered_sha256}, on_conflict="tx_id")
+        return True
@@ -0,0 +1,139 @@
+# app/Model/conversation_turns.py
+import os
+from typing import Any, Dict, List, Optional
+
+from app.Model.base_model import BaseModel, Field, DataType, SUPABASE_URL
+from app.Model.exceptions import DatabaseError, RpcNotFoundError
+
+# Historial incremental (app/Model/sql/conversation_turns.sql). "0" lo apaga y se vuelve
+# a reescribir transactions.conversation entero en cada turno.
+PX_CONVERSATION_TURNS = os.getenv("PX_CONVERSATION_TURNS", "1") == "1"
+COMPAT_VIEW = "transactions_conversation"
+REWRITE_RPC_NAME = "px_rewrite_conversation"
+_turns_missing = False  # por proceso: si la tabla no está instalada no se reintenta en cada turno
+_rewrite_rpc_missing = False
+
+
+def _is_missing_relation(r) -> bool:
+    # PostgREST: 404 + PGRST205 (tabla/vista fuera del schema cache) o 42P01 (no existe)
+    return r.status_code == 404 or "PGRST205" in r.text or "42P01" in r.text
+
+
+def merge_turns(base: List[Any], turns: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Rearma el historial: base (transactions.conversation) + turns ordenados por seq.
+    Un turn con seq < largo actual ya está incluido en la base (reescritura completa posterior) -> se ignora.
+    """
+    history = list(base or [])
+    for turn in sorted(turns, key=lambda t: t.get("seq") or 0):
+        if (turn.get("seq") or 0) < len(history):
+            continue
+        history.append(turn.get("message"))
+    return history
+
+
+def conversation_delta(persisted: Optional[List[Any]], history: List[Any]) -> Optional[List[Any]]:
+    """
+    Mensajes nuevos de `history` respecto de lo que ya está en DB (`persisted`).
+    None si no se puede expresar como append (sin referencia, o un nodo reescribió mensajes viejos).
+    """
+    if persisted is None:
+        return None
+    n = len(persisted)
+    if len(history) < n or history[:n] != persisted:
+        return None
+    return history[n:]
+
+
+class ConversationTurns(BaseModel):
+    def __init__(self):
+        data = {
+            "id":         Field(None, DataType.INTEGER,   False, True),
+            "tx_id":      Field(None, DataType.INTEGER,   False, False),
+            "seq":        Field(None, DataType.INTEGER,   False, False),  # índice del mensaje en el historial
+            "message":    Field(None, DataType.JSON,      False, False),  # {"role": ..., "content": ...}
+            "created_at": Field(None, DataType.TIMESTAMP, True,  False),
+        }
+        super().__init__("conversation_turns", data)
+        self.data = self._BaseModel__data
+
+    @staticmethod
+    def enabled() -> bool:
+        return PX_CONVERSATION_TURNS and not _turns_missing
+
+    @staticmethod
+    def _mark_missing() -> None:
+        global _turns_missing
+        _turns_missing = True
+
+    def append(self, tx_id: int, start_seq: int, messages: List[Any]) -> int:
+        """
+        Inserta los mensajes nuevos de la TX en UN POST bulk (seq = start_seq, start_seq+1, ...).
+        Es atómico: o entran todos o ninguno. Devuelve la cantidad insertada.
+        """
+        if not messages:
+            return 0
+        rows = [{"tx_id": tx_id, "seq": start_seq + i, "message": m} for i, m in enumerate(messages)]
+        r = self.session.post(self.base_url, headers=self.headers, json=rows)
+        if r.status_code >= 400:
+            if _is_missing_relation(r):
+                self._mark_missing()
+            raise DatabaseError(f"Error al insertar en {self.table_name}: {r.status_code}, {r.text}")
+        return len(rows)
+
+    def list_by_tx(self, tx_id: int) -> List[Dict[str, Any]]:
+        """Turns de la TX ordenados por seq (dicts crudos: seq + message)."""
+        url = self.query().select("seq", "message").where("tx_id", tx_id).order("seq").url()
+        r = self.session.get(url, headers=self.headers)
+        if r.status_code >= 400:
+            if _is_missing_relation(r):
+                self._mark_missing()
+                return []
+            raise DatabaseError(f"Error al consultar {self.table_name}: {r.status_code}, {r.text}")
+        return r.json() or []
+
+    def clear(self, tx_id: int) -> None:
+        """Borra los turns de la TX (después de reescribir transactions.conversation entero)."""
+        r = self.session.delete(f"{self.base_url}?tx_id=eq.{int(tx_id)}", headers=self.headers)
+        if r.status_code >= 400:
+            if _is_missing_relation(r):
+                self._mark_missing()
+                return
+            raise DatabaseError(f"Error al borrar en {self.table_name}: {r.status_code}, {r.text}")
+
+    def rewrite(self, tx_id: int, conversation: str) -> bool:
+        """
+        Reescritura completa atómica: transactions.conversation = conversation y se borran los turns
+        de la TX en la misma transacción (RPC px_rewrite_conversation). False si la TX no existe.
+        RpcNotFoundError si la función no está instalada (el caller hace PATCH + clear en ese orden).
+        """
+        global _rewrite_rpc_missing
+        if _rewrite_rpc_missing:
+            raise RpcNotFoundError(f"Función RPC {REWRITE_RPC_NAME} no instalada")
+        from app.Model.connection import DatabaseManager
+        try:
+            return bool(DatabaseManager().rpc(REWRITE_RPC_NAME, {"p_tx_id": int(tx_id), "p_conversation": conversation}))
+        except RpcNotFoundError:
+            _rewrite_rpc_missing = True
+            raise
+
+    def load_history(self, tx_id: int, base: List[Any]) -> List[Any]:
+        """Historial completo de la TX a partir de su base ya leída (1 GET, solo si hay turns habilitados)."""
+        if not self.enabled():
+            return list(base or [])
+        return merge_turns(base, self.list_by_tx(tx_id))
+
+    def conversation_text(self, tx_id: int) -> Optional[str]:
+        """
+        `conversation` completo (texto JSON) desde la vista de compatibilidad, en 1 GET.
+        None si la vista no está instalada (el caller usa transactions.conversation).
+        """
+        url = f"{SUPABASE_URL}/rest/v1/{COMPAT_VIEW}?select=conversation&id=eq.{int(tx_id)}"
+        r = self.session.get(url, headers=self.headers)
+        if r.status_code >= 400:
+            if _is_missing_relation(r):
+                self._mark_missing()
+                return None
+            raise DatabaseError(f"Error al consultar {COMPAT_VIEW}: {r.status_code}, {r.text}")
+        rows = r.json() or []
+        return (rows[0].get("conversation") or "") if rows else ""
@@ -133,12 +133,13 @@ class Coverages(BaseModel):
                     if self._norm_key(raw_name) == key:
                         return r
 
-            # 2) Tu lógica original
-            exact = self.get_by_name_exact(name)
-            if exact:
-                return exact
-
+            # 2) Tu lógica original (sobre las mismas filas, sin volver a leer la tabla)
             needle = self._norm_name(name)
+            for r in rows:
+                _name = (r.__dict__.get("name") if hasattr(r, "__dict__") else getattr(r, "name", "")) or ""
+                if self._norm_name(_name) == needle:
+                    return r
+
             for r in rows:
                 _name = (r.__dict__.get("name") if hasattr(r, "__dict__") else getattr(r, "name", "")) or ""
                 if needle in self._norm_name(_name):
@@ -169,8 +170,9 @@ class Coverages(BaseModel):
 
 
     def list_active(self) -> List[CoverageRegister]:
+        # todas las columnas y sin order: find_by_name (substring) devuelve la primera que matchea
         try:
-            rows = super().get("active", True) or []
+            rows = self.query().where("active", True).all()
             # BaseModel.get devuelve objetos *Register; si viniera dict, lo normalizamos
             return [CoverageRegister(**r) if isinstance(r, dict) else r for r in rows]
         except Exception as e:
@@ -201,14 +203,11 @@ class Coverages(BaseModel):
             raise DatabaseError(f"[coverages.upsert] {e}")
 
 
-    from urllib.parse import quote  # arriba del archivo si no lo tenés
-    import requests                 # arriba del archivo si no lo tenés
-
     def deactivate(self, name: str, plan: Optional[str] = None) -> None:
         """Desactiva por name. 'plan' on-hold (no se usa)."""
         try:
-            url = f"{self.base_url}?name=eq.{quote(name)}"
-            r = requests.patch(url, headers=self.headers, json={"active": False}, timeout=10)
+            url = self.query().where("name", name).url()
+            r = self.session.patch(url, headers=self.headers, json={"active": False}, timeout=10)
             if r.status_code >= 400:
                 raise DatabaseError(f"HTTP {r.status_code}: {r.text}")
         except Exception as e:
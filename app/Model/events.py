@@ -1,8 +1,92 @@
-from typing import Optional, Dict
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, Tuple
 from app.Model.enums import DataType
 from app.Model.base_model import BaseModel
+from app.Model.async_base_model import AsyncBaseModel
 from app.Model.field import Field
 
+# TTL (segundos) del snapshot de configuración de eventos cacheado en el proceso.
+# Los eventos casi no cambian: con Lambda "warm" la mayoría de los turnos no consulta `events`.
+EVENT_CONFIG_TTL_S = float(os.getenv("PX_EVENT_CONFIG_TTL_S", "300"))
+
+
+@dataclass(frozen=True)
+class EventConfig:
+    """
+    Snapshot inmutable de la fila de `events` que usa el engine en cada turno.
+    Se carga UNA vez por event_id y se reutiliza (ver Events.get_config).
+    """
+    event_id: int
+    name: Optional[str] = None
+    reporte: Optional[str] = None
+    description: Optional[str] = None
+    nodo_inicio: Optional[int] = None
+    cant_preguntas: Optional[int] = None
+    tiempo_sesion: Optional[int] = None
+    assistant: Optional[str] = None
+    model_routing: Optional[dict] = None  # ruteo de modelos por tarea (ver app/services/model_routing.py)
+
+    @classmethod
+    def from_register(cls, reg) -> "EventConfig":
+        return cls(
+            event_id=getattr(reg, "event_id", None),
+            name=getattr(reg, "name", None),
+            reporte=getattr(reg, "reporte", None),
+            description=getattr(reg, "description", None),
+            nodo_inicio=getattr(reg, "nodo_inicio", None),
+            cant_preguntas=getattr(reg, "cant_preguntas", None),
+            tiempo_sesion=getattr(reg, "tiempo_sesion", None),
+            assistant=getattr(reg, "assistant", None),
+            model_routing=getattr(reg, "model_routing", None),
+        )
+
+
+# event_id -> (expira_en monotonic, EventConfig)
+_CONFIG_CACHE: Dict[int, Tuple[float, EventConfig]] = {}
+_CONFIG_LOCK = threading.Lock()
+
+
+def invalidate_event_config(event_id: Optional[int] = None) -> None:
+    """
+    Invalida el snapshot cacheado de un evento (o de todos si event_id es None).
+    Se llama sola desde Events.update/delete; usarla también si se edita `events` por fuera.
+    """
+    with _CONFIG_LOCK:
+        if event_id is None:
+            _CONFIG_CACHE.clear()
+        else:
+            _CONFIG_CACHE.pop(int(event_id), None)
+
+
+def _cached_config(event_id: int) -> Optional[EventConfig]:
+    with _CONFIG_LOCK:
+        hit = _CONFIG_CACHE.get(event_id)
+    return hit[1] if hit and hit[0] > time.monotonic() else None
+
+
+def _store_config(event_id: int, reg) -> EventConfig:
+    config = EventConfig.from_register(reg)
+    with _CONFIG_LOCK:
+        _CONFIG_CACHE[event_id] = (time.monotonic() + EVENT_CONFIG_TTL_S, config)
+    return config
+
+
+def prime_event_config(row: Dict) -> Optional[EventConfig]:
+    """
+    Carga en el cache un snapshot que ya vino de otra consulta (ej: RPC de bootstrap de sesión),
+    así el próximo get_config(event_id) no va a la base.
+    """
+    if not row or row.get("event_id") is None:
+        return None
+    config = EventConfig(**{name: row.get(name) for name in EventConfig.__dataclass_fields__})
+    with _CONFIG_LOCK:
+        _CONFIG_CACHE[int(config.event_id)] = (time.monotonic() + EVENT_CONFIG_TTL_S, config)
+    return config
+
+
 class Events(BaseModel):
     def __init__(self):
         self.__data: Dict[str, Field] = {
@@ -17,6 +101,7 @@ class Events(BaseModel):
             "cant_preguntas":  Field(None, DataType.INTEGER,   True,  False),
             "tiempo_sesion":   Field(None, DataType.INTEGER,   True,  False),
             "assistant":       Field(None, DataType.TEXT,       True,  False),  # Nuevo campo
+            "model_routing":   Field(None, DataType.JSON,       True,  False),  # jsonb: modelo/temperatura por tarea
         }
         super().__init__("events", self.__data)
 
@@ -86,45 +171,78 @@ class Events(BaseModel):
         if assistant is not None:
             self.__data["assistant"].value = assistant
         super().update("event_id", event_id)
+        invalidate_event_config(event_id)
 
     def delete(self, event_id: int) -> None:
         super().delete("event_id", event_id)
+        invalidate_event_config(event_id)
+
+    def get_config(self, event_id: int, *, refresh: bool = False) -> Optional[EventConfig]:
+        """
+        Devuelve el EventConfig del evento, desde el cache en proceso si está vigente.
+        - 1 sola lectura a `events` por event_id cada EVENT_CONFIG_TTL_S segundos.
+        - refresh=True fuerza la relectura.
+        - No cachea eventos inexistentes.
+        """
+        if event_id is None:
+            return None
+        key = int(event_id)
+        if not refresh:
+            config = _cached_config(key)
+            if config is not None:
+                return config
+
+        reg = self.get_by_id(key)
+        if reg is None:
+            return None
+        return _store_config(key, reg)
 
     def get_reporte_by_event_id(self, event_id: int) -> Optional[str]:
-        result = super().get("event_id", event_id)
-        if result and hasattr(result[0], "reporte"):
-            return result[0].reporte
-        return None
+        config = self.get_config(event_id)
+        return config.reporte if config else None
 
     def get_description_by_event_id(self, event_id: int) -> Optional[str]:
-        result = super().get("event_id", event_id)
-        if result and hasattr(result[0], "description"):
-            return result[0].description
-        return None
+        config = self.get_config(event_id)
+        return config.description if config else None
 
     def get_nodo_inicio_by_event_id(self, event_id: int) -> Optional[int]:
-        result = super().get("event_id", event_id)
-        if result and hasattr(result[0], "nodo_inicio"):
-            return result[0].nodo_inicio
-        return None
+        config = self.get_config(event_id)
+        return config.nodo_inicio if config else None
 
     def get_cant_preguntas_by_event_id(self, event_id: int) -> Optional[int]:
-        result = super().get("event_id", event_id)
-        if result and hasattr(result[0], "cant_preguntas"):
-            return result[0].cant_preguntas
-        return None
+        config = self.get_config(event_id)
+        return config.cant_preguntas if config else None
 
     def get_time_by_event_id(self, event_id: int) -> Optional[int]:
-        result = super().get("event_id", event_id)
-        if result and hasattr(result[0], "tiempo_sesion"):
-            return result[0].tiempo_sesion
-        return None
+        config = self.get_config(event_id)
+        return config.tiempo_sesion if config else None
 
     def get_assistant_by_event_id(self, event_id: int) -> Optional[str]:
-        result = super().get("event_id", event_id)
-        if result and hasattr(result[0], "assistant"):
-            return result[0].assistant
-        return None
+        config = self.get_config(event_id)
+        return config.assistant if config else None
+
+
+class AsyncEvents(AsyncBaseModel):
+    """Lecturas calientes de events en async; get_config comparte el cache con Events."""
+    model_class = Events
+
+    async def get_by_id(self, event_id: int):
+        result = await self.get("event_id", event_id, limit=1)
+        return result[0] if result else None
+
+    async def get_config(self, event_id: int, *, refresh: bool = False) -> Optional[EventConfig]:
+        if event_id is None:
+            return None
+        key = int(event_id)
+        if not refresh:
+            config = _cached_config(key)
+            if config is not None:
+                return config
+        reg = await self.get_by_id(key)
+        if reg is None:
+            return None
+        return _store_config(key, reg)
+
 '''
 from typing import Optional, Dict
 from app.Model.enums import DataType
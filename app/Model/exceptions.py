@@ -45,4 +45,10 @@ class RecordNotFoundError(BaseModelError):
     Se lanza cuando no se encuentra un registro en la base de datos.
     """
     def __init__(self, message: str, field: str, value: Any):
-        super().__init__(message, field, value)
\ No newline at end of file
+        super().__init__(message, field, value)
+class RpcNotFoundError(DatabaseError):
+    """
+    Excepción para funciones RPC inexistentes en PostgREST (404 / PGRST202).
+    Se lanza cuando todavía no se aplicó el SQL de la función en la base.
+    """
+    pass
@@ -7,4 +7,5 @@ class Field:
     value: Any
     data_type: DataType
     optional: bool
-    unique: bool
\ No newline at end of file
+    unique: bool
+    lazy_json: bool = False  # texto JSON grande: la fila lo decodifica recién al accederlo (<campo>_data)
\ No newline at end of file
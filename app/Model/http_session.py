@@ -0,0 +1,158 @@
+# app/Model/http_session.py
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ===== Config (override por env)
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "10"))            # conexiones keep-alive por host
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "3.05"))
+SUPABASE_READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "10"))
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "2"))
+SUPABASE_RETRY_BACKOFF = float(os.getenv("SUPABASE_RETRY_BACKOFF", "0.2"))
+
+# Reintentos por status SOLO en métodos idempotentes (un POST no se repite si llegó al server)
+RETRY_STATUS = (502, 503, 504)
+RETRY_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "DELETE"])
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter con timeout por defecto: ninguna llamada a Supabase queda colgada
+    hasta el timeout de Lambda si el caller no pasa `timeout=`.
+    """
+    def __init__(self, *args, timeout=None, **kwargs):
+        self._timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self._timeout
+        return super().send(request, **kwargs)
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=SUPABASE_MAX_RETRIES,
+        connect=SUPABASE_MAX_RETRIES,
+        read=SUPABASE_MAX_RETRIES,
+        status=SUPABASE_MAX_RETRIES,
+        backoff_factor=SUPABASE_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=RETRY_METHODS,
+        raise_on_status=False,   # devolvemos la respuesta y la maneja BaseModel como siempre
+    )
+    adapter = _TimeoutHTTPAdapter(
+        pool_connections=SUPABASE_POOL_SIZE,
+        pool_maxsize=SUPABASE_POOL_SIZE,
+        max_retries=retry,
+        timeout=(SUPABASE_CONNECT_TIMEOUT, SUPABASE_READ_TIMEOUT),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Session HTTP compartida por todo el proceso para el tráfico REST de Supabase.
+    - Se crea una sola vez (lazy) y vive a nivel módulo, así que sobrevive entre
+      invocaciones "warm" de Lambda y reutiliza las conexiones TLS abiertas.
+    - Keep-alive + pool configurable (SUPABASE_POOL_SIZE).
+    - Timeout por defecto (SUPABASE_CONNECT_TIMEOUT / SUPABASE_READ_TIMEOUT).
+    - Reintentos acotados (SUPABASE_MAX_RETRIES) con backoff.
+    Nota: requests/urllib3 hablan HTTP/1.1; la multiplexación HTTP/2 no está disponible
+    por este camino, el ahorro viene de no repetir el handshake TCP+TLS en cada query.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def reset_session() -> None:
+    """Cierra y descarta la session compartida (útil en tests/benchmarks)."""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+# ===== Async (httpx) — ver app/Model/async_base_model.py
+# Un event loop persistente en un thread daemon: el AsyncClient (y su pool) queda atado a ese loop
+# y sobrevive entre invocaciones "warm", igual que la session sync. Los callers sync entran por run_sync().
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_async_clients: dict = {}  # id(loop) -> httpx.AsyncClient
+
+
+def _build_async_client():
+    import httpx  # lazy: solo lo necesita quien usa la capa async
+
+    limits = httpx.Limits(max_connections=SUPABASE_POOL_SIZE, max_keepalive_connections=SUPABASE_POOL_SIZE)
+    transport = httpx.AsyncHTTPTransport(retries=SUPABASE_MAX_RETRIES, limits=limits)  # reintenta solo errores de conexión
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(SUPABASE_READ_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT),
+    )
+
+
+def get_async_client():
+    """
+    httpx.AsyncClient compartido para el event loop actual (un pool por loop: los clientes
+    async no se pueden compartir entre loops). Con run_sync() siempre es el mismo loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(id(loop))
+    if client is None or client.is_closed:
+        client = _async_clients[id(loop)] = _build_async_client()
+    return client
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_thread
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                _loop_thread = threading.Thread(target=loop.run_forever, name="px-async-db", daemon=True)
+                _loop_thread.start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """
+    Ejecuta una corrutina de la capa async desde código sync (Flask/Lambda) y devuelve su resultado.
+    Corre en el loop persistente -> reutiliza las conexiones del AsyncClient entre turnos.
+    """
+    loop = _background_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("run_sync() no puede llamarse desde el loop async (usar await).")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+
+def gather_sync(*coros: Awaitable[Any], return_exceptions: bool = False) -> List[Any]:
+    """
+    Fan-out desde código sync: corre las corrutinas en paralelo (asyncio.gather) y devuelve
+    los resultados en el mismo orden. El turno espera ~1 round trip en vez de N.
+    """
+    async def _gather():
+        return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+
+    return run_sync(_gather())
@@ -0,0 +1,46 @@
+# app/Model/inbound_bursts.py
+from typing import Any, Dict, List, Optional
+
+from app.Model.base_model import BaseModel, Field, DataType
+from app.Model.exceptions import DatabaseError
+
+
+class InboundBursts(BaseModel):
+    """Buffer de mensajes por teléfono de la ventana de coalescing (ver app/Model/sql/inbound_bursts.sql)."""
+
+    def __init__(self):
+        data = {
+            "id":         Field(None, DataType.INTEGER,   False, True),
+            "phone":      Field(None, DataType.STRING,    False, False),
+            "message_id": Field(None, DataType.STRING,    True,  False),  # MessageSid / wamid
+            "payload":    Field(None, DataType.JSON,      False, False),  # turno ya procesado (texto, media, ...)
+            "created_at": Field(None, DataType.TIMESTAMP, True,  False),
+        }
+        super().__init__("inbound_bursts", data)
+        self.data = self._BaseModel__data
+
+    def push(self, phone: str, message_id: Optional[str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Agrega el mensaje al buffer del teléfono. Devuelve la fila ({id, created_at, ...})."""
+        r = self.session.post(self.base_url, headers=self.headers,
+                              json={"phone": phone, "message_id": message_id, "payload": payload}, timeout=10)
+        if r.status_code >= 400:
+            raise DatabaseError(f"Error al insertar en {self.table_name}: {r.status_code}, {r.text}")
+        rows = r.json() or []
+        if not rows:
+            raise DatabaseError(f"No se devolvió registro creado en {self.table_name}.")
+        return rows[0]
+
+    def pending(self, phone: str) -> List[Dict[str, Any]]:
+        """Filas que siguen en el buffer del teléfono (id, created_at), en orden de llegada."""
+        return self.query().select("id", "created_at").where("phone", phone).order("id").rows()
+
+    def take(self, phone: str, upto_id: int) -> List[Dict[str, Any]]:
+        """
+        DELETE ... RETURNING de las filas del teléfono con id <= upto_id, en orden.
+        Lista vacía = otro proceso ya se llevó la ráfaga.
+        """
+        q = self.query().where("phone", phone).where("id", upto_id, op="lte").order("id")
+        r = self.session.delete(q.url(), headers=self.headers, timeout=10)
+        if r.status_code >= 400:
+            raise DatabaseError(f"Error al eliminar en {self.table_name}: {r.status_code}, {r.text}")
+        return sorted(r.json() or [], key=lambda row: row.get("id") or 0)
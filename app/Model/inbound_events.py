@@ -0,0 +1,34 @@
+# app/Model/inbound_events.py
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.Model.base_model import BaseModel, Field, DataType
+
+
+class InboundEvents(BaseModel):
+    """Webhook entrante crudo del modo ack (ver app/Model/sql/inbound_events.sql)."""
+
+    def __init__(self):
+        data = {
+            "id":           Field(None, DataType.INTEGER,   False, True),
+            "provider":     Field(None, DataType.STRING,    False, False),  # 'twilio' | 'meta'
+            "payload":      Field(None, DataType.JSON,      False, False),  # form de Twilio / JSON de Meta
+            "status":       Field(None, DataType.STRING,    False, False),  # queued | done | failed
+            "error":        Field(None, DataType.STRING,    True,  False),
+            "received_at":  Field(None, DataType.TIMESTAMP, True,  False),
+            "processed_at": Field(None, DataType.TIMESTAMP, True,  False),
+        }
+        super().__init__("inbound_events", data)
+        self.data = self._BaseModel__data
+
+    def record(self, provider: str, payload: Dict[str, Any]) -> Optional[int]:
+        """Guarda el evento como 'queued' y devuelve su id."""
+        row = self.upsert({"provider": provider, "payload": payload, "status": "queued"}, on_conflict="id")
+        return (row or {}).get("id")
+
+    def set_status(self, event_id: int, status: str, error: Optional[str] = None) -> None:
+        self.query().where("id", event_id).update({
+            "status": status,
+            "error": error,
+            "processed_at": datetime.now(timezone.utc).isoformat(),
+        })
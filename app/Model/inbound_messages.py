@@ -0,0 +1,64 @@
+# app/Model/inbound_messages.py
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from app.Model.base_model import BaseModel, Field, DataType
+from app.Model.exceptions import DatabaseError
+
+
+class InboundMessages(BaseModel):
+    """Estado de cada mensaje entrante por id del proveedor (ver app/Model/sql/inbound_messages.sql)."""
+
+    def __init__(self):
+        data = {
+            "provider_message_id": Field(None, DataType.STRING,    False, True),   # PK: MessageSid / wamid
+            "provider":            Field(None, DataType.STRING,    False, False),
+            "phone":               Field(None, DataType.STRING,    True,  False),
+            "status":              Field(None, DataType.STRING,    False, False),  # received | processing | done | failed
+            "created_at":          Field(None, DataType.TIMESTAMP, True,  False),
+            "updated_at":          Field(None, DataType.TIMESTAMP, True,  False),
+        }
+        super().__init__("inbound_messages", data)
+        self.data = self._BaseModel__data
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def insert_new(self, provider_message_id: str, provider: str, phone: Optional[str], status: str) -> bool:
+        """INSERT ... ON CONFLICT DO NOTHING. True si la fila es nueva (nadie vio este mensaje antes)."""
+        headers = self.headers.copy()
+        headers["Prefer"] = "return=representation,resolution=ignore-duplicates"
+        r = self.session.post(
+            f"{self.base_url}?on_conflict=provider_message_id",
+            headers=headers,
+            json={"provider_message_id": provider_message_id, "provider": provider, "phone": phone, "status": status},
+            timeout=10,
+        )
+        if r.status_code >= 400:
+            raise DatabaseError(f"Error al insertar en {self.table_name}: {r.status_code}, {r.text}")
+        return bool(r.json())
+
+    def take_over(self, provider_message_id: str, from_statuses: Iterable[str], status: str,
+                  stale_before: Optional[datetime] = None) -> bool:
+        """
+        PATCH condicional: pasa a `status` solo si la fila está en `from_statuses`
+        (o, con stale_before, en 'received' / 'processing' sin novedades desde entonces: el encolado
+        o el turno murió sin marcarla). True si la tomó este proceso.
+        """
+        payload = {"status": status, "updated_at": self._now()}
+        q = self.query().where("provider_message_id", provider_message_id)
+        if stale_before is not None:
+            q.where("status", ["received", "processing"], op="in").where("updated_at", stale_before.isoformat(), op="lt")
+        else:
+            q.where("status", list(from_statuses), op="in")
+        return bool(q.update(payload))
+
+    def set_status(self, provider_message_id: str, status: str) -> None:
+        self.query().where("provider_message_id", provider_message_id).update(
+            {"status": status, "updated_at": self._now()}
+        )
+
+    @staticmethod
+    def stale_cutoff(seconds: float) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=seconds)
@@ -19,7 +19,8 @@ class MedicalDigests(BaseModel):
     def add_row(self, *, contact_id: int, tx_id: int, digest_text: str, digest_json: str) -> Dict[str, Any]:
         """
         Inserta (o actualiza si ya existe tx_id) una fila de digest.
-        Usa upsert por 'tx_id' para garantizar idempotencia.
+        Usa upsert por 'tx_id' para garantizar idempotencia: nodo 202, nodo 210 y el precompute
+        pueden escribir el mismo digest en paralelo (índice único en app/Model/sql/medical_digests.sql).
         """
         row = {
             "contact_id":  contact_id,
@@ -1,9 +1,13 @@
 from typing import Optional, List, Dict
 from app.Model.enums import DataType
 from app.Model.base_model import BaseModel, MessagesRegister
+from app.Model.async_base_model import AsyncBaseModel
 from app.Model.field import Field
 
 class Messages(BaseModel):
+    # Dentro de un turno del engine los add() se encolan y salen en 1 insert bulk (ver write_buffer.py)
+    buffer_writes = True
+
     def __init__(self):
         self.__data: Dict[str, Field] = {
             "message_id":    Field(None, DataType.INTEGER, False, True),
@@ -30,6 +34,7 @@ class Messages(BaseModel):
         """
         Inserta un nuevo mensaje y retorna su ID.
         Los campos phone, question_id, group_id, question_name y event_id son opcionales.
+        Con un write_buffer activo devuelve un PendingInsert (su .id fuerza el flush).
         """
         self.__data["message_id"].value    = None
         self.__data["msg_key"].value       = msg_key
@@ -68,20 +73,17 @@ class Messages(BaseModel):
     def get_latest_by_phone(self, phone: str) -> Optional[MessagesRegister]:
         """
         Returns the most recent message (by highest message_id) for a specific phone.
+        Single-row query (order=message_id.desc&limit=1).
         """
-        resultados = super().get("phone", phone)
-        if resultados:
-            return max(resultados, key=lambda r: r.message_id)
-        return None
+        return super().get_one({"phone": phone}, "message_id.desc")
 
     def get_penultimate_by_phone(self, phone: str) -> Optional[MessagesRegister]:
         """
         Returns the second most recent message (by message_id) for a specific phone.
         """
-        resultados = super().get("phone", phone)
+        resultados = super().get("phone", phone, order_field="message_id.desc", limit=2)
         if resultados and len(resultados) >= 2:
-            resultados_ordenados = sorted(resultados, key=lambda r: r.message_id, reverse=True)
-            return resultados_ordenados[1]
+            return resultados[1]
         return None
 
     def get_by_id(self, message_id: int) -> Optional[MessagesRegister]:
@@ -141,19 +143,17 @@ class Messages(BaseModel):
     def get_latest_by_phone_and_event_id(self, phone: str, event_id: int) -> Optional[MessagesRegister]:
         """
         Returns the most recent MessagesRegister for the given phone and event_id.
+        Filter + order + limit are resolved by PostgREST: a single row travels.
         """
-        # First pull all messages for that phone
-        mensajes = self.get_by_phone(phone)
-        if not mensajes:
-            return None
+        return super().get_one({"phone": phone, "event_id": event_id}, "message_id.desc")
 
-        # Filter down to only those with the matching event_id
-        matched = [m for m in mensajes if m.event_id == event_id]
-        if not matched:
-            return None
 
-        # Return the one with the highest message_id
-        return max(matched, key=lambda m: m.message_id)
+class AsyncMessages(AsyncBaseModel):
+    """Hot reads of messages in async (see async_base_model.py)."""
+    model_class = Messages
+
+    async def get_latest_by_phone_and_event_id(self, phone: str, event_id: int) -> Optional[MessagesRegister]:
+        return await self.get_one({"phone": phone, "event_id": event_id}, "message_id.desc")
 
 
 '''
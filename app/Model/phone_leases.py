@@ -0,0 +1,51 @@
+# app/Model/phone_leases.py
+from datetime import datetime, timedelta, timezone
+
+from app.Model.base_model import BaseModel, Field, DataType
+from app.Model.exceptions import DatabaseError
+
+
+class PhoneLeases(BaseModel):
+    """Lease por teléfono para serializar turnos entre instancias (ver app/Model/sql/phone_leases.sql)."""
+
+    def __init__(self):
+        data = {
+            "phone":      Field(None, DataType.STRING,    False, True),   # PK: numero_limpio
+            "holder":     Field(None, DataType.STRING,    False, False),  # id del turno que lo tiene
+            "expires_at": Field(None, DataType.TIMESTAMP, False, False),
+            "updated_at": Field(None, DataType.TIMESTAMP, True,  False),
+        }
+        super().__init__("phone_leases", data)
+        self.data = self._BaseModel__data
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    def try_acquire(self, phone: str, holder: str, ttl_s: float) -> bool:
+        """
+        True si `holder` quedó con el lease: fila nueva (INSERT ... ON CONFLICT DO NOTHING)
+        o la que estaba venció (PATCH condicional sobre expires_at).
+        """
+        now = self._now()
+        row = {"phone": phone, "holder": holder,
+               "expires_at": (now + timedelta(seconds=ttl_s)).isoformat(), "updated_at": now.isoformat()}
+        headers = self.headers.copy()
+        headers["Prefer"] = "return=representation,resolution=ignore-duplicates"
+        r = self.session.post(f"{self.base_url}?on_conflict=phone", headers=headers, json=row, timeout=10)
+        if r.status_code >= 400:
+            raise DatabaseError(f"Error al insertar en {self.table_name}: {r.status_code}, {r.text}")
+        if r.json():
+            return True
+        taken = (self.query()
+                 .where("phone", phone)
+                 .where("expires_at", now.isoformat(), op="lt")
+                 .update({"holder": holder, "expires_at": row["expires_at"], "updated_at": row["updated_at"]}))
+        return bool(taken)
+
+    def release(self, phone: str, holder: str) -> None:
+        """Suelta el lease solo si sigue siendo de `holder` (si venció y lo tomó otro, no se toca)."""
+        q = self.query().where("phone", phone).where("holder", holder)
+        r = self.session.delete(q.url(), headers=self.headers, timeout=10)
+        if r.status_code >= 400:
+            raise DatabaseError(f"Error al eliminar en {self.table_name}: {r.status_code}, {r.text}")
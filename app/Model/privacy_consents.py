@@ -1,6 +1,7 @@
 from typing import Dict
 from app.Model.enums import DataType
 from app.Model.base_model import BaseModel
+from app.Model.async_base_model import AsyncBaseModel
 from app.Model.field import Field
 import os
 PRIVACY_NOTICE_VERSION = os.getenv("PRIVACY_NOTICE_VERSION", "v1.0")
@@ -43,8 +44,21 @@ class PrivacyConsents(BaseModel):
         if not dni_hash:
             return False
         try:
-            rows = self.get("dni_hash", dni_hash)
-            return bool(rows)
+            # 1 fila, 1 columna: solo nos importa si existe
+            return self.query().select("id").where("dni_hash", dni_hash).exists()
+        except Exception as e:
+            print(f"[CONSENT] error en has_consent: {e}")
+            return False
+
+
+class AsyncPrivacyConsents(AsyncBaseModel):
+    model_class = PrivacyConsents
+
+    async def has_consent(self, dni_hash: str = None) -> bool:
+        if not dni_hash:
+            return False
+        try:
+            return await self.exists(self.query().select("id").where("dni_hash", dni_hash))
         except Exception as e:
             print(f"[CONSENT] error en has_consent: {e}")
             return False
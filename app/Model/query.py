@@ -0,0 +1,195 @@
+# app/Model/query.py
+from typing import Any, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+from app.Model.exceptions import DatabaseError, ValidationError
+from app.Model.write_buffer import flush_pending
+
+# Operadores PostgREST soportados en where()/or_()
+OPERATORS = ("eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "in", "is")
+
+# Caracteres con significado en la sintaxis PostgREST: si aparecen en un valor hay que citarlo
+_RESERVED = set(',.:()"\\ ')
+
+
+def _literal(value: Any) -> str:
+    """Valor Python -> literal PostgREST (sin URL-encode)."""
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    return str(value)
+
+
+def _quoted(value: Any) -> str:
+    """Literal citado si hace falta (listas de in.(...) y condiciones de or=(...))."""
+    s = _literal(value)
+    if any(ch in _RESERVED for ch in s):
+        s = '"' + s.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return s
+
+
+def _condition(field: str, op: str, value: Any, nested: bool = False) -> str:
+    """
+    Arma "op.valor" (o "field.op.valor" si nested=True, para or=(...)).
+    - in:  value iterable -> in.(a,b,"c,d")
+    - is:  None/True/False -> is.null / is.true / is.false
+    """
+    if op not in OPERATORS:
+        raise ValidationError(f"Operador {op} no soportado.", field=field, value=value)
+    if op == "in":
+        rendered = "(" + ",".join(_quoted(v) for v in value) + ")"
+    elif op == "is":
+        if value not in (None, True, False):
+            raise ValidationError("is. solo acepta None/True/False.", field=field, value=value)
+        rendered = _literal(value)
+    else:
+        rendered = _quoted(value) if nested else _literal(value)
+    cond = f"{op}.{rendered}"
+    return f"{field}.{cond}" if nested else cond
+
+
+class Query:
+    """
+    Builder de consultas PostgREST sobre un BaseModel:
+
+        rows = (Questions().query()
+                .select("group_id", "group_name")
+                .where("event_id", 1)
+                .where("group_id", [1, 2], op="in")
+                .order("group_id", "question_id.desc")
+                .limit(20)
+                .all())
+
+    - Valida columnas contra el esquema del modelo.
+    - Encodea los valores en la URL (no se rompe con '&', '+', espacios, etc.).
+    - Ejecuta con la session HTTP compartida del modelo.
+    """
+
+    def __init__(self, model):
+        self._model = model
+        self._select: List[str] = []
+        self._filters: List[Tuple[str, str]] = []
+        self._order: List[str] = []
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+
+    # ---------- builder ----------
+
+    def select(self, *columns: str) -> "Query":
+        """select("a", "b") o select("a,b"). Sin select -> todas las columnas."""
+        for spec in columns:
+            for col in (spec or "").split(","):
+                col = col.strip()
+                if col and col != "*":
+                    self._model._check_select(col)
+                    self._select.append(col)
+        return self
+
+    def where(self, field: str, value: Any, op: str = "eq") -> "Query":
+        self._model._check_select(field)
+        self._filters.append((field, _condition(field, op, value)))
+        return self
+
+    def in_(self, field: str, values: Iterable[Any]) -> "Query":
+        return self.where(field, list(values), op="in")
+
+    def is_null(self, field: str) -> "Query":
+        return self.where(field, None, op="is")
+
+    def not_null(self, field: str) -> "Query":
+        self._model._check_select(field)
+        self._filters.append((field, "not.is.null"))
+        return self
+
+    def or_(self, *conditions: Tuple[str, str, Any]) -> "Query":
+        """or_(("name", "eq", "Abierta"), ("puntuacion", "is", None)) -> or=(name.eq.Abierta,puntuacion.is.null)"""
+        parts = []
+        for field, op, value in conditions:
+            self._model._check_select(field)
+            parts.append(_condition(field, op, value, nested=True))
+        self._filters.append(("or", "(" + ",".join(parts) + ")"))
+        return self
+
+    def order(self, *columns: str, desc: bool = False) -> "Query":
+        """order("timestamp", desc=True) o order("timestamp.desc,id.desc")."""
+        for spec in columns:
+            for col in (spec or "").split(","):
+                col = col.strip()
+                if not col:
+                    continue
+                if desc and "." not in col:
+                    col += ".desc"
+                self._model._check_select(col.split(".", 1)[0])
+                self._order.append(col)
+        return self
+
+    def limit(self, n: int) -> "Query":
+        self._limit = int(n)
+        return self
+
+    def range(self, start: int, end: int) -> "Query":
+        """Paginación inclusiva [start, end] (como el header Range de PostgREST)."""
+        if end < start:
+            raise ValidationError("range(): end < start.", field="range", value=(start, end))
+        self._offset = int(start)
+        self._limit = int(end) - int(start) + 1
+        return self
+
+    # ---------- salida ----------
+
+    def params(self) -> List[Tuple[str, str]]:
+        params: List[Tuple[str, str]] = []
+        if self._select:
+            params.append(("select", ",".join(self._select)))
+        params.extend(self._filters)
+        if self._order:
+            params.append(("order", ",".join(self._order)))
+        if self._limit is not None:
+            params.append(("limit", str(self._limit)))
+        if self._offset:
+            params.append(("offset", str(self._offset)))
+        return params
+
+    def url(self) -> str:
+        qs = "&".join(f"{quote(k, safe='')}={quote(v, safe=',.()*')}" for k, v in self.params())
+        return f"{self._model.base_url}?{qs}" if qs else self._model.base_url
+
+    def rows(self) -> List[dict]:
+        """Ejecuta y devuelve las filas crudas (dicts)."""
+        model = self._model
+        flush_pending(model.table_name)
+        r = model.session.get(self.url(), headers=model.headers)
+        if r.status_code >= 400:
+            raise DatabaseError(f"Error al consultar {model.table_name}: {r.status_code}, {r.text}")
+        return r.json() or []
+
+    def update(self, payload: dict) -> List[Any]:
+        """
+        PATCH condicional: actualiza SOLO las filas que cumplen los filtros y devuelve
+        las filas actualizadas (lista vacía = ninguna cumplía, ej. otro proceso ganó la carrera).
+        """
+        model = self._model
+        if not self._filters:
+            raise ValidationError("update() sin filtros actualizaría toda la tabla.", field="where", value=None)
+        r = model.session.patch(self.url(), headers=model.headers, json=payload)
+        if r.status_code >= 400:
+            raise DatabaseError(f"Error al actualizar {model.table_name}: {r.status_code}, {r.text}")
+        return model._to_registers(r.json() or [])
+
+    def all(self) -> List[Any]:
+        """Ejecuta y devuelve objetos *Register (lista vacía si no hay filas)."""
+        return self._model._to_registers(self.rows())
+
+    def first(self) -> Optional[Any]:
+        self._limit = 1
+        rows = self.all()
+        return rows[0] if rows else None
+
+    def exists(self) -> bool:
+        if not self._select:
+            self._select = [self._model.select_columns().split(",")[0]]
+        self._limit = 1
+        return bool(self.rows())
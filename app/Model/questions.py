@@ -49,8 +49,13 @@ class Questions(BaseModel):
     def get_groups_by_event_id(self, event_id: int) -> List[Dict[str, Any]]:
         """
         Devuelve una lista de grupos únicos (group_id, group_name) asociados a un evento.
+        Solo viajan esas 2 columnas (PostgREST no tiene DISTINCT: se deduplica acá).
         """
-        resultados = self.get_by_event_id(event_id)
+        resultados = (self.query()
+                      .select("group_id", "group_name")
+                      .where("event_id", event_id)
+                      .order("group_id", "question_id")
+                      .all())
         if not resultados:
             return []
 
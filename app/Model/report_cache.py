@@ -0,0 +1,42 @@
+# app/Model/report_cache.py
+from typing import Any, Dict, Optional
+
+from app.Model.base_model import BaseModel, Field, DataType
+
+
+class ReportCache(BaseModel):
+    """Reporte de /consulta ya generado, por TX (ver app/Model/sql/report_cache.sql)."""
+
+    def __init__(self):
+        data = {
+            "id":                  Field(None, DataType.INTEGER,   False, True),
+            "tx_id":               Field(None, DataType.INTEGER,   False, True),   # UNIQUE: 1 fila por TX
+            "conversation_sha256": Field(None, DataType.STRING,    False, False),
+            "prompt_version":      Field(None, DataType.STRING,    False, False),
+            "model":               Field(None, DataType.STRING,    True,  False),
+            "report_json":         Field(None, DataType.JSON,      False, False),  # reporte normalizado
+            "created_at":          Field(None, DataType.TIMESTAMP, True,  False),
+        }
+        super().__init__("report_cache", data)
+        self.data = self._BaseModel__data
+
+    def get_report(self, tx_id: int, conversation_sha256: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        """report_json si hay una fila vigente para esa conversación y prompt; None si no (o si quedó vieja)."""
+        row = (self.query()
+               .select("report_json")
+               .where("tx_id", tx_id)
+               .where("conversation_sha256", conversation_sha256)
+               .where("prompt_version", prompt_version)
+               .first())
+        return row.report_json if row else None
+
+    def put(self, tx_id: int, conversation_sha256: str, prompt_version: str,
+            report: Dict[str, Any], model: Optional[str] = None) -> Dict[str, Any]:
+        """Guarda (o pisa la fila vieja de la TX) el reporte generado."""
+        return self.upsert({
+            "tx_id": tx_id,
+            "conversation_sha256": conversation_sha256,
+            "prompt_version": prompt_version,
+            "model": model,
+            "report_json": report,
+        }, on_conflict="tx_id")
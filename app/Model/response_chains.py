@@ -0,0 +1,33 @@
+# app/Model/response_chains.py
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from app.Model.base_model import BaseModel, Field, DataType
+
+
+class ResponseChains(BaseModel):
+    """Último previous_response_id de la Responses API por TX (ver app/Model/sql/response_chains.sql)."""
+
+    def __init__(self):
+        data = {
+            "tx_id":          Field(None, DataType.INTEGER,   False, True),   # PK: 1 fila por TX
+            "response_id":    Field(None, DataType.STRING,    False, False),
+            "covered_until":  Field(None, DataType.INTEGER,   False, False),  # índice (exclusivo) del historial ya enviado
+            "covered_sha256": Field(None, DataType.STRING,    True,  False),  # hash de history[:covered_until]
+            "updated_at":     Field(None, DataType.TIMESTAMP, True,  False),
+        }
+        super().__init__("response_chains", data)
+        self.data = self._BaseModel__data
+
+    def get_for_tx(self, tx_id: int) -> Optional[Any]:
+        return self.query().select("tx_id", "response_id", "covered_until", "covered_sha256").where("tx_id", tx_id).first()
+
+    def save(self, tx_id: int, response_id: str, covered_until: int, covered_sha256: str) -> None:
+        """Pisa la cadena de la TX (la última llamada es siempre la que vale)."""
+        self.upsert({
+            "tx_id": tx_id,
+            "response_id": response_id,
+            "covered_until": covered_until,
+            "covered_sha256": covered_sha256,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }, on_conflict="tx_id")
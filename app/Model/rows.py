@@ -0,0 +1,108 @@
+# app/Model/rows.py
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from app.Model.field import Field
+
+
+class Row:
+    """
+    Fila devuelta por PostgREST envuelta SIN copiar el dict (r.json() -> Row).
+    - Compatible con los *Register de siempre: row.campo, getattr(row, "x", None),
+      row.__dict__ / vars(row) (devuelve el dict de la fila) y XxxRegister(**kwargs).
+    - Columnas fuera del esquema del modelo se resuelven por __getattr__.
+    - Asignar row.campo = valor escribe en la fila.
+    """
+    __slots__ = ("_row", "_decoded")
+
+    def __init__(self, **kwargs):
+        object.__setattr__(self, "_row", kwargs)
+        object.__setattr__(self, "_decoded", None)
+
+    @classmethod
+    def wrap(cls, record: Dict[str, Any]) -> "Row":
+        obj = object.__new__(cls)
+        object.__setattr__(obj, "_row", record)
+        object.__setattr__(obj, "_decoded", None)
+        return obj
+
+    @property
+    def __dict__(self) -> Dict[str, Any]:
+        return self._row
+
+    def __getattr__(self, name: str) -> Any:
+        if name in Row.__slots__:
+            raise AttributeError(name)
+        try:
+            return self._row[name]
+        except KeyError:
+            raise AttributeError(f"{type(self).__name__} no tiene el campo '{name}'") from None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in Row.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            self._row[name] = value
+            if self._decoded:
+                self._decoded.pop(name, None)
+
+    def __reduce__(self):
+        # Las clases generadas no son importables: se serializa como su *Register base
+        cls = getattr(type(self), "_pickle_as", type(self))
+        return (cls.wrap, (self._row,))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._row})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._row
+
+    def _decode_json(self, name: str) -> Any:
+        # Decodifica (una sola vez) una columna de texto JSON; vacío/inválido -> None
+        decoded = self._decoded
+        if decoded is None:
+            decoded = {}
+            object.__setattr__(self, "_decoded", decoded)
+        if name not in decoded:
+            raw = self._row.get(name)
+            try:
+                decoded[name] = json.loads(raw) if isinstance(raw, (str, bytes)) and raw else raw
+            except ValueError:
+                decoded[name] = None
+        return decoded[name]
+
+
+def _column(name: str) -> property:
+    return property(lambda self: self._row.get(name), doc=f"Columna `{name}`.")
+
+
+def _json_column(name: str) -> property:
+    return property(lambda self: self._decode_json(name),
+                    doc=f"`{name}` decodificado desde JSON (lazy, cacheado por fila).")
+
+
+_ROW_CLASSES: Dict[Tuple[str, Tuple[str, ...]], type] = {}
+
+
+def row_class_for(name: str, schema: Dict[str, Field], base: Optional[type] = None) -> type:
+    """
+    Genera (una sola vez por tabla+esquema) la clase de fila de un modelo:
+    - __slots__ vacío (no hay __dict__ por instancia).
+    - una property por campo del esquema (columna ausente en el select -> None).
+    - por cada Field(lazy_json=True), además `<campo>_data` con el JSON decodificado al accederlo.
+    `base` es el *Register legado de la tabla (para que isinstance siga funcionando).
+    """
+    key = (name, tuple(schema))
+    cls = _ROW_CLASSES.get(key)
+    if cls is not None:
+        return cls
+
+    namespace: Dict[str, Any] = {"__slots__": (), "_pickle_as": base or Row}
+    for field_name, field in schema.items():
+        namespace[field_name] = _column(field_name)
+        if getattr(field, "lazy_json", False):
+            namespace[f"{field_name}_data"] = _json_column(field_name)
+
+    cls = type(name, (base or Row,), namespace)
+    _ROW_CLASSES[key] = cls
+    return cls
@@ -0,0 +1,25 @@
+-- app/Model/sql/conversation_summaries.sql
+-- Resumen clínico incremental por TX (lo usa app/services/compaction.py en el nodo 203).
+--
+-- summary         resumen de los mensajes [inicio, covered_until) del historial
+-- covered_until   índice (exclusivo) del historial hasta donde llega el resumen
+-- covered_sha256  sha256 de history[:covered_until] (JSON canónico). El historial no es append-only:
+--                 message_p._reescribir_historial lo reescribe entero; si el prefijo ya no da el
+--                 mismo hash, el resumen se ignora y el próximo fold lo reemplaza (filas sin hash, igual)
+-- Cada fold agrega los mensajes nuevos al resumen anterior (no lo regenera desde cero).
+-- Solo se pisa una fila con otra que cubra más historial (ConversationSummaries.save).
+--
+-- Aplicar en el SQL editor de Supabase (idempotente) y luego: notify pgrst, 'reload schema';
+-- Si la tabla no existe, el nodo 203 sigue con la ventana de prompt_window solamente.
+
+create table if not exists public.conversation_summaries (
+  tx_id          bigint primary key references public.transactions (id) on delete cascade,
+  summary        text not null,
+  covered_until  integer not null,
+  covered_sha256 text,
+  updated_at     timestamptz not null default now()
+);
+
+alter table public.conversation_summaries add column if not exists covered_sha256 text;
+
+grant select, insert, update on public.conversation_summaries to anon, authenticated, service_role;
@@ -0,0 +1,70 @@
+-- app/Model/sql/conversation_turns.sql
+-- Historial de conversación incremental (lo usan ConversationTurns y el engine en app/message_p.py).
+--
+-- Antes: cada turno PATCHeaba transactions.conversation entero (texto JSON) -> el volumen
+-- escrito crecía cuadrático con el largo de la sesión.
+-- Ahora:
+--   transactions.conversation  = base (system + welcome al abrir la TX, o la última reescritura)
+--   conversation_turns          = append-only, 1 fila por mensaje nuevo, seq = índice en el historial
+--   historial completo          = base || turns con seq >= largo(base), ordenados por seq
+-- Los turns con seq < largo(base) quedaron absorbidos por una reescritura completa (fallback) y se ignoran.
+--
+-- Aplicar en el SQL editor de Supabase (idempotente) y luego: notify pgrst, 'reload schema';
+-- Si la tabla no existe, el engine sigue reescribiendo transactions.conversation como siempre.
+
+create table if not exists public.conversation_turns (
+  id          bigserial primary key,
+  tx_id       bigint not null references public.transactions (id) on delete cascade,
+  seq         integer not null,
+  message     jsonb not null,
+  created_at  timestamptz not null default now(),
+  unique (tx_id, seq)
+);
+
+-- Vista de compatibilidad: misma forma que transactions.conversation (texto JSON) con los turns aplicados.
+-- La leen Transactions.get_conversation_by_id (/consulta), px_session_bootstrap y cualquier reporte SQL.
+create or replace view public.transactions_conversation as
+select
+  t.id,
+  t.contact_id,
+  t.event_id,
+  t.name,
+  coalesce(
+    (
+      select (coalesce(nullif(t.conversation, '')::jsonb, '[]'::jsonb)
+              || jsonb_agg(ct.message order by ct.seq))::text
+      from public.conversation_turns ct
+      where ct.tx_id = t.id
+        and ct.seq >= jsonb_array_length(coalesce(nullif(t.conversation, '')::jsonb, '[]'::jsonb))
+      having count(*) > 0
+    ),
+    t.conversation
+  ) as conversation
+from public.transactions t;
+
+grant select on public.transactions_conversation to anon, authenticated, service_role;
+grant select, insert, delete on public.conversation_turns to anon, authenticated, service_role;
+grant usage, select on sequence public.conversation_turns_id_seq to anon, authenticated, service_role;
+
+-- Reescritura completa atómica (ConversationTurns.rewrite): nueva base + borrar los turns en UNA transacción.
+-- Por separado, un PATCH que falla después del delete pierde los turns, y un delete que falla después
+-- del PATCH deja turns viejos con seq >= largo(nueva base) que la vista pega sobre la base nueva.
+create or replace function public.px_rewrite_conversation(
+  p_tx_id bigint,
+  p_conversation text
+)
+returns boolean
+language plpgsql
+set search_path = public
+as $$
+begin
+  update public.transactions set conversation = p_conversation where id = p_tx_id;
+  if not found then
+    return false;
+  end if;
+  delete from public.conversation_turns where tx_id = p_tx_id;
+  return true;
+end;
+$$;
+
+grant execute on function public.px_rewrite_conversation(bigint, text) to anon, authenticated, service_role;
@@ -0,0 +1,17 @@
+-- app/Model/sql/events_model_routing.sql
+-- Ruteo de modelos por evento (lo lee app/services/model_routing.py).
+--
+-- events.model_routing (jsonb, opcional), por tarea:
+--   {
+--     "triage_urgency": {"model": "gpt-4.1-mini", "temperature": 0},
+--     "next_question":  {"model": "gpt-4.1"},
+--     "shadow":         {"triage_urgency": "gpt-4.1-nano"}      -- candidato en modo sombra
+--   }
+-- Tareas: triage_urgency (201), next_question (203), report (202), report_and_digest (202 combinado),
+--         medical_digest, report_cards (/consulta), compaction.
+-- PX_MODEL_ROUTES (env, mismo formato) pisa lo del evento.
+--
+-- Aplicar en el SQL editor de Supabase (idempotente) ANTES de volver a aplicar px_session_bootstrap.sql
+-- (la RPC devuelve esta columna) y luego: notify pgrst, 'reload schema';
+
+alter table public.events add column if not exists model_routing jsonb;
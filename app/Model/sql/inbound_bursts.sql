@@ -0,0 +1,24 @@
+-- app/Model/sql/inbound_bursts.sql
+-- Buffer de la ventana de coalescing por teléfono (lo usa app/services/coalesce.py con PX_COALESCE_WINDOW_S > 0).
+-- Cada mensaje entrante ya procesado (texto / transcripción / descripción de imagen / PDF) deja su fila
+-- y espera la ventana; el más nuevo de la ráfaga (o el primero que pase PX_COALESCE_MAX_WAIT_S) se lleva
+-- todas las filas del teléfono con un DELETE ... RETURNING y corre UN solo turno del engine.
+-- El DELETE es el lock: dos containers no pueden llevarse la misma fila.
+--
+-- payload  {"body", "tiene_adjunto", "media_type", "file_path", "transcription", "description", "pdf_text"}
+--
+-- Aplicar en el SQL editor de Supabase (idempotente) y luego: notify pgrst, 'reload schema';
+-- Si la tabla no existe, el buffer queda en memoria de cada proceso (coalesce solo dentro del mismo container).
+
+create table if not exists public.inbound_bursts (
+  id          bigserial primary key,
+  phone       text not null,
+  message_id  text,                       -- MessageSid / wamid (solo para trazar)
+  payload     jsonb not null,
+  created_at  timestamptz not null default now()
+);
+
+create index if not exists inbound_bursts_phone_idx on public.inbound_bursts (phone, id);
+
+grant select, insert, delete on public.inbound_bursts to anon, authenticated, service_role;
+grant usage, select on sequence public.inbound_bursts_id_seq to anon, authenticated, service_role;
@@ -0,0 +1,22 @@
+-- app/Model/sql/inbound_events.sql
+-- Evento crudo de cada webhook entrante (Twilio form / Meta JSON) en modo ack (PX_INGEST_MODE=ack):
+-- el webhook lo guarda, lo encola (app/services/inbound_queue.py) y devuelve 200; el worker lo procesa.
+--
+-- status   queued -> done | failed (error con el detalle)
+--
+-- Aplicar en el SQL editor de Supabase (idempotente) y luego: notify pgrst, 'reload schema';
+-- Si la tabla no existe, el evento viaja igual en la cola (solo se pierde el registro).
+
+create table if not exists public.inbound_events (
+  id            bigint generated by default as identity primary key,
+  provider      text not null,                      -- 'twilio' | 'meta'
+  payload       jsonb not null,
+  status        text not null default 'queued',
+  error         text,
+  received_at   timestamptz not null default now(),
+  processed_at  timestamptz
+);
+
+create index if not exists inbound_events_status_idx on public.inbound_events (status, received_at);
+
+grant select, insert, update on public.inbound_events to anon, authenticated, service_role;
@@ -0,0 +1,22 @@
+-- app/Model/sql/inbound_messages.sql
+-- Idempotencia de los mensajes entrantes por id del proveedor (Twilio MessageSid / Meta wamid).
+-- Lo usa app/services/inbound_dedupe.py delante de message_p.handle_incoming_message:
+-- un reintento del proveedor choca con la PK y no vuelve a correr el turno.
+--
+-- status   received   (modo ack: el webhook lo aceptó y lo encoló)
+--          processing (un worker / request está corriendo el turno)
+--          done | failed  (failed se puede volver a tomar; processing también si quedó colgado)
+--
+-- Aplicar en el SQL editor de Supabase (idempotente) y luego: notify pgrst, 'reload schema';
+-- Si la tabla no existe, queda solo el LRU en memoria de cada proceso.
+
+create table if not exists public.inbound_messages (
+  provider_message_id  text primary key,
+  provider             text not null,          -- 'twilio' | 'meta'
+  phone                text,
+  status               text not null default 'received',
+  created_at           timestamptz not null default now(),
+  updated_at           timestamptz not null default now()
+);
+
+grant select, insert, update on public.inbound_messages to anon, authenticated, service_role;
@@ -0,0 +1,14 @@
+-- app/Model/sql/medical_digests.sql
+-- Índice único por TX en medical_digests: MedicalDigests.add_row hace upsert con on_conflict=tx_id
+-- (PostgREST necesita el índice único para resolver el conflicto). El digest lo pueden escribir en
+-- paralelo el nodo 202, el nodo 210 y el worker del precompute (PX_PRECOMPUTE=queue): queda una fila.
+--
+-- Si ya hay TX con más de un digest, se deja el más nuevo (id más alto) antes de crear el índice.
+-- Aplicar en el SQL editor de Supabase (idempotente) y luego: notify pgrst, 'reload schema';
+
+delete from public.medical_digests d
+using public.medical_digests newer
+where newer.tx_id = d.tx_id
+  and newer.id > d.id;
+
+create unique index if not exists medical_digests_tx_id_key on public.medical_digests (tx_id);
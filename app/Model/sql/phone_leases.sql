@@ -0,0 +1,24 @@
+-- app/Model/sql/phone_leases.sql
+-- Lease por teléfono para serializar los turnos del engine entre containers / workers
+-- (lo usa app/services/phone_lock.py con PX_PHONE_LOCK=lease, alrededor de message_p.handle_incoming_message).
+-- Sin esto dos entregas del mismo teléfono leen la misma TX abierta, avanzan question_cursor las dos
+-- y la última en escribir transactions.conversation gana.
+--
+-- Es un lease y no pg_advisory_lock: por PostgREST cada request es su propia transacción, así que un
+-- advisory lock de sesión no sobrevive entre el "tomar" y el "soltar".
+--
+-- holder      id del turno que lo tiene (uuid por llamada)
+-- expires_at  vence solo si el turno murió sin soltarlo (PX_PHONE_LEASE_TTL_S > duración máx. de un turno);
+--             uno vencido lo puede tomar otro con un PATCH condicional
+--
+-- Aplicar en el SQL editor de Supabase (idempotente) y luego: notify pgrst, 'reload schema';
+-- Si la tabla no existe, queda solo el lock en memoria de cada proceso.
+
+create table if not exists public.phone_leases (
+  phone       text primary key,
+  holder      text not null,
+  expires_at  timestamptz not null,
+  updated_at  timestamptz not null default now()
+);
+
+grant select, insert, update, delete on public.phone_leases to anon, authenticated, service_role;
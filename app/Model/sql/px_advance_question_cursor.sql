@@ -0,0 +1,61 @@
+-- app/Model/sql/px_advance_question_cursor.sql
+-- Avance atómico del cursor de preguntas de la TX abierta de un contacto
+-- (lo usa Transactions.advance_question_cursor).
+--
+-- En UNA sentencia y con lock de fila:
+--   * si el fingerprint difiere del último -> setea fingerprint/sent_at/timestamp y,
+--     si p_advance, incrementa question_cursor           -> 'new'  / 'new0'
+--   * si es el mismo fingerprint (retry/duplicado)     -> no toca nada -> 'skip' / 'skip0'
+--   * si no hay TX abierta                              -> 'no_tx'
+-- Devuelve {"status": ..., "cursor": <question_cursor final>}.
+-- Dos webhooks concurrentes con la misma pregunta no pueden avanzar el cursor dos veces.
+--
+-- Aplicar en el SQL editor de Supabase (idempotente) y luego: notify pgrst, 'reload schema';
+
+create or replace function public.px_advance_question_cursor(
+  p_contact_id bigint,
+  p_fingerprint text,
+  p_advance boolean default true
+)
+returns jsonb
+language plpgsql
+set search_path = public
+as $$
+declare
+  v_id      bigint;
+  v_cursor  integer;
+  v_fp      text;
+begin
+  select id, coalesce(question_cursor, 0), last_question_fingerprint
+    into v_id, v_cursor, v_fp
+  from transactions
+  where contact_id = p_contact_id
+    and name = 'Abierta'
+  order by "timestamp" desc, id desc
+  limit 1
+  for update;
+
+  if v_id is null then
+    return jsonb_build_object('status', 'no_tx', 'cursor', 0);
+  end if;
+
+  if coalesce(v_fp, '') = coalesce(p_fingerprint, '') then
+    return jsonb_build_object('status', case when p_advance then 'skip' else 'skip0' end,
+                              'cursor', v_cursor);
+  end if;
+
+  update transactions
+     set question_cursor           = v_cursor + case when p_advance then 1 else 0 end,
+         last_question_fingerprint = p_fingerprint,
+         last_question_sent_at     = now(),
+         "timestamp"               = timezone('utc', now())
+   where id = v_id
+  returning question_cursor into v_cursor;
+
+  return jsonb_build_object('status', case when p_advance then 'new' else 'new0' end,
+                            'cursor', v_cursor);
+end;
+$$;
+
+grant execute on function public.px_advance_question_cursor(bigint, text, boolean)
+  to anon, authenticated, service_role;
@@ -0,0 +1,85 @@
+-- app/Model/sql/px_session_bootstrap.sql
+-- Bootstrap de sesión en 1 round trip (lo usa SessionLoader en app/message_p.py).
+--
+-- Devuelve, para un teléfono:
+--   contact       fila de contacts (o null si no existe)
+--   event         config del evento del contacto (default 1, como el engine)
+--   last_tx       última transacción del teléfono, SIN conversation (guard de bienvenida)
+--   open_tx       última transacción 'Abierta' del contacto, CON conversation
+--                 (completa: base + conversation_turns, vía la vista transactions_conversation)
+--   last_msg_key  msg_key del último mensaje del teléfono en ese evento
+--
+-- Aplicar en el SQL editor de Supabase (idempotente). Después de crearla:
+--   notify pgrst, 'reload schema';
+-- Si la función no existe, el engine hace fallback a las consultas REST de siempre.
+-- Requiere conversation_turns.sql aplicado antes (usa la vista transactions_conversation).
+
+create or replace function public.px_session_bootstrap(p_phone text)
+returns jsonb
+language sql
+stable
+set search_path = public
+as $$
+  with c as (
+    select *
+    from contacts
+    where phone = p_phone
+    order by contact_id
+    limit 1
+  ),
+  ev_id as (
+    select coalesce((select event_id from c), 1) as event_id
+  ),
+  e as (
+    select event_id, name, reporte, description, nodo_inicio,
+           cant_preguntas, tiempo_sesion, assistant, model_routing  -- ver events_model_routing.sql
+    from events
+    where event_id = (select event_id from ev_id)
+  ),
+  last_tx as (
+    select id, name, "timestamp", event_id
+    from transactions
+    where phone = p_phone
+    order by "timestamp" desc, id desc
+    limit 1
+  ),
+  open_tx as (
+    select t.*
+    from transactions t
+    join c on t.contact_id = c.contact_id
+    where t.name = 'Abierta'
+    order by t."timestamp" desc, t.id desc
+    limit 1
+  ),
+  last_msg as (
+    select m.msg_key
+    from messages m
+    where m.phone = p_phone
+      and m.event_id = (select event_id from ev_id)
+    order by m.message_id desc
+    limit 1
+  )
+  select jsonb_build_object(
+    'contact',      (select to_jsonb(c) from c),
+    'event',        (select to_jsonb(e) from e),
+    'last_tx',      (select to_jsonb(last_tx) from last_tx),
+    'open_tx',      (select to_jsonb(open_tx)
+                            || jsonb_build_object('conversation', tc.conversation)
+                     from open_tx
+                     join transactions_conversation tc on tc.id = open_tx.id),
+    'last_msg_key', (select msg_key from last_msg)
+  );
+$$;
+
+grant execute on function public.px_session_bootstrap(text) to anon, authenticated, service_role;
+
+-- Índices para que cada sub-consulta sea un index scan de 1 fila
+create index if not exists contacts_phone_idx
+  on contacts (phone);
+create index if not exists transactions_phone_ts_idx
+  on transactions (phone, "timestamp" desc, id desc);
+create index if not exists transactions_contact_abierta_idx
+  on transactions (contact_id, "timestamp" desc, id desc)
+  where name = 'Abierta';
+create index if not exists messages_phone_event_idx
+  on messages (phone, event_id, message_id desc);
@@ -0,0 +1,23 @@
+-- app/Model/sql/report_cache.sql
+-- Cache persistente del reporte para médicos de /consulta (lo usa reporting.build_report_cards_cached).
+--
+-- Una fila por TX. La fila vale solo si coinciden:
+--   conversation_sha256  sha256 del JSON de conversación con el que se generó
+--   prompt_version       hash de (modelo + prompt del assistant + versión del esquema de cards)
+-- Si la conversación de la TX cambia (o el prompt), el hash no matchea -> se regenera y se pisa la fila.
+--
+-- Aplicar en el SQL editor de Supabase (idempotente) y luego: notify pgrst, 'reload schema';
+-- Si la tabla no existe, /consulta sigue funcionando (solo con el LRU en proceso).
+
+create table if not exists public.report_cache (
+  id                   bigserial primary key,
+  tx_id                bigint not null unique references public.transactions (id) on delete cascade,
+  conversation_sha256  text not null,
+  prompt_version       text not null,
+  model                text,
+  report_json          jsonb not null,
+  created_at           timestamptz not null default now()
+);
+
+grant select, insert, update on public.report_cache to anon, authenticated, service_role;
+grant usage, select on sequence public.report_cache_id_seq to anon, authenticated, service_role;
@@ -0,0 +1,26 @@
+-- app/Model/sql/response_chains.sql
+-- Estado server-side de la conversación en la Responses API, por TX (lo usa app/services/response_chain.py
+-- en el nodo 203 con PX_RESPONSE_CHAIN=1). Es el complemento de transactions.question_cursor: una fila por TX.
+--
+-- response_id   id de la última respuesta de Sherlock (se manda como previous_response_id en el turno siguiente)
+-- covered_until índice (exclusivo) del historial que ya tiene esa respuesta; el turno siguiente manda solo
+--               history[covered_until:] (la última pregunta + la respuesta del paciente)
+-- covered_sha256 sha256 de history[:covered_until] (JSON canónico): si el historial se reescribió y ya no
+--               da el mismo hash, no se encadena (historial completo y cadena nueva)
+-- OpenAI guarda las respuestas un tiempo limitado: si el id venció, el nodo vuelve a mandar el historial
+-- completo y empieza una cadena nueva (sin cortar el turno).
+--
+-- Aplicar en el SQL editor de Supabase (idempotente) y luego: notify pgrst, 'reload schema';
+-- Si la tabla no existe, el 203 sigue mandando el historial completo en cada turno.
+
+create table if not exists public.response_chains (
+  tx_id          bigint primary key references public.transactions (id) on delete cascade,
+  response_id    text not null,
+  covered_until  integer not null,
+  covered_sha256 text,
+  updated_at     timestamptz not null default now()
+);
+
+alter table public.response_chains add column if not exists covered_sha256 text;
+
+grant select, insert, update, delete on public.response_chains to anon, authenticated, service_role;
@@ -1,9 +1,20 @@
 from typing import Optional, List, Dict
 from app.Model.enums import DataType
 from app.Model.base_model import BaseModel, TransactionsRegister
+from app.Model.async_base_model import AsyncBaseModel
 from app.Model.field import Field
+from app.Model.connection import DatabaseManager
+from app.Model.conversation_turns import ConversationTurns
+from app.Model.exceptions import RpcNotFoundError
 from datetime import datetime, timezone, timedelta
 import hashlib
+import json
+import os
+
+# Avance atómico del cursor vía RPC (app/Model/sql/px_advance_question_cursor.sql). "0" lo apaga.
+PX_CURSOR_RPC = os.getenv("PX_CURSOR_RPC", "1") == "1"
+CURSOR_RPC_NAME = "px_advance_question_cursor"
+_cursor_rpc_missing = False  # por proceso: si la función no existe se usa el PATCH condicional
 
 class Transactions(BaseModel):
     def __init__(self):
@@ -14,7 +25,7 @@ class Transactions(BaseModel):
             "contact_id": Field(None, DataType.INTEGER, False, False),
             "name": Field(None, DataType.STRING, False, False),
             "phone": Field(None, DataType.STRING, True, False),
-            "conversation": Field(None, DataType.STRING, False, False),
+            "conversation": Field(None, DataType.STRING, False, False, lazy_json=True),  # row.conversation_data = JSON decodificado
             "timestamp": Field(None, DataType.TIMESTAMP, False, False),
             "puntuacion": Field(None, DataType.INTEGER, True, False),  # int2 / SMALLINT
             "comentario": Field(None, DataType.STRING, True, False),    # text
@@ -31,6 +42,16 @@ class Transactions(BaseModel):
         # Exponer los campos para facilitar su uso
         self.data = self._BaseModel__data
 
+    # Orden "más reciente primero" para las lecturas de 1 fila (limit=1 en PostgREST)
+    LATEST_ORDER = "timestamp.desc,id.desc"
+
+    def _select(self, include_conversation: bool) -> str:
+        # `conversation` es el JSON con todo el historial: solo viaja si se pide
+        return "*" if include_conversation else self.select_columns(exclude=("conversation",))
+
+    def _latest(self, fields: Dict, include_conversation: bool = False) -> Optional[TransactionsRegister]:
+        return super().get_one(fields, self.LATEST_ORDER, select=self._select(include_conversation))
+
     def add(
         self,
         contact_id: int,
@@ -66,10 +87,9 @@ class Transactions(BaseModel):
         return results[0] if results else None
 
     def get_last_timestamp_by_phone(self, phone: str) -> Optional[Dict[str, str]]:
-        results = super().get("phone", phone, order_field="timestamp")
-        if not results:
+        last = self._latest({"phone": phone})
+        if not last:
             return None
-        last = results[-1]
         return {
             "id": last.id,
             "timestamp": last.timestamp,
@@ -79,20 +99,44 @@ class Transactions(BaseModel):
     def get_by_contact_id(self, contact_id: int) -> List[TransactionsRegister]:
         return super().get("contact_id", contact_id, order_field="timestamp")
 
+    def get_history_by_contact_id(self, contact_id: int, include_conversation: bool = False) -> List[TransactionsRegister]:
+        """
+        Sesiones del contacto, más recientes primero, para las vistas de historial.
+        Sin `conversation` salvo include_conversation=True.
+        """
+        return (self.query()
+                .select(self._select(include_conversation))
+                .where("contact_id", contact_id)
+                .order(self.LATEST_ORDER)
+                .all())
+
     def get_by_name(self, name: str) -> List[TransactionsRegister]:
         return super().get("name", name, order_field="timestamp")
 
+    def load_conversation(self, row: Optional[TransactionsRegister]) -> List[Dict]:
+        """
+        Historial completo de una TX leída con include_conversation=True:
+        base (`conversation`) + mensajes agregados en conversation_turns (ver conversation_turns.sql).
+        Lazy: los turns se piden solo cuando alguien necesita el historial.
+        """
+        if row is None:
+            return []
+        base = row.conversation_data
+        if not isinstance(base, list):
+            base = []
+        return ConversationTurns().load_history(row.id, base)
+
     def get_open_conversation_by_contact_id(self, contact_id: int) -> str:
-        transactions = self.get_by_contact_id(contact_id)
-        for tx in transactions:
-            if tx.name == "Abierta":
-                return tx.conversation or ""
-        return ""
+        row = self.get_open_row(contact_id, include_conversation=True)
+        if not row:
+            return ""
+        if not ConversationTurns.enabled():
+            return row.conversation or ""
+        history = self.load_conversation(row)
+        return json.dumps(history) if history else (row.conversation or "")
 
     def get_open_transaction_id_by_contact_id(self, contact_id: int) -> Optional[int]:
-        transactions = self.get_by_contact_id(contact_id)
-        abiertas = [tx for tx in transactions if tx.name == "Abierta"]
-        return abiertas[-1].id if abiertas else None
+        return self.get_open_tx_id(contact_id)
 
     def get_event_id_by_tx_id(self, tx_id: int) -> Optional[int]:
         """
@@ -144,18 +188,13 @@ class Transactions(BaseModel):
  # --------- Estado “abierta” (sin cobranzas) ----------
 
     def get_last_transaction_by_event_and_phone(
-        self, event_id: int, phone: str
+        self, event_id: int, phone: str, include_conversation: bool = False
     ) -> Optional[TransactionsRegister]:
         """
         Retorna la última transacción asociada a un event_id y un teléfono dado,
-        o None si no existe.
+        o None si no existe. 1 fila (sin `conversation` salvo include_conversation=True).
         """
-        # Primero traemos todas las txs de ese teléfono ordenadas por timestamp
-        txs_por_telf = super().get("phone", phone, order_field="timestamp")
-        # Filtramos sólo las que tengan el event_id buscado
-        txs_filtradas = [tx for tx in txs_por_telf if tx.event_id == event_id]
-        # Devolvemos la última (más reciente) o None
-        return txs_filtradas[-1] if txs_filtradas else None
+        return self._latest({"phone": phone, "event_id": event_id}, include_conversation)
 
     def get_conversation_by_id(self, tx_id) -> str:
         """
@@ -168,38 +207,40 @@ class Transactions(BaseModel):
         except (ValueError, TypeError):
             return ""
 
+        if ConversationTurns.enabled():
+            # Vista de compatibilidad: base + turns ya aplicados, en 1 GET
+            conversation = ConversationTurns().conversation_text(tx_id_int)
+            if conversation is not None:
+                return conversation
+
         tx = self.get_by_id(tx_id_int)
-        return tx.conversation or ""
+        return (tx.conversation or "") if tx else ""
     
     def is_last_transaction_closed(self, phone: str) -> int:
         """
         Retorna 1 si la última transacción del teléfono tiene name == "Cerrada", 0 en caso contrario.
         """
-        txs = super().get("phone", phone, order_field="timestamp")
-        if not txs:
+        ultima_tx = super().get_one({"phone": phone}, self.LATEST_ORDER, select="id,name")
+        if not ultima_tx:
             return 0
-        ultima_tx = txs[-1]
         return 1 if ultima_tx.name == "Cerrada" else 0
     
 
 
-    def get_last_abierta_by_contact_id(self, contact_id: int):
+    def get_last_abierta_by_contact_id(self, contact_id: int, include_conversation: bool = False):
         """
         #Fallback: trae la última fila con name='Abierta' (sin importar status).
+        1 fila filtrada en el server; `conversation` solo si include_conversation=True.
         """
-        txs = self.get_by_contact_id(contact_id)
-        if not txs:
-            return None
-        abiertas = [tx for tx in txs if getattr(tx, "name", None) == "Abierta"]
-        return abiertas[-1] if abiertas else None
+        return self._latest({"contact_id": contact_id, "name": "Abierta"}, include_conversation)
     
 
 
-    def get_open_row(self, contact_id: int) -> Optional[TransactionsRegister]:
+    def get_open_row(self, contact_id: int, include_conversation: bool = False) -> Optional[TransactionsRegister]:
         """
         Devuelve la transacción 'activa' del contacto: última con name='Abierta'.
         """
-        return self.get_last_abierta_by_contact_id(contact_id)
+        return self.get_last_abierta_by_contact_id(contact_id, include_conversation)
 
     def get_open_tx_id(self, contact_id: int) -> Optional[int]:
         """
@@ -231,75 +272,89 @@ class Transactions(BaseModel):
         # ISO con microsegundos compatible con tu update actual
         return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
 
-    def register_question_attempt_by_contact(
-        self,
-        contact_id: int,
-        *,
-        fingerprint: str,
-        debounce_seconds: int = 90
-    ):
+    def advance_question_cursor(self, contact_id: int, fingerprint: str, advance: bool = True):
         """
-        Idempotencia + debounce por TX ABIERA del contact_id.
+        Registra la pregunta enviada en la TX abierta del contacto de forma atómica.
         Retorna (status, cursor):
-          - status: "new" | "resend" | "skip" | "no_tx"
-          - cursor: valor final de question_cursor tras la operación
-        Reglas:
-          • Si fingerprint != último → incrementa cursor, set fp y sent_at → "new"
-          • Si fingerprint == último:
-               - si pasaron >= debounce → solo actualiza sent_at → "resend"
-               - si no → no hace nada → "skip"
-          • Si no hay TX abierta → "no_tx", 0
+          • fingerprint != último → set fp/sent_at (+1 al cursor si advance) → "new" / "new0"
+          • fingerprint == último (retry/duplicado) → no toca DB → "skip" / "skip0"
+          • sin TX abierta → "no_tx", 0
+          • el PATCH del fallback falló → "error" con el cursor leído (no quedó registrada:
+            el llamador no la puede tratar como "new")
+        - Camino 1: RPC px_advance_question_cursor (1 round trip, lock de fila).
+        - Fallback: 1 lectura + PATCH condicional (question_cursor=eq.N y fingerprint distinto);
+          si el PATCH no actualiza nada, otro webhook ganó la carrera → "skip" con el cursor vigente.
         """
-        row = self.get_open_row(contact_id)
+        global _cursor_rpc_missing
+        if PX_CURSOR_RPC and not _cursor_rpc_missing:
+            try:
+                res = DatabaseManager().rpc(CURSOR_RPC_NAME, {
+                    "p_contact_id": contact_id,
+                    "p_fingerprint": fingerprint,
+                    "p_advance": advance,
+                }) or {}
+                return res.get("status", "no_tx"), int(res.get("cursor") or 0)
+            except RpcNotFoundError:
+                _cursor_rpc_missing = True
+            except Exception as e:
+                print(f"[Transactions.advance_question_cursor] RPC error, uso PATCH condicional: {e}")
+
+        return self._advance_question_cursor_patch(contact_id, fingerprint, advance)
+
+    def _advance_question_cursor_patch(self, contact_id: int, fingerprint: str, advance: bool):
+        skip, new = ("skip", "new") if advance else ("skip0", "new0")
+        row = self._latest({"contact_id": contact_id, "name": "Abierta"})
         if not row:
             return "no_tx", 0
 
         current_cursor = int(getattr(row, "question_cursor", 0) or 0)
         last_fp = getattr(row, "last_question_fingerprint", None)
-        last_sent_at = getattr(row, "last_question_sent_at", None)
-        now_iso = self._now_iso_utc()
-
-        # Caso: pregunta nueva
-        if (last_fp or "") != (fingerprint or ""):
-            new_cursor = current_cursor + 1
-            try:
-                self.update(
-                    id=row.id,
-                    contact_id=row.contact_id,
-                    phone=row.phone,
-                    name=getattr(row, "name", "Abierta"),
-                    event_id=getattr(row, "event_id", None),
-                    # solo los 3 campos + timestamp
-                    # (tu update es parcial: solo setea lo que no es None)
-                )
-                # Ahora setear nuestros 3 campos
-                self.data["question_cursor"].value = new_cursor
-                self.data["last_question_fingerprint"].value = fingerprint
-                self.data["last_question_sent_at"].value = now_iso
-                self.data["timestamp"].value = now_iso
-                super().update("id", row.id)
-            except Exception as e:
-                print(f"[Transactions.register_question_attempt_by_contact] error NEW en TX {row.id}: {e}")
-            return "new", new_cursor
-
-        # Caso: mismo fingerprint → posible retry
-        # parse last_sent_at (puede venir None)
-        last_dt = None
-        if last_sent_at:
-            try:
-                last_dt = datetime.fromisoformat(str(last_sent_at).replace("Z", "+00:00"))
-            except Exception:
-                last_dt = None
+        if (last_fp or "") == (fingerprint or ""):
+            return skip, current_cursor
 
-        should_resend = True
-        if last_dt:
-            should_resend = (datetime.now(timezone.utc) - last_dt) >= timedelta(seconds=debounce_seconds)
+        now_iso = self._now_iso_utc()
+        new_cursor = current_cursor + 1 if advance else current_cursor
+        q = self.query().where("id", row.id)
+        # Compare-and-set sobre lo que leímos: si alguien avanzó en el medio, no matchea
+        if getattr(row, "question_cursor", None) is None:
+            q.is_null("question_cursor")
+        else:
+            q.where("question_cursor", current_cursor)
+        if last_fp is None:
+            q.is_null("last_question_fingerprint")
+        else:
+            q.where("last_question_fingerprint", last_fp)
+        try:
+            updated = q.update({
+                "question_cursor": new_cursor,
+                "last_question_fingerprint": fingerprint,
+                "last_question_sent_at": now_iso,
+                "timestamp": now_iso,
+            })
+        except Exception as e:
+            print(f"[Transactions.advance_question_cursor] error TX {row.id}: {e}")
+            return "error", current_cursor  # no se escribió nada: ni cursor ni fingerprint
 
-        if should_resend:
-            # Política nueva: no reenviar ni tocar DB ante duplicados.
-            return "skip", current_cursor
+        if not updated:
+            # Carrera perdida: devolvemos el estado que dejó el otro proceso
+            fresh = self._latest({"contact_id": contact_id, "name": "Abierta"})
+            return skip, int(getattr(fresh, "question_cursor", 0) or 0) if fresh else 0
+        return new, new_cursor
 
-        return "skip", current_cursor
+    def register_question_attempt_by_contact(
+        self,
+        contact_id: int,
+        *,
+        fingerprint: str
+    ):
+        """
+        Idempotencia por TX ABIERTA del contact_id (ver advance_question_cursor).
+        Retorna (status, cursor):
+          - status: "new" | "skip" | "no_tx" | "error" (no se pudo registrar)
+          - cursor: valor final de question_cursor tras la operación
+        Ante duplicados la política es no reenviar ni tocar DB (no hay ventana de debounce).
+        """
+        return self.advance_question_cursor(contact_id, fingerprint, advance=True)
 
     def set_question_zero(
         self,
@@ -310,59 +365,31 @@ class Transactions(BaseModel):
         """
         Registra la 'pregunta 0' SIN incrementar question_cursor.
         Reglas:
-          • Si no hay TX abierta → ("no_tx", cursor_actual)
+          • Si no hay TX abierta → ("no_tx", 0)
           • Si fingerprint == último → ("skip0", cursor_actual)  [no toca DB]
           • Si fingerprint != último → set fp y sent_at → ("new0", cursor_actual)
+          • Si no se pudo escribir → ("error", cursor_actual)
         """
-        row = self.get_open_row(contact_id)
-        if not row:
-            return "no_tx", 0
+        return self.advance_question_cursor(contact_id, fingerprint, advance=False)
 
-        current_cursor = int(getattr(row, "question_cursor", 0) or 0)
-        last_fp = getattr(row, "last_question_fingerprint", None)
-
-        # Si es el mismo fingerprint, no re-enviamos ni tocamos sent_at
-        if (last_fp or "") == (fingerprint or ""):
-            return "skip0", current_cursor
-
-        now_iso = self._now_iso_utc()
-        try:
-            # update parcial para no pisar otros campos
-            self.update(
-                id=row.id,
-                contact_id=row.contact_id,
-                phone=row.phone,
-                name=getattr(row, "name", "Abierta"),
-                event_id=getattr(row, "event_id", None),
-            )
-            # setear SOLO fp y sent_at (sin mover cursor)
-            self.data["last_question_fingerprint"].value = fingerprint
-            self.data["last_question_sent_at"].value = now_iso
-            self.data["timestamp"].value = now_iso
-            super().update("id", row.id)
-        except Exception as e:
-            print(f"[Transactions.set_question_zero] error TX {row.id}: {e}")
-
-        return "new0", current_cursor
-    def get_last_tx_info_by_phone(self, phone: str):
+    def get_last_tx_info_by_phone(self, phone: str, include_conversation: bool = False):
         """
-        Devuelve info mínima de la última TX para ese teléfono en UNA SOLA lectura:
+        Devuelve info mínima de la última TX para ese teléfono en UNA SOLA lectura (1 fila):
         {
         "id": int,
         "name": str,
         "timestamp": <iso str>,
         "event_id": int | None,
-        "conversation": str | None,
+        "conversation": str | None,   # None salvo include_conversation=True
 
         }
         Retorna None si no hay transacciones.
         """
-        txs = super().get("phone", phone, order_field="timestamp.asc,id.asc")
-        if not txs:
+        select = "id,name,timestamp,event_id" + (",conversation" if include_conversation else "")
+        last = super().get_one({"phone": phone}, self.LATEST_ORDER, select=select)
+        if not last:
             return None
 
-        last = txs[-1]
-
         if isinstance(last, dict):
             return {
                 "id": last.get("id"),
@@ -384,6 +411,16 @@ class Transactions(BaseModel):
         }
 
 
+class AsyncTransactions(AsyncBaseModel):
+    """Lecturas calientes de transactions en async (ver async_base_model.py)."""
+    model_class = Transactions
+
+    async def get_open_row(self, contact_id: int, include_conversation: bool = False) -> Optional[TransactionsRegister]:
+        """Igual que Transactions.get_open_row: última TX 'Abierta' del contacto (1 fila)."""
+        return await self.get_one({"contact_id": contact_id, "name": "Abierta"},
+                                  Transactions.LATEST_ORDER, select=self.sync._select(include_conversation))
+
+
     
 """"
     def get_last_tx_info_by_phone(self, phone: str):
@@ -0,0 +1,202 @@
+# app/Model/write_buffer.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from app.Model.exceptions import DatabaseError
+from app.obs.logs import op_log
+
+# Buffer activo del turno (None = escrituras directas, como siempre)
+_CURRENT: ContextVar[Optional["WriteBuffer"]] = ContextVar("px_write_buffer", default=None)
+
+
+def _record_id(record: Dict[str, Any]) -> int:
+    # Mismo criterio que BaseModel.add (+ message_id, PK de messages)
+    return (record.get("contact_id")
+            or record.get("message_id")
+            or record.get("id")
+            or record.get("user_id")
+            or 0)
+
+
+class PendingInsert:
+    """
+    Fila encolada. `id` se resuelve al hacer flush; si se pide antes, fuerza el flush
+    del buffer (así nadie recibe un id inválido). Si la fila no se pudo insertar, `id`
+    levanta el DatabaseError de esa fila (como lo hacía el add() directo).
+    """
+    __slots__ = ("model", "payload", "record", "error", "_buffer")
+
+    def __init__(self, buffer: "WriteBuffer", model, payload: Dict[str, Any]):
+        self._buffer = buffer
+        self.model = model
+        self.payload = payload
+        self.record: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.record is not None
+
+    @property
+    def id(self) -> int:
+        if self.record is None and self.error is None:
+            try:
+                self._buffer.flush()
+            except DatabaseError:
+                if self.error is None:
+                    raise
+        if self.error is not None:
+            raise DatabaseError(f"Error al crear registro en {self.model.table_name}: {self.error}")
+        return _record_id(self.record or {})
+
+    def __int__(self) -> int:
+        return self.id
+
+    def __repr__(self) -> str:
+        state = (f"id={_record_id(self.record)}" if self.record is not None
+                 else "failed" if self.error is not None else "pending")
+        return f"PendingInsert({self.model.table_name}, {state})"
+
+
+class WriteBuffer:
+    """
+    Unit-of-work de un turno: los INSERT de modelos con buffer_writes=True se encolan
+    y se mandan juntos en flush().
+    - Orden: se respeta el orden de encolado; filas consecutivas de la misma tabla
+      viajan en un solo POST bulk (PostgREST devuelve la representación en el mismo orden).
+    - Si el POST bulk falla, se reintenta fila por fila: una fila mala no se lleva al resto
+      del historial del turno. Las que fallan solas quedan en `failed` (con su error),
+      se loguean con su payload y flush() termina con DatabaseError.
+    - flush() devuelve los ids en orden de encolado (0 para las filas que fallaron).
+    """
+
+    def __init__(self):
+        self._pending: List[PendingInsert] = []
+        self.failed: List[PendingInsert] = []
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def queue(self, model, payload: Dict[str, Any]) -> PendingInsert:
+        item = PendingInsert(self, model, payload)
+        self._pending.append(item)
+        return item
+
+    def has_pending(self, table_name: Optional[str] = None) -> bool:
+        if table_name is None:
+            return bool(self._pending)
+        return any(p.model.table_name == table_name for p in self._pending)
+
+    def flush(self) -> List[int]:
+        pending, self._pending = self._pending, []
+        ids: List[int] = []
+        failed: List[PendingInsert] = []
+        i = 0
+        while i < len(pending):
+            j = i
+            table = pending[i].model.table_name
+            while j < len(pending) and pending[j].model.table_name == table:
+                j += 1
+            batch = pending[i:j]
+            try:
+                self._insert_batch(batch)
+            except DatabaseError as e:
+                failed.extend(self._insert_one_by_one(batch) if len(batch) > 1 else self._fail(batch[0], e))
+            ids.extend(_record_id(p.record) if p.record is not None else 0 for p in batch)
+            i = j
+        if failed:
+            self.failed.extend(failed)
+            raise DatabaseError(f"No se pudieron insertar {len(failed)} de {len(pending)} filas: "
+                                + "; ".join(f"{p.model.table_name}: {p.error}" for p in failed))
+        return ids
+
+    def _insert_one_by_one(self, batch: List[PendingInsert]) -> List[PendingInsert]:
+        """Reintento del batch fila por fila (en orden). Devuelve las que fallaron."""
+        failed: List[PendingInsert] = []
+        for item in batch:
+            try:
+                self._insert_batch([item])
+            except DatabaseError as e:
+                failed.extend(self._fail(item, e))
+        return failed
+
+    @staticmethod
+    def _fail(item: PendingInsert, e: Exception) -> List[PendingInsert]:
+        item.error = str(e)
+        op_log("supabase", f"insert_{item.model.table_name}", "ERROR", error=item.error,
+               extra={"row": item.payload})
+        return [item]
+
+    @staticmethod
+    def _insert_batch(batch: List[PendingInsert]) -> None:
+        model = batch[0].model
+        rows = [p.payload for p in batch]
+        # Bulk insert: columns= (unión de claves) para que filas con claves distintas
+        # reciban DEFAULT en lo que no mandan, en vez de fallar.
+        columns: List[str] = []
+        for row in rows:
+            for key in row:
+                if key not in columns:
+                    columns.append(key)
+        url = f"{model.base_url}?columns={','.join(columns)}"
+
+        t0 = time.perf_counter()
+        try:
+            r = model.session.post(url, headers=model.headers, json=rows)
+            if r.status_code >= 400:
+                raise DatabaseError(f"Error: {r.status_code}, {r.text}")
+            records = r.json() or []
+            if len(records) != len(rows):
+                raise DatabaseError(f"Se insertaron {len(records)} de {len(rows)} filas.")
+        except Exception as e:
+            op_log("supabase", f"bulk_insert_{model.table_name}", "ERROR", t0=t0,
+                   error=str(e), extra={"rows": len(rows)})
+            if isinstance(e, DatabaseError):
+                raise
+            raise DatabaseError(f"Error en insert bulk en {model.table_name}: {e}")
+
+        for item, record in zip(batch, records):
+            item.record = record
+        op_log("supabase", f"bulk_insert_{model.table_name}", "OK", t0=t0, extra={"rows": len(rows)})
+
+
+def current_buffer() -> Optional[WriteBuffer]:
+    return _CURRENT.get()
+
+
+def flush_pending(table_name: Optional[str] = None) -> None:
+    """
+    Read-your-writes: antes de leer una tabla con filas encoladas, se vacía el buffer
+    (entero, para no alterar el orden entre tablas).
+    """
+    buf = _CURRENT.get()
+    if buf is not None and buf.has_pending(table_name):
+        buf.flush()
+
+
+@contextmanager
+def write_buffer():
+    """
+    Abre un buffer de escrituras para el bloque (un turno del engine).
+    Al salir -por fin normal o por error- hace flush; si el flush falla se loguea
+    (no se propaga). Si ya hay uno activo, se reutiliza.
+    """
+    active = _CURRENT.get()
+    if active is not None:
+        yield active
+        return
+
+    buf = WriteBuffer()
+    token = _CURRENT.set(buf)
+    try:
+        yield buf
+    finally:
+        # Igual que con los add() sueltos: un error al loguear mensajes no rompe el turno
+        try:
+            buf.flush()
+        except Exception as flush_err:
+            op_log("supabase", "write_buffer_flush", "ERROR", error=str(flush_err),
+                   extra={"pending": len(buf), "failed": len(buf.failed)})
+        _CURRENT.reset(token)
@@ -1,4 +1,7 @@
+import os
+
 import app.obs.logs as obs_logs
+from app.services import llm_schemas, prompt_window
 
 def ejecutar_nodo(nodo_id, variables):
     tx_obj = variables.get("tx")
@@ -25,6 +28,45 @@ def ejecutar_nodo(nodo_id, variables):
     return result
 
 
+def _event_config(variables, ev=None):
+    """
+    Snapshot del evento del turno: usa el que armó el engine (variables["event_config"])
+    y si no está, lo pide al cache de Events (sin ir a la base si ya está cargado).
+    """
+    config = variables.get("event_config")
+    if config is not None:
+        return config
+    event_id = variables.get("event_id")
+    if event_id is None:
+        return None
+    if ev is None:
+        from app.Model.events import Events
+        ev = Events()
+    config = ev.get_config(event_id)
+    variables["event_config"] = config
+    return config
+
+
+
+# Cómo tiene que ser "next_question" (lo usan el 203 y la llamada fusionada del 201)
+NEXT_QUESTION_GUIDE = (
+    "texto de la próxima pregunta médica que se le hará al paciente, SIN numeración, "
+    "  sin comillas alrededor y sin prefijos. Debe ser una única pregunta clara, centrada en obtener "
+    "  información clínica relevante para el triage.\n"
+    "  Al generar \"next_question\":\n"
+    "    * DEBÉS usar la información ya mencionada por el paciente (por ejemplo: mocos, fiebre, dolor, etc.).\n"
+    "    * NO repitas exactamente una pregunta que ya se haya hecho en la conversación.\n"
+    "    * Evitá preguntas genéricas como \"¿Puede contarme un poco más sobre sus síntomas?\" si ya se usaron; "
+    "      en su lugar hacé preguntas más ESPECÍFICAS (por ejemplo: duración, intensidad, fiebre asociada, "
+    "      color de las secreciones, factores desencadenantes, antecedentes, etc.).\n"
+    "  Puede hacer uso o no de las funcionalidades del celular (texto, fotos, adjuntar archivos).\n"
+    "  Debe incluir exactamente UN emoji neutral al final de la pregunta, pero no uses emojis de caras, manos, "
+    "  corazones, fiesta, fuego ni \"100\".\n"
+)
+
+# nodo_201 clasifica y, si hay que seguir preguntando, trae también la primera pregunta del 203
+FUSED_TRIAGE_ENTRY = os.getenv("PX_FUSED_TRIAGE_ENTRY", "1") == "1"
+
 
 #############################################################
 # PX GUARDIA
@@ -312,9 +354,10 @@ def nodo_201(variables):
 
 
 
+    fused = FUSED_TRIAGE_ENTRY
     mensaje_urgencia = (
         "En base a la siguiente conversación:\n"
-        f"{conversation_str}\n\n"
+        f"{prompt_window.window_str(conversation_str, 201)}\n\n"
         "clasifique lo siguiente:\n\n"
         "1) Si el último mensaje contiene un motivo de consulta MÉDICO válido. "
         "Esto se devuelve en el campo booleano \"is_medical_reason\":\n"
@@ -335,25 +378,43 @@ def nodo_201(variables):
         "- Si \"is_medical_reason\" es true, DEBE devolver \"urgency\": \"urgent\" o \"need_more_questions\" "
         "(nunca \"n/a\").\n"
         "- Use exactamente estos valores de texto para \"urgency\" (respetando mayúsculas y minúsculas).\n"
-        "- No genere preguntas nuevas; solo clasifique.\n"
-        "- Responda ÚNICAMENTE con un objeto JSON válido, sin texto adicional, sin comillas alrededor y sin backticks, "
-        "con este formato exacto:\n"
-        "  {\"is_medical_reason\": true/false, \"urgency\": \"urgent\"/\"need_more_questions\"/\"n/a\"}\n"
     )
+    if fused:
+        mensaje_urgencia += (
+            "\n3) SOLO si \"urgency\" es \"need_more_questions\", genere en \"next_question\" la PRIMERA pregunta "
+            "médica del triage (en cualquier otro caso devuelva \"next_question\": \"\").\n"
+            "\"next_question\": " + NEXT_QUESTION_GUIDE +
+            "- Responda ÚNICAMENTE con un objeto JSON válido, sin texto adicional, sin comillas alrededor y sin backticks, "
+            "con este formato exacto:\n"
+            "  {\"is_medical_reason\": true/false, \"urgency\": \"urgent\"/\"need_more_questions\"/\"n/a\", "
+            "\"next_question\": \"...\"}\n"
+        )
+    else:
+        mensaje_urgencia += (
+            "- No genere preguntas nuevas; solo clasifique.\n"
+            "- Responda ÚNICAMENTE con un objeto JSON válido, sin texto adicional, sin comillas alrededor y sin backticks, "
+            "con este formato exacto:\n"
+            "  {\"is_medical_reason\": true/false, \"urgency\": \"urgent\"/\"need_more_questions\"/\"n/a\"}\n"
+        )
 
     mensaje_urgencia_dic = [{
         "role": "system",
         "content": mensaje_urgencia
     }]
-    result_raw = brain.ask_openai(mensaje_urgencia_dic)
-
-    # 1) Intentar parsear el JSON { "is_medical_reason": ..., "urgency": ... }
+    # 1) Salida estructurada { "is_medical_reason": ..., "urgency": ... [, "next_question"] } (ya validada)
+    next_question = ""
     try:
-        data = json.loads(result_raw)
-        is_medical_reason = data.get("is_medical_reason")
-        urgency = data.get("urgency")
-    except Exception:
-        print(f"[nodo_201] Error parseando JSON de urgencia. raw={result_raw!r}")
+        if fused:
+            data = brain.ask_routed("triage_entry", mensaje_urgencia_dic, llm_schemas.TRIAGE_ENTRY,
+                                    event_config=_event_config(variables))
+            next_question = data["next_question"]
+        else:
+            data = brain.ask_routed("triage_urgency", mensaje_urgencia_dic, llm_schemas.TRIAGE_URGENCY,
+                                    event_config=_event_config(variables))
+        is_medical_reason = data["is_medical_reason"]
+        urgency = data["urgency"]
+    except brain.StructuredOutputError as e:
+        print(f"[nodo_201] Error en la salida estructurada de urgencia: {e}")
         # Si no pudimos parsear, nos comportamos como si NO hubiera motivo médico
         is_medical_reason = False
         urgency = "n/a"
@@ -415,19 +476,24 @@ def nodo_201(variables):
         "response_text": "",
         "group_id": None,
         "question_id": None,
-        "result": "Abierta"
+        "result": "Abierta",
+        # primera pregunta ya generada: el 203 de este mismo turno la usa sin volver a llamar al modelo
+        "prefetched_question": next_question if nodo_destino == 203 else "",
     }
 
 SHOW_URGENCY_TO_PATIENT = False  # cambiar a True si queremos mostrar la linea al paciente
+COMBINED_FINAL_REPORT = os.getenv("PX_COMBINED_REPORT", "1") == "1"  # reporte + digest médico en una sola llamada
 
 def nodo_202(variables):
     """
     Nodo de generación de reporte médico final usando el historial de conversación.
     """
     import app.services.brain as brain
+    from app.flows import workflows_utils
     from app.message_p import send_whatsapp_with_metrics
+    from app.Model.medical_digests import MedicalDigests
     from app.Model.messages import Messages
-    import json, re, os
+    import json, re, os, time
 
     ctt = variables["ctt"]
     ev = variables["ev"]
@@ -442,19 +508,42 @@ def nodo_202(variables):
         tx_id=variables.get("open_tx_id"),
     )
 
+    event_id = variables.get("event_id") or ctt.get_event_id_by_phone(numero_limpio)
+
     try:
-        Messages().add(msg_key=202, text="Estoy pensando, dame unos segundos...", phone=numero_limpio, event_id=ctt.get_event_id_by_phone(numero_limpio))
+        Messages().add(msg_key=202, text="Estoy pensando, dame unos segundos...", phone=numero_limpio, event_id=event_id)
     except Exception as e:
         print(f"[MSG LOG] nodo_202 thinking: {e}")
 
     conversation_history = variables["conversation_history"]
 
-    event_id = ctt.get_event_id_by_phone(numero_limpio)
-    mensaje_reporte = ev.get_reporte_by_event_id(event_id)
+    event_config = _event_config(variables, ev)
+    mensaje_reporte = event_config.reporte if event_config else ev.get_reporte_by_event_id(event_id)
 
     conversation_history.append({"role": "system", "content": mensaje_reporte})
-    # 1) Pedimos al LLM el reporte COMPLETO (incluye línea de urgencia)
-    full_report_text = brain.ask_openai(conversation_history)
+    contacto = variables.get("contacto")
+    digest_instructions = event_config.assistant if event_config else None
+
+    # 1) Pedimos al LLM el reporte COMPLETO (incluye línea de urgencia).
+    #    Al modelo va la ventana del triage (presupuesto del nodo 202) + las instrucciones del reporte.
+    #    Modo combinado: en la misma llamada sale el digest médico y el nodo 210 solo lo lee.
+    prompt_history = prompt_window.window_messages(conversation_history[:-1], 202, keep_system=True)
+    prompt_history.append(conversation_history[-1])
+    full_report_text = None
+    digest = None
+    if COMBINED_FINAL_REPORT:
+        try:
+            full_report_text, digest_text, digest_json = workflows_utils.generar_reporte_y_digest(
+                prompt_history,
+                getattr(contacto, "national_id", None),
+                digest_instructions,
+                event_config=event_config,
+            )
+            digest = (digest_text, digest_json)
+        except Exception as e:
+            print(f"[REPORTE] modo combinado falló, sigo con reporte + digest por separado: {e}")
+    if full_report_text is None:
+        full_report_text = brain.ask_routed("report", prompt_history, event_config=event_config)
     # 2) Según configuración, generamos la versión que ve el paciente
     patient_report_text = full_report_text
     if not SHOW_URGENCY_TO_PATIENT:
@@ -506,6 +595,37 @@ def nodo_202(variables):
     except Exception as e:
         print(f"[MSG LOG] nodo_202 disclaimer: {e}")
     
+    # Digest médico persistido antes de la oferta: el nodo 210 solo lo lee.
+    # - modo combinado: ya salió con el reporte, se guarda acá
+    # - si no: se precalcula en background mientras el paciente lee el reporte
+    tx_id = variables.get("open_tx_id")
+    if digest is not None and tx_id:
+        t_dig = time.perf_counter()
+        try:
+            MedicalDigests().add_row(
+                contact_id=getattr(contacto, "contact_id", None) or 0,
+                tx_id=tx_id,
+                digest_text=digest[0],
+                digest_json=json.dumps(digest[1], ensure_ascii=False),
+            )
+            obs_logs.op_log("supabase", "medical_digest_upsert", "OK", t0=t_dig, extra={"tx_id": tx_id, "mode": "combined"})
+        except Exception as e:
+            obs_logs.op_log("supabase", "medical_digest_upsert", "ERROR", t0=t_dig, error=str(e), extra={"tx_id": tx_id})
+            digest = None  # que lo genere el precompute / nodo 210
+    if digest is None:
+        try:
+            from app.services import precompute
+            precompute.schedule_digest(
+                tx_id,
+                getattr(contacto, "contact_id", None) or 0,
+                getattr(contacto, "national_id", None),
+                variables["conversation_str"],
+                digest_instructions,
+                event_config=event_config,
+            )
+        except Exception as e:
+            print(f"[PRECOMPUTE] nodo_202 digest: {e}")
+
     digest_offer_text = "📄 ¿Querés recibir el *Resumen Médico* de tu consulta?"
 
     conversation_history.append({
@@ -524,12 +644,89 @@ def nodo_202(variables):
         "result": "Abierta",                     #la TX sigue abierta
     }
 
+# Tarea de Sherlock (nodo 203): clasificar la última respuesta y generar la próxima pregunta
+SHERLOCK_TASK = (
+    "Tu tarea ahora es:\n"
+    "1) Analizar la última respuesta del paciente.\n"
+    "2) Decidir si esa respuesta es CLÍNICAMENTE RELEVANTE (aunque no responda exactamente todos los detalles "
+    "   de la pregunta anterior) o si no aporta información sobre su salud.\n"
+    "3) Si la respuesta es clínicamente relevante, generar la mejor próxima pregunta MÉDICA para continuar el triage.\n\n"
+    "Definiciones para \"is_on_topic\":\n"
+    "- Considerá \"is_on_topic\": true cuando la última respuesta del paciente contiene información "
+    "  relacionada con su salud, síntomas, dolor, malestar, antecedentes, medicamentos, embarazo, "
+    "  contexto clínico, etc. Esto incluye respuestas que describen un síntoma o mencionan otros síntomas, "
+    "  aunque no respondan todos los detalles pedidos.\n"
+    "- Considerá \"is_on_topic\": false cuando la última respuesta NO es clínica ni aporta información útil "
+    "  sobre la salud del paciente. \n"
+    "Debés devolver un JSON con las siguientes claves:\n"
+    "- \"is_on_topic\": true/false\n"
+    "- \"next_question\": " + NEXT_QUESTION_GUIDE +
+    "IMPORTANTE:\n"
+    "- Respondé ÚNICAMENTE con un objeto JSON válido, sin texto adicional, sin explicaciones y sin backticks.\n"
+    "- El formato debe ser exactamente:\n"
+    "  {\"is_on_topic\": true/false, \"next_question\": \"...\"}\n"
+)
+
+
+def _ask_next_question(variables, conversation_history, event_config):
+    """
+    Llamada de Sherlock: valida la última respuesta del paciente (is_on_topic) y genera
+    la próxima pregunta. Devuelve (is_on_topic, next_question).
+    Con PX_RESPONSE_CHAIN=1 la conversación viaja como mensajes encadenados por TX
+    (brain.ask_chained): cada turno manda solo lo nuevo.
+    """
+    import json
+
+    import app.services.brain as brain
+    from app.services import compaction, response_chain
+
+    open_tx_id = variables.get("open_tx_id")
+    try:
+        if response_chain.enabled() and open_tx_id:
+            # Si hay que mandar todo (primera llamada o cadena vencida): el mismo recorte que el modo clásico
+            full_input = prompt_window.window_messages(
+                compaction.compact_history(open_tx_id, conversation_history), 203, keep_system=True,
+            )
+            data = brain.ask_chained(
+                "next_question", open_tx_id, conversation_history,
+                "La conversación con el paciente viene en los mensajes; el último mensaje con \"role\": \"user\" "
+                "es la última respuesta del paciente.\n\n" + SHERLOCK_TASK,
+                llm_schemas.NEXT_QUESTION, full_input=full_input, event_config=event_config,
+            )
+        else:
+            # Conversación para el prompt: resumen compactado de lo viejo + turnos recientes, dentro del presupuesto del 203
+            prompt_conversation = prompt_window.window_str(
+                json.dumps(compaction.compact_history(open_tx_id, conversation_history)), 203,
+            )
+            mensaje_def_triage = [{
+                "role": "system",
+                "content": (
+                    "A continuación se muestra la conversación completa hasta ahora, donde el último mensaje con "
+                    "\"role\": \"user\" es la última respuesta del paciente:\n\n"
+                    f"{prompt_conversation}\n\n" + SHERLOCK_TASK
+                ),
+            }]
+            # Salida estructurada {"is_on_topic": ..., "next_question": ...} (ya validada)
+            data = brain.ask_routed("next_question", mensaje_def_triage, llm_schemas.NEXT_QUESTION,
+                                    event_config=event_config)
+        is_on_topic = data["is_on_topic"]
+        next_question = data["next_question"]
+    except brain.StructuredOutputError as e:
+        print(f"[nodo_203] Error en la salida estructurada de Sherlock: {e}")
+        # Si algo falla, como fallback mínimo: tratamos la respuesta como on-topic
+        # y usamos una pregunta genérica para no romper el flujo.
+        is_on_topic = True
+        next_question = "¿Puede contarme un poco más sobre sus síntomas? 🩺"
+    return is_on_topic, next_question
+
+
 def nodo_203(variables):
     """
     Nodo "Sherlock": hace preguntas activas al paciente usando GPT para completar el triage.
     Ahora:
     - Valida si la última respuesta del paciente es coherente con la pregunta.
     - Genera la próxima pregunta (o rehace la misma) en una sola llamada a OpenAI.
+    - Si el 201 de este turno ya trajo la primera pregunta (FUSED_TRIAGE_ENTRY), la usa sin llamar al modelo.
     """
     import json
     import re
@@ -560,11 +757,12 @@ def nodo_203(variables):
         print(f"[nodo_203] Error parseando conversation_str: {e}. conversation_str={conversation_str!r}")
         conversation_history = []
 
-    event_id = ctt.get_event_id_by_phone(numero_limpio)
+    event_id = variables.get("event_id") or ctt.get_event_id_by_phone(numero_limpio)
 
     # Estado de preguntas ya realizadas
     cursor, last_fp, last_sent_at = tx.get_question_state(contact_id)
-    max_preguntas = int(ev.get_cant_preguntas_by_event_id(event_id))
+    event_config = _event_config(variables, ev)
+    max_preguntas = int(event_config.cant_preguntas if event_config else ev.get_cant_preguntas_by_event_id(event_id))
     max_preguntas_str = str(max_preguntas)
 
     question_prefix_pattern = re.compile( r"^(\d+)/" + re.escape(max_preguntas_str) + r" - ")
@@ -634,60 +832,13 @@ def nodo_203(variables):
         except Exception as e:
             print(f"[MSG LOG] nodo_203 intro: {e}")
 
-    # el prompt: solo clasifica si la respuesta es clínica y genera la próxima pregunta
-    mensaje_def_triage_str = (
-        "A continuación se muestra la conversación completa hasta ahora, donde el último mensaje con "
-        "\"role\": \"user\" es la última respuesta del paciente:\n\n"
-        f"{conversation_str}\n\n"
-        "Tu tarea ahora es:\n"
-        "1) Analizar la última respuesta del paciente.\n"
-        "2) Decidir si esa respuesta es CLÍNICAMENTE RELEVANTE (aunque no responda exactamente todos los detalles "
-        "   de la pregunta anterior) o si no aporta información sobre su salud.\n"
-        "3) Si la respuesta es clínicamente relevante, generar la mejor próxima pregunta MÉDICA para continuar el triage.\n\n"
-        "Definiciones para \"is_on_topic\":\n"
-        "- Considerá \"is_on_topic\": true cuando la última respuesta del paciente contiene información "
-        "  relacionada con su salud, síntomas, dolor, malestar, antecedentes, medicamentos, embarazo, "
-        "  contexto clínico, etc. Esto incluye respuestas que describen un síntoma o mencionan otros síntomas, "
-        "  aunque no respondan todos los detalles pedidos.\n"
-        "- Considerá \"is_on_topic\": false cuando la última respuesta NO es clínica ni aporta información útil "
-        "  sobre la salud del paciente. \n"
-        "Debés devolver un JSON con las siguientes claves:\n"
-        "- \"is_on_topic\": true/false\n"
-        "- \"next_question\": texto de la próxima pregunta médica que se le hará al paciente, SIN numeración, "
-        "  sin comillas alrededor y sin prefijos. Debe ser una única pregunta clara, centrada en obtener "
-        "  información clínica relevante para el triage.\n"
-        "  Al generar \"next_question\":\n"
-        "    * DEBÉS usar la información ya mencionada por el paciente (por ejemplo: mocos, fiebre, dolor, etc.).\n"
-        "    * NO repitas exactamente una pregunta que ya se haya hecho en la conversación.\n"
-        "    * Evitá preguntas genéricas como \"¿Puede contarme un poco más sobre sus síntomas?\" si ya se usaron; "
-        "      en su lugar hacé preguntas más ESPECÍFICAS (por ejemplo: duración, intensidad, fiebre asociada, "
-        "      color de las secreciones, factores desencadenantes, antecedentes, etc.).\n"
-        "  Puede hacer uso o no de las funcionalidades del celular (texto, fotos, adjuntar archivos).\n"
-        "  Debe incluir exactamente UN emoji neutral al final de la pregunta, pero no uses emojis de caras, manos, "
-        "  corazones, fiesta, fuego ni \"100\".\n"
-        "IMPORTANTE:\n"
-        "- Respondé ÚNICAMENTE con un objeto JSON válido, sin texto adicional, sin explicaciones y sin backticks.\n"
-        "- El formato debe ser exactamente:\n"
-        "  {\"is_on_topic\": true/false, \"next_question\": \"...\"}\n" )
-
-
-    mensaje_def_triage = [{
-        "role": "system",
-        "content": mensaje_def_triage_str  }]
-
-    raw = brain.ask_openai(mensaje_def_triage)
-
-    # Parsear JSON devuelto
-    try:
-        data = json.loads(raw)
-        is_on_topic = data.get("is_on_topic")
-        next_question = (data.get("next_question") or "").strip()
-    except Exception as e:
-        print(f"[nodo_203] Error parseando JSON de Sherlock. raw={raw!r} err={e}")
-        # Si algo falla, como fallback mínimo: tratamos la respuesta como on-topic
-        # y usamos una pregunta genérica para no romper el flujo.
-        is_on_topic = True
-        next_question = "¿Puede contarme un poco más sobre sus síntomas? 🩺"
+    # Primera pregunta que ya trajo el 201 en este turno (el motivo de consulta ya se validó como clínico)
+    prefetched = (variables.pop("prefetched_question", None) or "").strip()
+    if prefetched and cursor == 0:
+        obs_logs.op_log("openai", "prefetched_question", "OK", extra={"tx_id": variables.get("open_tx_id")})
+        is_on_topic, next_question = True, prefetched
+    else:
+        is_on_topic, next_question = _ask_next_question(variables, conversation_history, event_config)
 
     advance = (is_on_topic is True)
 
@@ -778,12 +929,17 @@ def nodo_203(variables):
         status, new_cursor = tx.register_question_attempt_by_contact(
             contact_id,
             fingerprint=fingerprint,
-            debounce_seconds=90,
         )
 
         if status == "new":
             # Usamos el cursor que devuelve la DB (debería coincidir con proposed_question_id)
             question_id = new_cursor
+        elif status == "error":
+            # No quedó registrada (ni cursor ni fingerprint): la pregunta sale igual con el número
+            # propuesto, pero queda logueado (un reintento del webhook no la va a ver como duplicado)
+            obs_logs.op_log("supabase", "question_cursor", "ERROR", error="no registrada",
+                            extra={"contact_id": contact_id, "question_id": proposed_question_id})
+            question_id = proposed_question_id
         else:
             # En caso de duplicado o debounce, nos aseguramos de no retroceder
             question_id = max(proposed_question_id, new_cursor or proposed_question_id)
@@ -854,11 +1010,11 @@ def nodo_210(variables):
     digest_json = {}
 
     if tx_id:
-        # A) Intentar recuperar digest ya persistido
+        # A) Digest ya persistido (normalmente lo guardó el nodo 202). Si se está precalculando,
+        #    esperarlo en vez de generarlo dos veces (en modo queue lo corre el worker: se consulta la tabla)
         try:
-            rows = MedicalDigests().get("tx_id", tx_id)
-            if rows:
-                digest_text = getattr(rows[0], "digest_text", None)
+            from app.services import precompute
+            digest_text = precompute.wait_for_digest(tx_id)
         except Exception:
             digest_text = None
 
@@ -866,14 +1022,17 @@ def nodo_210(variables):
         if not digest_text:
             try:
                 try:
-                    digest_instructions = Events().get_assistant_by_event_id(event_id)
+                    event_config = _event_config(variables)
+                    digest_instructions = event_config.assistant if event_config else None
                 except Exception:
+                    event_config = None
                     digest_instructions = None
 
                 digest_text, digest_json = workflows_utils.generar_medical_digest(
                     conversation_str,
                     national_id,
                     digest_instructions,
+                    event_config=event_config,
                 )
             except Exception:
                 digest_text = (
@@ -882,7 +1041,7 @@ def nodo_210(variables):
                 )
                 digest_json = {}
 
-            # Persistir digest (ideal: UNIQUE(tx_id) para idempotencia)
+            # Persistir digest: upsert por tx_id (si el worker lo guardó en paralelo, queda una sola fila)
             try:
                 MedicalDigests().add_row(
                     contact_id=contact_id,
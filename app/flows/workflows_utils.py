@@ -11,6 +11,8 @@ import re
 from typing import Tuple, Dict, Any, Optional
 
 import app.services.brain as brain
+from app.services import prompt_window
+from app.services.llm_schemas import OutputSchema, object_schema, require_strings, string_fields
 
 # ===== Config =====
 MAX_LEN = 1200               # Twilio ~1600 -> margen seguro
@@ -25,6 +27,13 @@ JSON_KEYS = [
     "treatment_plan",     # tratamiento sugerido
 ]
 
+# Salida estructurada del extractor (brain.ask_routed / ask_openai_json)
+DIGEST_SCHEMA = OutputSchema(
+    name="medical_digest",
+    schema=object_schema(string_fields(JSON_KEYS)),
+    validate=lambda data: require_strings(data, JSON_KEYS),
+)
+
 # Regex para capturar la línea EXACTA de urgencia (5 cuadrados + etiqueta)
 # 🟩=U+1F7E9, 🟨=U+1F7E8, 🟧=U+1F7E7, 🟥=U+1F7E5, ⬜=U+2B1C
 STRICT_URGENCY = True 
@@ -33,6 +42,40 @@ URGENCY_LINE_RE = re.compile(
     re.MULTILINE
 )
 
+DEFAULT_DIGEST_INSTRUCTIONS = (
+    "Eres un médico especialista en medicina de urgencias entrenado para procesar la transcripción de un triage AI y convertirla en un reporte médico breve y estructurado para un médico de guardia.\n"
+    "SALIDA: EXCLUSIVAMENTE JSON VÁLIDO (sin backticks) con estas claves EXACTAS (valores string): "
+    "\"chief_complaint\",\"symptoms_course\",\"clinical_assessment\",\"suggested_tests\",\"treatment_plan\".\n"
+    "\n"
+    "MODO ESTRICTO DE HECHOS (OBLIGATORIO):\n"
+    "- Afirmá SOLO lo que esté textual o inequívocamente respaldado por la transcripción.\n"
+    "- Si falta un dato (p. ej., lateralidad, segmento anatómico, mecanismo, tiempos exactos, antecedentes, valores), escribí \"No informado\" "
+    "o usá formulaciones genéricas SIN inventar (p. ej., \"región afectada\", \"miembro comprometido\").\n"
+    "- No escales certeza diagnóstica: síntomas ≠ diagnóstico confirmado. Usá un léxico prudente solo en clinical_assessment: "
+    "\"probable\", \"posible\", \"a considerar\". NO inventes resultados ni hallazgos no mencionados.\n"
+    "- No deduzcas: derecha/izquierda, nombres de huesos/órganos específicos, embarazo, comorbilidades, alergias, medicaciones, valores de signos/labs, mecanismo exacto, si no aparecen.\n"
+    "\n"
+    "REGLAS DE ESTILO:\n"
+    "1) Español, registro clínico, frases cortas.\n"
+    "2) No repitas información entre campos.\n"
+    "3) Si un dato no surge claro, usá EXACTAMENTE: \"No informado\".\n"
+    "4) En \"suggested_tests\" NO incluyas obviedades como \"examen físico\", \"signos vitales\" ni \"laboratorio básico\".\n"
+    "5) Evitá verbos vagos sin objetivo (\"controlar\", \"evaluar\"); especificá propósito.\n"
+    "\n"
+    "CRITERIOS POR CAMPO:\n"
+    "- chief_complaint: motivo principal (qué + tiempo si aparece; si no, \"No informado\").\n"
+    "- symptoms_course: cronología/evolución y signos asociados presentes en el texto.\n"
+    "- clinical_assessment: hipótesis y riesgos inmediatos SOLO si surgen del texto; usar léxico prudente si no hay confirmación.\n"
+    "- suggested_tests: estudios complementarios para diagnosticar al paciente. Si región exacta no aparece, usar \"región afectada\".\n"
+    "- treatment_plan: medidas iniciales concretas (intervención + vía + objetivo) sin asumir datos ausentes.\n"
+    "\n"
+    "CONSISTENCIA TÉCNICA (GENÉRICA):\n"
+    "- Generalizá anatomía si faltan detalles (\"miembro afectado\", \"región afectada\").\n"
+    "- No conviertas síntomas en diagnósticos confirmados sin mención explícita (p. ej., no poner \"fractura\" si nunca se menciona o confirma).\n"
+    "- No inventes valores, resultados, ni antecedentes.\n"
+    "Devolvé SOLO el JSON final."
+)
+
 def _build_extractor_messages(
     conversation_str: str,
     digest_instructions: Optional[str] = None,
@@ -48,39 +91,7 @@ def _build_extractor_messages(
     if digest_instructions:
         system = digest_instructions.strip()
     else:
-        system = (
-            "Eres un médico especialista en medicina de urgencias entrenado para procesar la transcripción de un triage AI y convertirla en un reporte médico breve y estructurado para un médico de guardia.\n"
-            "SALIDA: EXCLUSIVAMENTE JSON VÁLIDO (sin backticks) con estas claves EXACTAS (valores string): "
-            "\"chief_complaint\",\"symptoms_course\",\"clinical_assessment\",\"suggested_tests\",\"treatment_plan\".\n"
-            "\n"
-            "MODO ESTRICTO DE HECHOS (OBLIGATORIO):\n"
-            "- Afirmá SOLO lo que esté textual o inequívocamente respaldado por la transcripción.\n"
-            "- Si falta un dato (p. ej., lateralidad, segmento anatómico, mecanismo, tiempos exactos, antecedentes, valores), escribí \"No informado\" "
-            "o usá formulaciones genéricas SIN inventar (p. ej., \"región afectada\", \"miembro comprometido\").\n"
-            "- No escales certeza diagnóstica: síntomas ≠ diagnóstico confirmado. Usá un léxico prudente solo en clinical_assessment: "
-            "\"probable\", \"posible\", \"a considerar\". NO inventes resultados ni hallazgos no mencionados.\n"
-            "- No deduzcas: derecha/izquierda, nombres de huesos/órganos específicos, embarazo, comorbilidades, alergias, medicaciones, valores de signos/labs, mecanismo exacto, si no aparecen.\n"
-            "\n"
-            "REGLAS DE ESTILO:\n"
-            "1) Español, registro clínico, frases cortas.\n"
-            "2) No repitas información entre campos.\n"
-            "3) Si un dato no surge claro, usá EXACTAMENTE: \"No informado\".\n"
-            "4) En \"suggested_tests\" NO incluyas obviedades como \"examen físico\", \"signos vitales\" ni \"laboratorio básico\".\n"
-            "5) Evitá verbos vagos sin objetivo (\"controlar\", \"evaluar\"); especificá propósito.\n"
-            "\n"
-            "CRITERIOS POR CAMPO:\n"
-            "- chief_complaint: motivo principal (qué + tiempo si aparece; si no, \"No informado\").\n"
-            "- symptoms_course: cronología/evolución y signos asociados presentes en el texto.\n"
-            "- clinical_assessment: hipótesis y riesgos inmediatos SOLO si surgen del texto; usar léxico prudente si no hay confirmación.\n"
-            "- suggested_tests: estudios complementarios para diagnosticar al paciente. Si región exacta no aparece, usar \"región afectada\".\n"
-            "- treatment_plan: medidas iniciales concretas (intervención + vía + objetivo) sin asumir datos ausentes.\n"
-            "\n"
-            "CONSISTENCIA TÉCNICA (GENÉRICA):\n"
-            "- Generalizá anatomía si faltan detalles (\"miembro afectado\", \"región afectada\").\n"
-            "- No conviertas síntomas en diagnósticos confirmados sin mención explícita (p. ej., no poner \"fractura\" si nunca se menciona o confirma).\n"
-            "- No inventes valores, resultados, ni antecedentes.\n"
-            "Devolvé SOLO el JSON final."
-        )
+        system = DEFAULT_DIGEST_INSTRUCTIONS
 
     # 👇 NUEVO: sumar instrucciones específicas del evento si vienen
     if extra_instructions:
@@ -101,26 +112,6 @@ def _build_extractor_messages(
 
 
 
-def _safe_load_json(text: str) -> Dict[str, Any]:
-    """Carga JSON de forma robusta; si falla, retorna {}."""
-    t = (text or "").strip()
-    # remover posibles fences ```json ... ```
-    if t.startswith("```"):
-        t = re.sub(r"^```(?:json)?\s*|\s*```$", "", t, flags=re.I | re.S).strip()
-    try:
-        data = json.loads(t or "{}")
-        return data if isinstance(data, dict) else {}
-    except Exception:
-        # intento de extraer primer {...} balanceado
-        s, e = t.find("{"), t.rfind("}")
-        if s != -1 and e > s:
-            try:
-                data = json.loads(t[s:e+1])
-                return data if isinstance(data, dict) else {}
-            except Exception:
-                return {}
-        return {}
-
 def _extract_urgency_line(conversation_str: str) -> str:
     """
     Parsea conversation_str (JSON) → recorre SOLO mensajes del assistant →
@@ -155,42 +146,9 @@ def _truncate(text: str, max_len: int = MAX_LEN) -> str:
     truncated = text[: max_len - 1].rstrip()
     return truncated + "…"
 
-def generar_medical_digest(
-    conversation_str: str,
-    national_id: Optional[str],
-    digest_instructions: Optional[str] = None,
-    extra_instructions: Optional[str] = None,
-) -> Tuple[str, Dict[str, Any]]:
-    """
-    Genera el digest para médicos a partir del conversation_str.
-    - Usa la línea EXACTA de urgencia del reporte si está presente (no infiere).
-    - Pide al LLM las secciones clínicas del digest con keys en inglés.
-    - Devuelve (digest_text, digest_json).
-    """
-    # 1) Urgencia exacta (si existe en el reporte)
-    urgency_line = _extract_urgency_line(conversation_str or "")
-
-    # 2) Extraer secciones con LLM (temp=0 por configuración de brain)
-    messages = _build_extractor_messages(
-        conversation_str or "[]",
-        digest_instructions=digest_instructions,
-        extra_instructions=extra_instructions,
-    )
-
-    raw = brain.ask_openai(messages)  # temperatura por defecto 0
-    try:
-        print("[DIGEST DEBUG] raw LLM (primeros 400 chars):", (raw or "")[:400])
-    except Exception:
-        pass
-    data = _safe_load_json(raw)
-
-    if not data:
-        try:
-            print("[DIGEST DEBUG] JSON vacío o inválido, usando NO_INFO. raw length:", len(raw or ""))
-        except Exception:
-            pass
-
-    # 3) Normalización y defaults
+def _render_digest(data: Dict[str, Any], urgency_line: str, national_id: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+    """Normaliza las secciones que devolvió el LLM y arma (digest_text, digest_json)."""
+    # Normalización y defaults
     values: Dict[str, str] = {}
     for k in JSON_KEYS:
         v = (data.get(k) or "").strip()
@@ -205,7 +163,7 @@ def generar_medical_digest(
 
     dni = (national_id or "").strip() or NO_INFO
 
-    # 4) Render del mensaje (ES) con título y bloques
+    # Render del mensaje (ES) con título y bloques
     bold = lambda t: f"*{t}*"
 
     blocks = [
@@ -220,7 +178,7 @@ def generar_medical_digest(
     ]
 
     digest_text = _truncate("\n\n".join(blocks), MAX_LEN)
-    # 5) JSON estructurado (keys en inglés)
+    # JSON estructurado (keys en inglés)
     digest_json: Dict[str, Any] = {
         "national_id": dni,
         "urgency_line": urgency_line,
@@ -234,6 +192,101 @@ def generar_medical_digest(
     return digest_text, digest_json
 
 
+def generar_medical_digest(
+    conversation_str: str,
+    national_id: Optional[str],
+    digest_instructions: Optional[str] = None,
+    extra_instructions: Optional[str] = None,
+    event_config=None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Genera el digest para médicos a partir del conversation_str.
+    - Usa la línea EXACTA de urgencia del reporte si está presente (no infiere).
+    - Pide al LLM las secciones clínicas del digest con keys en inglés.
+    - Devuelve (digest_text, digest_json).
+    """
+    # 1) Urgencia exacta (si existe en el reporte)
+    urgency_line = _extract_urgency_line(conversation_str or "")
+
+    # 2) Extraer secciones con LLM (temp=0 por configuración de brain), sobre la ventana del digest
+    messages = _build_extractor_messages(
+        prompt_window.window_str(conversation_str or "[]", "digest"),
+        digest_instructions=digest_instructions,
+        extra_instructions=extra_instructions,
+    )
+
+    try:
+        data = brain.ask_routed("medical_digest", messages, DIGEST_SCHEMA, event_config=event_config)
+    except brain.StructuredOutputError as e:
+        print(f"[DIGEST DEBUG] JSON vacío o inválido, usando NO_INFO: {e}")
+        data = {}
+
+    # 3) Normalización, render (ES) y JSON estructurado
+    return _render_digest(data, urgency_line, national_id)
+
+
+# ===== Modo combinado: reporte al paciente + digest médico en UNA llamada =====
+PATIENT_REPORT_KEY = "patient_report"
+
+
+def _validate_report_and_digest(data: Dict[str, Any]) -> Dict[str, Any]:
+    out = require_strings(data, [PATIENT_REPORT_KEY, *JSON_KEYS])
+    if not out[PATIENT_REPORT_KEY]:
+        raise ValueError(f"'{PATIENT_REPORT_KEY}' vacío")
+    return out
+
+
+REPORT_AND_DIGEST_SCHEMA = OutputSchema(
+    name="report_and_digest",
+    schema=object_schema(string_fields([PATIENT_REPORT_KEY, *JSON_KEYS])),
+    validate=_validate_report_and_digest,
+)
+
+
+def _build_combined_messages(conversation_history: list, digest_instructions: Optional[str] = None) -> list[dict]:
+    """
+    Historial del nodo 202 (ya trae las instrucciones del reporte como último system)
+    + un system que pide el reporte y las secciones del digest en un único JSON.
+    """
+    keys = ",".join(f'"{k}"' for k in JSON_KEYS)
+    system = (
+        "ADEMÁS del reporte, armá el resumen para el médico de guardia con estas instrucciones:\n"
+        f"{(digest_instructions or DEFAULT_DIGEST_INSTRUCTIONS).strip()}\n\n"
+        "FORMATO FINAL (prevalece sobre cualquier indicación de formato anterior):\n"
+        "EXCLUSIVAMENTE un objeto JSON VÁLIDO (sin backticks) con valores string y estas claves EXACTAS:\n"
+        f'- "{PATIENT_REPORT_KEY}": el reporte COMPLETO para el paciente, tal como lo pedían las instrucciones del reporte '
+        "(incluida la línea de 5 cuadrados + \"Urgencia Estimada\" si corresponde).\n"
+        f"- {keys}: las secciones del resumen médico."
+    )
+    return list(conversation_history) + [{"role": "system", "content": system}]
+
+
+def generar_reporte_y_digest(
+    conversation_history: list,
+    national_id: Optional[str],
+    digest_instructions: Optional[str] = None,
+    event_config=None,
+) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    Reporte del paciente y digest médico con una sola llamada al LLM (en vez de nodo_202 + nodo_210).
+    - La línea de urgencia del digest se toma EXACTA del reporte generado.
+    - Devuelve (full_report_text, digest_text, digest_json).
+    - ValueError si la respuesta no trae el reporte: el caller vuelve al flujo de dos llamadas.
+    """
+    try:
+        data = brain.ask_routed("report_and_digest", _build_combined_messages(conversation_history, digest_instructions),
+                                REPORT_AND_DIGEST_SCHEMA, event_config=event_config)
+    except brain.StructuredOutputError as e:
+        raise ValueError(f"respuesta combinada inválida: {e}")
+    full_report_text = data[PATIENT_REPORT_KEY]
+
+    m = URGENCY_LINE_RE.findall(full_report_text)
+    urgency_line = m[-1].strip() if m else ""
+
+    digest_text, digest_json = _render_digest(data, urgency_line, national_id)
+    return full_report_text, digest_text, digest_json
+
+
 
 from typing import Optional
 
@@ -10,7 +10,8 @@ import hashlib
 #from typing import Optional
 #from dateutil.parser import isoparse
 #import requests
-from typing import Optional
+from typing import Any, Optional
+from dataclasses import dataclass
 
 
 
@@ -25,11 +26,16 @@ from app.Model.users import Users
 from app.Model.enums import Role
 from app.Model.engine import Engine
 from app.Model.contacts import Contacts
-from app.Model.messages import Messages
-from app.Model.transactions import Transactions
+from app.Model.messages import Messages, AsyncMessages
+from app.Model.transactions import Transactions, AsyncTransactions
+from app.Model.conversation_turns import ConversationTurns, conversation_delta
 from app.Model.questions import Questions
-from app.Model.events import Events
+from app.Model.events import Events, prime_event_config
 from app.Model.privacy_consents import PrivacyConsents
+from app.Model.write_buffer import write_buffer, flush_pending
+from app.Model.http_session import gather_sync
+from app.Model.connection import DatabaseManager
+from app.Model.exceptions import RpcNotFoundError
 
 from app.Utils.table_cleaner import TableCleaner
 from app.flows.workflow_logic import ejecutar_nodo
@@ -37,6 +43,7 @@ from app.flows.workflow_logic import ejecutar_nodo
 import app.services.brain as brain
 import app.services.uploader as uploader
 import app.services.decisions as decs
+from app.services import phone_lock
 #import app.services.embedding as vector
 from app.services.decisions import next_node_fofoca_sin_logica, limpiar_numero, calcular_diferencia_en_minutos,ejecutar_codigo_guardado, calcular_diferencia_desde_info
 
@@ -72,6 +79,89 @@ MEDICAL_DIGEST_DISCLAIMER = (
 
 
 
+# Bootstrap de sesión en 1 RPC (app/Model/sql/px_session_bootstrap.sql). "0" lo apaga.
+PX_SESSION_RPC = os.getenv("PX_SESSION_RPC", "1") == "1"
+# Camino REST: lecturas independientes del turno en paralelo (capa async, httpx). "0" = secuencial.
+PX_ASYNC_FANOUT = os.getenv("PX_ASYNC_FANOUT", "1") == "1"
+
+
+@dataclass
+class SessionSnapshot:
+    """Estado de arranque del turno, tal como lo devuelve px_session_bootstrap."""
+    contacto: Any
+    event_id: int
+    event_config: Any
+    last_tx_info: Optional[dict]
+    open_row: Any
+    last_msg_key: Optional[int]
+
+
+class SessionLoader:
+    """
+    Trae contacto + config del evento + última TX + TX abierta + último msg_key en UNA llamada
+    (RPC px_session_bootstrap) en vez de ~5 GETs secuenciales.
+    - load() devuelve None si hay que usar el camino REST de siempre: RPC apagada,
+      función no instalada (404 -> se recuerda por proceso), error, o contacto nuevo
+      (la creación sigue en obtener_o_crear_contacto).
+    """
+    RPC_NAME = "px_session_bootstrap"
+    _rpc_missing = False  # por proceso: si la función no existe no la reintentamos en cada turno
+
+    def __init__(self, db: Optional[DatabaseManager] = None):
+        self.db = db or DatabaseManager()
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return PX_SESSION_RPC and not cls._rpc_missing
+
+    def load(self, numero_limpio: str) -> Optional[SessionSnapshot]:
+        if not self.enabled():
+            return None
+        t0 = time.perf_counter()
+        try:
+            data = self.db.rpc(self.RPC_NAME, {"p_phone": numero_limpio}) or {}
+        except RpcNotFoundError as e:
+            type(self)._rpc_missing = True
+            op_log("supabase", "session_bootstrap_rpc", "FALLBACK", t0=t0, error=str(e),
+                   extra={"reason": "rpc_missing"})
+            return None
+        except Exception as e:
+            op_log("supabase", "session_bootstrap_rpc", "ERROR", t0=t0, error=str(e))
+            return None
+
+        if not data.get("contact"):
+            op_log("supabase", "session_bootstrap_rpc", "OK", t0=t0, extra={"contact": "new"})
+            return None
+
+        contacto = Contacts().row_class.wrap(data["contact"])
+        event_id = getattr(contacto, "event_id", None) or 1
+        event_config = prime_event_config(data.get("event"))
+
+        last_tx = data.get("last_tx")
+        last_tx_info = None
+        if last_tx:
+            last_tx_info = {
+                "id": last_tx.get("id"),
+                "name": last_tx.get("name"),
+                "timestamp": last_tx.get("timestamp"),
+                "event_id": last_tx.get("event_id"),
+                "conversation": None,
+            }
+        open_tx = data.get("open_tx")
+        open_row = Transactions().row_class.wrap(open_tx) if open_tx else None
+
+        op_log("supabase", "session_bootstrap_rpc", "OK", t0=t0,
+               extra={"has_open_tx": open_row is not None, "has_last_tx": last_tx_info is not None})
+        return SessionSnapshot(
+            contacto=contacto,
+            event_id=event_id,
+            event_config=event_config,
+            last_tx_info=last_tx_info,
+            open_row=open_row,
+            last_msg_key=data.get("last_msg_key"),
+        )
+
+
 def _get_contact_id(contacto) -> Optional[int]:
     """Resuelve contact_id  (objeto o dict).Se usa para cerrar TX vieja o abrir nuevaa"""
     if contacto is None:
@@ -85,20 +175,23 @@ def _get_contact_id(contacto) -> Optional[int]:
 def _build_session_context(ev: Events, event_id: int):
     """
     Arma el contexto base de la sesión.
-    Devuelve (contexto_agente, base_context_json, nodo_inicio, ttl_min).
+    Devuelve (contexto_agente, base_context_json, nodo_inicio, ttl_min, event_config).
+    event_config es el snapshot cacheado del evento (1 lectura de `events` como mucho).
     """
-    contexto_agente = ev.get_description_by_event_id(event_id) or ""
+    event_config = ev.get_config(event_id)
+
+    contexto_agente = (event_config.description if event_config else None) or ""
     base_context = json.dumps([{"role": "system", "content": contexto_agente}])  #se pasa para gestionar sesion y mensje
 
-    nodo_inicio = ev.get_nodo_inicio_by_event_id(event_id) or 206
+    nodo_inicio = (event_config.nodo_inicio if event_config else None) or 206
 
-    ttl_min = ev.get_time_by_event_id(event_id) or 5
-    return contexto_agente, base_context, nodo_inicio, ttl_min
+    ttl_min = (event_config.tiempo_sesion if event_config else None) or 5
+    return contexto_agente, base_context, nodo_inicio, ttl_min, event_config
 
 
 def _run_welcome_guard( tx: Transactions, msj: Messages,
     numero_limpio: str, to: str, contact_id: Optional[int], event_id: int, base_context: str,
-    nodo_inicio: int, ttl_min: int, welcome_msg: str, ) -> Optional[str]:
+    nodo_inicio: int, ttl_min: int, welcome_msg: str, snapshot: Optional[SessionSnapshot] = None, ) -> Optional[str]:
     """
     Ejecuta el guard de bienvenida.
     - Si message1 == True:
@@ -110,7 +203,7 @@ def _run_welcome_guard( tx: Transactions, msj: Messages,
         * devuelve "Ok" (para cortar flujo).
     - Si message1 == False: devuelve None y el flujo sigue normal.
     """
-    if not message1(tx, numero_limpio, ttl_min):
+    if not message1(tx, numero_limpio, ttl_min, snapshot=snapshot):
         return None #continua el flujo
 
 
@@ -122,7 +215,7 @@ def _run_welcome_guard( tx: Transactions, msj: Messages,
 
     # ==== inspección de TX previa ====
     try:
-        last_info = tx.get_last_tx_info_by_phone(numero_limpio)  # UNA lectura
+        last_info = snapshot.last_tx_info if snapshot else tx.get_last_tx_info_by_phone(numero_limpio)  # UNA lectura (o ninguna con snapshot)
         if not last_info:
             op_log("engine","prev_tx_check","OK",  to_phone=numero_limpio, extra={"status": "no_prev_tx"},  )  #caso no hay tx previa       
         else:
@@ -212,6 +305,17 @@ def _aplicar_adjuntos_si_corresponde( msg_key,tiene_adjunto,media_type,descripti
 
 @log_latency
 def handle_incoming_message( body,to,tiene_adjunto,media_type,file_path,transcription, description,pdf_text,):
+    """
+    Turno completo del engine. Los inserts en `messages` del turno se acumulan y se
+    escriben en un solo POST al terminar (o ante un error).
+    Un turno a la vez por teléfono (phone_lock): dos entregas del mismo paciente no pisan la misma TX.
+    """
+    with phone_lock.hold(limpiar_numero(to or "")), write_buffer():
+        return _handle_incoming_message(body, to, tiene_adjunto, media_type, file_path,
+                                        transcription, description, pdf_text)
+
+
+def _handle_incoming_message( body,to,tiene_adjunto,media_type,file_path,transcription, description,pdf_text,):
 
     #Normalizo input
     body = (body or "")
@@ -221,11 +325,17 @@ def handle_incoming_message( body,to,tiene_adjunto,media_type,file_path,transcri
     ev = Events()
     msj = Messages()
 
+    # 0) Bootstrap en 1 RPC (si está instalada); si no, camino REST de siempre
+    snapshot = SessionLoader().load(numero_limpio)
+
     # 1) Obtener contacto + event_id (antes del guard para conocer TTL del evento)
-    contacto, event_id = obtener_o_crear_contacto(numero_limpio)
+    if snapshot:
+        contacto, event_id = snapshot.contacto, snapshot.event_id
+    else:
+        contacto, event_id = obtener_o_crear_contacto(numero_limpio)
 
     # 2) Contexto base de la sesión
-    contexto_agente, base_context, nodo_inicio, TTL_MIN = _build_session_context(
+    contexto_agente, base_context, nodo_inicio, TTL_MIN, event_config = _build_session_context(
         ev, event_id
     )
 
@@ -233,13 +343,13 @@ def handle_incoming_message( body,to,tiene_adjunto,media_type,file_path,transcri
     contact_id = _get_contact_id(contacto)
 
     # 4) Guard de sesión: si corresponde, ENVIAR WELCOME y NO procesar este mensaje
-    guard_result = _run_welcome_guard( tx=tx,msj=msj, numero_limpio=numero_limpio,to=to, contact_id=contact_id,event_id=event_id,base_context=base_context,nodo_inicio=nodo_inicio,ttl_min=TTL_MIN,  welcome_msg=WELCOME_MSG_DNI,)
+    guard_result = _run_welcome_guard( tx=tx,msj=msj, numero_limpio=numero_limpio,to=to, contact_id=contact_id,event_id=event_id,base_context=base_context,nodo_inicio=nodo_inicio,ttl_min=TTL_MIN,  welcome_msg=WELCOME_MSG_DNI, snapshot=snapshot,)
     if guard_result is not None:
         # Ya se envió el welcome y se abrió la TX; no procesamos este mensaje
         return guard_result
 
     # 5) Gestionar sesión y registrar mensaje
-    msg_key, conversation_str, conversation_history, open_tx_id = gestionar_sesion_y_mensaje( contacto, event_id, body, numero_limpio,nodo_inicio=nodo_inicio,base_context=base_context,)
+    msg_key, conversation_str, conversation_history, open_tx_id, persisted_history = gestionar_sesion_y_mensaje( contacto, event_id, body, numero_limpio,nodo_inicio=nodo_inicio,base_context=base_context, snapshot=snapshot,)
 
     op_log( "engine","session_continue","OK",extra={"msg_key": msg_key, "open_tx_id": open_tx_id},)
 
@@ -257,6 +367,8 @@ def handle_incoming_message( body,to,tiene_adjunto,media_type,file_path,transcri
         conversation_history,
     )
     variables["open_tx_id"] = open_tx_id
+    variables["persisted_history"] = persisted_history  # lo que ya está en DB (para guardar solo el delta)
+    variables["event_config"] = event_config
     variables = ejecutar_workflow(variables)
 
     # 8) Enviar respuesta y actualizar transacción
@@ -266,7 +378,7 @@ def handle_incoming_message( body,to,tiene_adjunto,media_type,file_path,transcri
 
 
 @log_latency
-def message1(tx, numero_limpio: str, ttl_minutos: int) -> bool:
+def message1(tx, numero_limpio: str, ttl_minutos: int, snapshot: Optional[SessionSnapshot] = None) -> bool:
     """
     True si corresponde enviar la bienvenida
     Lógica:
@@ -277,7 +389,7 @@ def message1(tx, numero_limpio: str, ttl_minutos: int) -> bool:
     """
     t0 = time.perf_counter()
     try:
-        info = tx.get_last_tx_info_by_phone(numero_limpio)
+        info = snapshot.last_tx_info if snapshot else tx.get_last_tx_info_by_phone(numero_limpio)
 
         # 1) primera vez → welcome
         if info is None:
@@ -425,18 +537,46 @@ def obtener_o_crear_contacto(numero_limpio, request_id=None, tx_id=None):
     event_id = getattr(contacto, "event_id", None) or 1
     return contacto, event_id
 
+def _leer_tx_abierta_y_ultimo_mensaje(contact_id, numero_limpio, event_id):
+    """
+    Camino REST (sin snapshot): TX abierta (con conversation) y último mensaje del evento
+    son independientes -> se piden en paralelo (~1 round trip en vez de 2).
+    Si la capa async falla (o PX_ASYNC_FANOUT=0) se leen en secuencia como siempre.
+    """
+    if PX_ASYNC_FANOUT:
+        t0 = time.perf_counter()
+        try:
+            flush_pending()  # el loop async no ve el write_buffer del turno
+            open_row, ultimo_mensaje = gather_sync(
+                AsyncTransactions().get_open_row(contact_id, include_conversation=True),
+                AsyncMessages().get_latest_by_phone_and_event_id(numero_limpio, event_id),
+            )
+            op_log("supabase", "session_fanout", "OK", t0=t0, extra={"queries": 2})
+            return open_row, ultimo_mensaje
+        except Exception as e:
+            op_log("supabase", "session_fanout", "ERROR", t0=t0, error=str(e), extra={"fallback": "sequential"})
+
+    open_row = Transactions().get_open_row(contact_id, include_conversation=True)
+    ultimo_mensaje = Messages().get_latest_by_phone_and_event_id(numero_limpio, event_id) if open_row else None
+    return open_row, ultimo_mensaje
+
 @log_latency
-def gestionar_sesion_y_mensaje(contacto, event_id, body, numero_limpio, *, nodo_inicio, base_context):
+def gestionar_sesion_y_mensaje(contacto, event_id, body, numero_limpio, *, nodo_inicio, base_context, snapshot=None):
     """
-    - 1 sola lectura a TX (get_open_row)
+    - 1 sola lectura a TX (get_open_row, en paralelo con el último mensaje); ninguna si viene snapshot del SessionLoader
     - Devuelve también open_tx_id para evitar otra query después
+    - y persisted_history: el historial tal como está en DB (el cierre del turno guarda solo lo nuevo)
     """
     tx, msj = Transactions(), Messages()
     now_utc = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
     body_text = (body or "").strip()
 
     # 1) Traer la TX 'abierta' (si existe)
-    open_row = tx.get_open_row(contacto.contact_id)  # ← 1 query
+    ultimo_mensaje = None
+    if snapshot:
+        open_row = snapshot.open_row
+    else:
+        open_row, ultimo_mensaje = _leer_tx_abierta_y_ultimo_mensaje(contacto.contact_id, numero_limpio, event_id)
 
     def _abrir_nueva_tx():
         print("[NUEVA] creo transacción ")
@@ -455,15 +595,24 @@ def gestionar_sesion_y_mensaje(contacto, event_id, body, numero_limpio, *, nodo_
         open_tx_id = _abrir_nueva_tx()
         msg_key = nodo_inicio
         conversation_history = json.loads(base_context)
+        persisted_history = list(conversation_history)
     else:
-        # Hay TX vigente
+        # Hay TX vigente. Con snapshot el historial ya viene completo (la RPC aplica conversation_turns)
         open_tx_id = open_row.id
-        conversation_str_existente = open_row.conversation or base_context
-        conversation_history = json.loads(conversation_str_existente)
+        if snapshot:
+            persisted_history = open_row.conversation_data
+            if not isinstance(persisted_history, list):
+                persisted_history = []
+        else:
+            persisted_history = tx.load_conversation(open_row)  # ← +1 GET a conversation_turns si está habilitado
+        persisted_history = list(persisted_history)
+        conversation_history = list(persisted_history) or json.loads(base_context)
 
-        # Último msg_key del histórico (1 lectura a Messages)
-        ultimo_mensaje = msj.get_latest_by_phone_and_event_id(numero_limpio, event_id) # ← 1 query
-        msg_key = ultimo_mensaje.msg_key if ultimo_mensaje else nodo_inicio
+        # Último msg_key del histórico (ya leído junto con la TX)
+        if snapshot:
+            msg_key = snapshot.last_msg_key or nodo_inicio
+        else:
+            msg_key = ultimo_mensaje.msg_key if ultimo_mensaje else nodo_inicio
 
     # Agregar el mensaje del usuario al historial en memoria + persistir en messages
     if body_text:
@@ -471,7 +620,7 @@ def gestionar_sesion_y_mensaje(contacto, event_id, body, numero_limpio, *, nodo_
         msj.add(msg_key=msg_key, text=body_text, phone=numero_limpio, event_id=event_id)
 
     conversation_str = json.dumps(conversation_history)
-    return msg_key, conversation_str, conversation_history, open_tx_id
+    return msg_key, conversation_str, conversation_history, open_tx_id, persisted_history
 
 @log_latency
 def inicializar_variables(body, numero_limpio, contacto, event_id, msg_key, conversation_str, conversation_history):
@@ -518,6 +667,7 @@ def ejecutar_workflow(variables):
             variables.update(contexto_actualizado)
         if variables.get("subsiguiente") == 1:
             break
+    variables.pop("prefetched_question", None)  # la pregunta del 201 fusionado solo vale dentro del turno
     if not (variables.get("response_text") or "").strip():
         candidate = (variables.get("next_node_question") or "").strip()
         if candidate:
@@ -568,10 +718,91 @@ def _sincronizar_historial_desde_variables(variables, mensaje_a_enviar: str):
     return history
 
 
+def _persistir_historial(open_tx_id, persisted_history, history, conversation_str: str):
+    """
+    Guarda solo los mensajes nuevos del turno en conversation_turns (1 POST bulk).
+    Devuelve (conversation, rewrite):
+    - (None, False) si alcanzó con el append (el PATCH de la TX queda chico: name/timestamp).
+    - (JSON completo, False) si hay que PATCHearlo como siempre: turns apagados/no instalados o falló el append
+      (sin turns nuevos que limpiar).
+    - (JSON completo, True) si un nodo reescribió mensajes ya guardados: la base nueva y el borrado de
+      los turns van juntos (_reescribir_historial).
+    """
+    if open_tx_id is None or not ConversationTurns.enabled():
+        return conversation_str, False
+
+    delta = conversation_delta(persisted_history, history)
+    if delta is None:
+        return conversation_str, True
+    if not delta:
+        return None, False
+
+    t0 = time.perf_counter()
+    try:
+        ConversationTurns().append(open_tx_id, len(persisted_history), delta)
+        op_log("supabase", "append_conversation_turns", "OK", t0=t0,
+               extra={"tx_id": open_tx_id, "turns": len(delta), "seq": len(persisted_history)})
+        return None, False
+    except Exception as e:
+        # El POST bulk es atómico: con la reescritura completa no se pierde ni se duplica nada
+        op_log("supabase", "append_conversation_turns", "ERROR", t0=t0, error=str(e),
+               extra={"tx_id": open_tx_id, "fallback": "full_rewrite"})
+        return conversation_str, False
+
+
+def _reescribir_historial(open_tx_id, persisted_history, conversation_str: str) -> bool:
+    """
+    Reescritura completa: base nueva en transactions.conversation + borrar los turns de la TX
+    (los de seq >= largo de la base nueva quedarían pegados encima por la vista).
+    - Camino 1: RPC px_rewrite_conversation (las dos cosas en una transacción).
+    - Fallback: PATCH de la base y recién después el delete; si el delete falla se vuelve a
+      PATCHear la base que había (persisted_history: con los turns viejos absorbidos) y la
+      reescritura de este turno no se aplica.
+    True si quedó reescrito. (Transactions() nuevo en cada PATCH: update() deja los valores puestos en la instancia.)
+    """
+    turns = ConversationTurns()
+    t0 = time.perf_counter()
+    try:
+        ok = turns.rewrite(open_tx_id, conversation_str)
+        op_log("supabase", "conversation_rewrite", "OK" if ok else "ERROR", t0=t0,
+               extra={"tx_id": open_tx_id, "mode": "rpc"})
+        return ok
+    except RpcNotFoundError:
+        pass
+    except Exception as e:
+        op_log("supabase", "conversation_rewrite", "ERROR", t0=t0, error=str(e),
+               extra={"tx_id": open_tx_id, "mode": "rpc"})
+        return False
+
+    try:
+        Transactions().update(id=open_tx_id, conversation=conversation_str)
+    except Exception as e:
+        op_log("supabase", "conversation_rewrite", "ERROR", t0=t0, error=str(e),
+               extra={"tx_id": open_tx_id, "mode": "patch", "step": "patch"})
+        return False  # no se tocó nada: los turns siguen válidos sobre la base vieja
+    try:
+        turns.clear(open_tx_id)
+    except Exception as e:
+        restored = False
+        if persisted_history is not None:
+            try:
+                Transactions().update(id=open_tx_id, conversation=json.dumps(persisted_history))
+                restored = True
+            except Exception:
+                pass
+        op_log("supabase", "conversation_rewrite", "ERROR", t0=t0, error=str(e),
+               extra={"tx_id": open_tx_id, "mode": "patch", "step": "clear", "restored": restored})
+        return False
+    op_log("supabase", "conversation_rewrite", "OK", t0=t0,
+           extra={"tx_id": open_tx_id, "mode": "patch", "len": len(json.loads(conversation_str or "[]"))})
+    return True
+
+
 def _actualizar_transaccion_y_estado(variables, contacto, event_id, now_utc: str):
     """
     Actualiza la transacción en Supabase con el nuevo estado y conversación.
     - Usa open_tx_id de variables si existe; si no, hace fallback a get_open_transaction_id_by_contact_id.
+    - La conversación se guarda incremental (_persistir_historial); `conversation` solo viaja si hay que reescribir.
     - Devuelve (open_tx_id, estado).
     """
     tx = Transactions()
@@ -585,10 +816,22 @@ def _actualizar_transaccion_y_estado(variables, contacto, event_id, now_utc: str
 
     estado = "Cerrada" if variables.get("result") == "Cerrada" else "Abierta"
 
+    conversation, rewrite = _persistir_historial(
+        open_tx_id, variables.get("persisted_history"),
+        variables.get("conversation_history") or [], variables["conversation_str"],
+    )
+    if rewrite:
+        if not _reescribir_historial(open_tx_id, variables.get("persisted_history"), conversation):
+            # como cuando falla el PATCH: la TX queda abierta y con su historial anterior
+            variables["open_tx_id"] = open_tx_id
+            return open_tx_id, "Abierta"
+        conversation = None  # ya quedó escrita: el PATCH de abajo es solo name/timestamp
+
     t_upd = time.perf_counter()
     try:
-        tx.update( id=open_tx_id,contact_id=contacto.contact_id,phone=variables["numero_limpio"],name=estado,conversation=variables["conversation_str"],  timestamp=now_utc,event_id=event_id,)
-        op_log("supabase","update_transaction","OK",t0=t_upd,extra={"tx_id": open_tx_id, "fields": ["conversation", "timestamp", "name"]},) 
+        tx.update( id=open_tx_id,contact_id=contacto.contact_id,phone=variables["numero_limpio"],name=estado,conversation=conversation,  timestamp=now_utc,event_id=event_id,)
+        fields = (["conversation"] if conversation is not None else []) + ["timestamp", "name"]
+        op_log("supabase","update_transaction","OK",t0=t_upd,extra={"tx_id": open_tx_id, "fields": fields},) 
     except Exception as e:
         op_log("supabase","update_transaction","ERROR",t0=t_upd,error=str(e),extra={"tx_id": open_tx_id},)
         # si falla la actualización, mejor no seguir con cierre
@@ -641,6 +884,13 @@ def enviar_respuesta_y_actualizar(variables, contacto, event_id, to):
 
         op_log("supabase","close_transaction","OK",extra={"tx_id": open_tx_id},)
 
+        # Reporte de /consulta precalculado en background: cuando el médico abre la TX ya está en report_cache
+        try:
+            from app.services import precompute
+            precompute.schedule_report(open_tx_id)
+        except Exception as e:
+            print(f"[PRECOMPUTE] schedule_report: {e}")
+
     # 5) Log en tabla messages (evitar filas vacías/duplicadas) si la TX sigue abierta
     if (variables.get("response_text") or "").strip() and estado != "Cerrada":
         try:
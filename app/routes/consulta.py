@@ -58,8 +58,7 @@ def _consulta():
         return render_template("medico_seleccionar_telefono.html")
 
     if not txid:
-        sesiones = Transactions().get_by_contact_id(contacto.contact_id)
-        sesiones.sort(key=lambda s: s.timestamp, reverse=True)
+        sesiones = Transactions().get_history_by_contact_id(contacto.contact_id)  # ya viene desc, sin conversation
 
         sesiones_formateadas = []
         for s in sesiones:
@@ -82,8 +81,7 @@ def _consulta():
 
 
 
-    ev = Events()
-    contexto_copilot = ev.get_assistant_by_event_id(1)  # prompt en Supabase que exige JSON
+    contexto_copilot = reporting.report_prompt()  # prompt en Supabase que exige JSON (mismo que usa el precompute)
 
     # 1) Traer la conversación guardada (string JSON)
     convo_str = Transactions().get_conversation_by_id(txid) or "[]"
@@ -102,16 +100,13 @@ def _consulta():
                 "content": m.get("content") or ""
             })
 
-    # 3) Pedir el reporte al modelo (salida JSON) y armar cards
-    conversation_history = [
-        {"role": "system", "content": contexto_copilot},
-        {"role": "user", "content": convo_str},
-    ]
-    report_dict, cards = reporting.build_report_cards(
-        conversation_history=conversation_history,
-        brain=brain,            # 
-        model="gpt-4.1",
-        temperature=0.0
+    # 3) Reporte (salida JSON) y cards: cacheado por (tx, hash de la conversación, prompt);
+    #    solo se llama al modelo si la conversación cambió desde la última vista
+    report_dict, cards = reporting.build_report_cards_cached(
+        tx_id=int(txid),
+        conversation_str=convo_str,
+        prompt=contexto_copilot,
+        brain=brain,
     )
 
     # 4) Render: seguimos en QA, pero pasamos también "cards" para pintarlas bajo el H1
@@ -2,9 +2,14 @@
 import flask
 from flask import request, current_app
 
+import contextvars
 import os
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from typing import Optional
 from dotenv import load_dotenv
 from app.obs.logs import op_log
 
@@ -16,6 +21,7 @@ from twilio.twiml.messaging_response import MessagingResponse
 import app.services.wisper as wisper
 import app.services.vision as vision
 import app.message_p as engine
+from app.services import coalesce, inbound_dedupe, inbound_queue, media_pool
 from app.services.messaging import send_message
 
 from app.routes import routes as bp  # <- usamos el mismo blueprint "routes"
@@ -36,92 +42,150 @@ def whatsapp_reply():
     if flask.request.method == 'GET':
         return "✅ Server is running and accessible via GET request."
 
-    sender_number = flask.request.form.get('From')
-    message_body  = (flask.request.form.get("Body") or "").strip()
-    num_media_raw = flask.request.form.get("NumMedia", 0) or 0
-    try:
-        num_media = int(num_media_raw)
-    except (TypeError, ValueError):
-        num_media = 0
-
-    media_url  = flask.request.form.get("MediaUrl0")
-    media_type = flask.request.form.get("MediaContentType0")
+    form = flask.request.form.to_dict()
 
     # 🛡️ Si no vino el número, no seguimos
-    if not sender_number:
+    if not form.get('From'):
         print("⚠️ Request a / sin 'From', se ignora.")
         return str(MessagingResponse())
 
-    file_path = ""
-    tiene_adjunto = 0
-    description = ""
-    transcription = ""
-    pdf_text = ""
-
-    if num_media > 0:
-        # Crear carpeta temporal para el archivo recibido
-        clean_sender = sender_number.replace(":", "_").replace("+", "")
-        folder = os.path.join(TMP_DIR, f"{clean_sender}_media")
-        os.makedirs(folder, exist_ok=True)
-
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        extension = media_type.split("/")[-1]
-        nombre_del_archivo = f"{clean_sender}_{timestamp}.{extension}"
-        file_path = os.path.join(folder, nombre_del_archivo)
-
-        try:
-            reply_path = download_file(media_url, file_path)
-
-            if media_type.startswith("audio"):
-                print("🎙️ Es audio")
-                send_message("Te estoy escuchando ...", sender_number)
-                transcription = wisper.transcribir_audio_cloud(reply_path)
-                print(f"📝 Transcripción: {transcription}")
-                message_body = transcription
-                tiene_adjunto = 1
-
-            elif media_type.startswith("image"):
-                print("🖼️ Es imagen")
-                send_message("Dejame ver tu imagen ...", sender_number)
-                description = vision.describe_image(reply_path)
-                # print(f"🧠 Descripción generada: {description}")
-                message_body = message_body + description
-                tiene_adjunto = 1
-
-            elif media_type == "application/pdf":
-                print("📄 Es PDF")
-                send_message("Dejame ver tu archivo ...", sender_number)
-                pdf_text = vision.extract_text_from_pdf(reply_path)
-                pdf_text = vision.resumir_texto_largo(pdf_text)
-                print(f"📄 Texto resumido del PDF:\n{pdf_text[:300]}...")
-                message_body = message_body + pdf_text
-                tiene_adjunto = 1
-            else:
-                print("⚠️ Tipo de archivo no soportado:", media_type)
-                send_message( "⚠️ Tipo de archivo no soportado. Enviá audio, imagen o PDF.", sender_number,
+    # Modo ack: se encola el form crudo y el turno lo corre el worker (inbound_queue)
+    if inbound_queue.ack_mode():
+        if inbound_dedupe.claim("twilio", form.get("MessageSid"), form.get("From"), status="received"):
+            try:
+                inbound_queue.enqueue("twilio", form)
+            except Exception:
+                inbound_dedupe.finish(form.get("MessageSid"), ok=False)  # el reintento de Twilio lo vuelve a tomar
+                raise
+        return str(MessagingResponse())
+
+    process_twilio_form(form)
+    return str(MessagingResponse())
+
+
+def process_twilio_form(form: dict) -> None:
+    """Turno de un webhook de Twilio (form ya validado): media + engine. Sync o desde el worker."""
+    with inbound_dedupe.guard("twilio", form.get("MessageSid"), form.get("From")) as fresh:
+        if not fresh:
+            return  # reintento de Twilio de un mensaje ya procesado (o en curso)
+        _run_twilio_turn(form)
+
+
+def _run_twilio_turn(form: dict) -> None:
+    sender_number = form.get('From')
+    message_body  = (form.get("Body") or "").strip()
+    num_media_raw = form.get("NumMedia", 0) or 0
+    try:
+        num_media = int(num_media_raw)
+    except (TypeError, ValueError):
+        num_media = 0
+
+    # Todos los adjuntos del mensaje (MediaUrl0..N-1), no solo el primero
+    media = [(i, form.get(f"MediaUrl{i}"), form.get(f"MediaContentType{i}") or "")
+             for i in range(num_media) if form.get(f"MediaUrl{i}")]
+    supported = [m for m in media if _media_kind(m[2])]
+    if len(supported) < len(media):
+        print("⚠️ Tipo de archivo no soportado:", [m[2] for m in media if not _media_kind(m[2])])
+        send_message( "⚠️ Tipo de archivo no soportado. Enviá audio, imagen o PDF.", sender_number,
     )
 
-        except Exception as e:
-            print("❌ Error procesando media:", str(e))
+    turns = [coalesce.Turn(message_body)] if message_body else []
+    if supported:
+        # Mensaje de cortesía (uno por tipo) y después descarga + análisis en paralelo
+        for kind in dict.fromkeys(_media_kind(m[2]) for m in supported):
+            send_message(TWILIO_COURTESY[kind], sender_number)
+        results = media_pool.map_ordered(partial(_twilio_media_item, sender_number), supported)
+        for turn, err in results:
+            if err:
+                print("❌ Error procesando media:", str(err))
+            elif turn:
+                turns.append(turn)
+        if any(err for _, err in results):
             send_message(
                 "❌ Hubo un problema procesando el archivo. Intentalo de nuevo.",
                 sender_number,
             )
-            return str(MessagingResponse())
+            if all(err for _, err in results):
+                return
+
+    # En todos los casos (texto, transcripción, imagen, PDF): a la ventana de coalescing y de ahí al engine
+    turn = coalesce.merge(turns) if turns else coalesce.Turn(message_body)
+    coalesce.submit(sender_number, [form.get("MessageSid")], turn, partial(_run_engine_or_notify, sender_number))
+
 
+TWILIO_COURTESY = {
+    "audio": "Te estoy escuchando ...",
+    "image": "Dejame ver tu imagen ...",
+    "pdf": "Dejame ver tu archivo ...",
+}
 
-    # En todos los casos (texto, transcripción, imagen, PDF)
+
+def _media_kind(media_type: Optional[str]) -> Optional[str]:
+    """audio / image / pdf, o None si no lo procesamos."""
+    media_type = media_type or ""
+    if media_type.startswith("audio"):
+        return "audio"
+    if media_type.startswith("image"):
+        return "image"
+    if media_type == "application/pdf":
+        return "pdf"
+    return None
+
+
+def _analyze_media(file_path: str, media_type: str, caption: str = "", kind: Optional[str] = None) -> "coalesce.Turn":
+    """
+    Audio -> transcripción, imagen -> descripción, PDF -> texto resumido (corre en media_pool).
+    kind fuerza el tipo cuando el proveedor ya lo dice (Meta manda image/audio/document aparte del mime).
+    """
+    kind = kind or _media_kind(media_type)
+    if kind == "audio":
+        transcription = wisper.transcribir_audio_cloud(file_path)
+        print(f"📝 Transcripción: {transcription}")
+        return coalesce.Turn(transcription or "", 1, media_type, file_path, transcription=transcription or "")
+    if kind == "image":
+        description = vision.describe_image(file_path)
+        return coalesce.Turn((caption + " " + description).strip(), 1, media_type, file_path,
+                             description=description)
+    if kind == "pdf":
+        pdf_text = vision.resumir_texto_largo(vision.extract_text_from_pdf(file_path))
+        print(f"📄 Texto resumido del PDF:\n{pdf_text[:300]}...")
+        return coalesce.Turn((caption + " " + pdf_text).strip(), 1, media_type, file_path, pdf_text=pdf_text)
+    raise ValueError(f"tipo de media no soportado: {media_type}")
+
+
+def _twilio_media_item(sender_number: str, item: tuple) -> "coalesce.Turn":
+    """Un adjunto de Twilio (índice, url, content type): descarga a /tmp y análisis."""
+    index, media_url, media_type = item
+    # Crear carpeta temporal para el archivo recibido
+    clean_sender = sender_number.replace(":", "_").replace("+", "")
+    folder = os.path.join(TMP_DIR, f"{clean_sender}_media")
+    os.makedirs(folder, exist_ok=True)
+
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    extension = media_type.split("/")[-1]
+    nombre_del_archivo = f"{clean_sender}_{timestamp}_{index}.{extension}"
+    reply_path = download_file(media_url, os.path.join(folder, nombre_del_archivo))
+    return _analyze_media(reply_path, media_type)
+
+
+def _run_engine(sender_number: str, turn: "coalesce.Turn") -> None:
+    """Un turno del engine (un mensaje o una ráfaga ya unida por coalesce)."""
+    engine.handle_incoming_message(
+        turn.body,           # message_body (texto, transcripción, caption+desc, etc.)
+        sender_number,       # sender_number (whatsapp:+549...)
+        turn.tiene_adjunto,  # 0 / 1
+        turn.media_type,     # p.ej. "image/jpeg", "audio/ogg", "application/pdf"
+        turn.file_path,      # ruta local del archivo
+        turn.transcription,  # si era audio
+        turn.description,    # si era imagen
+        turn.pdf_text,       # si era pdf
+    )
+
+
+def _run_engine_or_notify(sender_number: str, turn: "coalesce.Turn") -> None:
+    """Como _run_engine, pero un error del engine le llega al paciente como aviso (camino Twilio)."""
     try:
-        engine.handle_incoming_message(
-            message_body,
-            sender_number,
-            tiene_adjunto,
-            media_type,
-            file_path,
-            transcription,
-            description,
-            pdf_text,
-        )
+        _run_engine(sender_number, turn)
     except Exception as e:
         print(f"❌ Error en engine: {e}")
         if sender_number:
@@ -136,9 +200,6 @@ def whatsapp_reply():
                 )
 
 
-    return str(MessagingResponse())
-
-
 
 def download_file(media_url: str, file_path: str) -> str:
     """Descarga un archivo multimedia desde Twilio con autenticación."""
@@ -201,185 +262,206 @@ def meta_webhook():
         },
     )
 
+    # Modo ack: solo se encolan los eventos con mensajes (los de status no generan turno)
+    if inbound_queue.ack_mode():
+        claimed = [m.get("id") for m in _meta_messages(data)
+                   if inbound_dedupe.claim("meta", m.get("id"), m.get("from"), status="received")]
+        if claimed:
+            try:
+                inbound_queue.enqueue("meta", data)
+            except Exception as e:
+                for message_id in claimed:
+                    inbound_dedupe.finish(message_id, ok=False)  # el reintento de Meta los vuelve a tomar
+                print(f"❌ Error encolando webhook Meta: {e}")
+                return "ERROR", 500
+        return "EVENT_RECEIVED", 200
 
     try:
-        # Este es el phone_id PROPIO del entorno (distinto en dev y en prod)
-        my_phone_id = os.getenv("META_WABA_PHONE_ID")
-
-        entries = data.get("entry", [])
-        for entry in entries:
-            changes = entry.get("changes", [])
-            for change in changes:
-                value = change.get("value", {})
-
-                # 🔎 Filtramos por número: si el evento no es para mi línea, lo ignoro
-                metadata = (value.get("metadata") or {})
-                event_phone_id = metadata.get("phone_number_id")
-
-                if my_phone_id and event_phone_id and event_phone_id != my_phone_id:
-                    op_log(
-                        provider="meta",
-                        operation="meta_webhook_skip_other_phone",
-                        status="OK",
-                        extra={
-                            "event_phone_id": event_phone_id,
-                            "my_phone_id": my_phone_id,
-                        },
-                    )
-                    continue
-
-
-                # Si viene solo status (sent/delivered/read), lo ignoramos por ahora
-                if value.get("statuses") and not value.get("messages"):
-                    print("ℹ️ Evento de status de Meta (lo ignoramos por ahora)")
-                    continue
-
-                messages = value.get("messages", [])
-                if not messages:
-                    continue
-
-                msg = messages[0]
-                msg_type = msg.get("type")
-                wa_from = msg.get("from")  # ej: "5492477661029"
-
-                # Normalizamos al formato Twilio-like: whatsapp:+<numero>
-                sender_number = f"whatsapp:+{wa_from}" if wa_from else None
-
-                # Variables comunes para el engine
-                text_body = ""
-                tiene_adjunto = 0
-                media_type = None
-                file_path = ""
-                description = ""
-                transcription = ""
-                pdf_text = ""
-
-                # 🧾 TEXTO
-                if msg_type == "text":
-                    text_body = (msg.get("text", {}) or {}).get("body", "") or ""
-
-                # 🖼 IMAGEN
-                elif msg_type == "image":
-                    media = (msg.get("image") or {})
-                    media_id = media.get("id")
-                    caption = (media.get("caption") or "")
-                    if not media_id:
-                        print("⚠️ Imagen Meta sin media_id, se omite.")
-                        continue
-
-                    # Mensaje de cortesía al toque
-                    send_message("Dejame ver tu imagen ...", sender_number)
-
-                    try:
-                        file_path, media_type = download_meta_media(media_id)
-                        description = vision.describe_image(file_path)
-                        tiene_adjunto = 1
-                        # combinamos caption + descripción para el engine
-                        text_body = (caption + " " + description).strip()
-
-                    except Exception as e:
-                        print(f"❌ Error procesando imagen Meta: {e}")
-                        send_message(
-                            "❌ Hubo un problema procesando la imagen. Intentalo de nuevo.",
-                            sender_number,
-                        )
-                        continue
-
-                # 🎙 AUDIO
-                elif msg_type == "audio":
-                    media = (msg.get("audio") or {})
-                    media_id = media.get("id")
-                    if not media_id:
-                        print("⚠️ Audio Meta sin media_id, se omite.")
-                        continue
-
-                    # Mensaje de cortesía
-                    send_message("Estoy escuchando tu audio ...", sender_number)
-
-                    try:
-                        file_path, media_type = download_meta_media(media_id)
-                        transcription = wisper.transcribir_audio_cloud(file_path)
-                        tiene_adjunto = 1
-                        text_body = transcription or ""
-
-                    except Exception as e:
-                        print(f"❌ Error procesando audio Meta: {e}")
-                        send_message(
-                            "❌ Hubo un problema procesando el audio. Intentalo de nuevo.",
-                            sender_number,
-                        )
-                        continue
-
-                # 📄 DOCUMENTO (tratamos PDFs)
-                elif msg_type == "document":
-                    media = (msg.get("document") or {})
-                    media_id = media.get("id")
-                    caption = (media.get("caption") or "")
-                    mime = media.get("mime_type") or ""
-
-                    if not media_id:
-                        print("⚠️ Documento Meta sin media_id, se omite.")
-                        continue
-
-                    # Mensaje de cortesía
-                    send_message("Dejame ver tu archivo ...", sender_number)
-
-                    try:
-                        file_path, media_type = download_meta_media(media_id)
-                        # Sólo procesamos de verdad si es PDF
-                        effective_mime = mime or media_type
-                        if effective_mime == "application/pdf":
-                            raw_pdf = vision.extract_text_from_pdf(file_path)
-                            pdf_text = vision.resumir_texto_largo(raw_pdf)
-                            tiene_adjunto = 1
-                            text_body = (caption + " " + pdf_text).strip()
-                        else:
-                            print(f"⚠️ Documento no-PDF ({effective_mime}), no se procesa.")
-                            send_message(
-                                "⚠️ Sólo puedo procesar documentos PDF por ahora.",
-                                sender_number,
-                            )
-                            continue
-
-                    except Exception as e:
-                        print(f"❌ Error procesando documento Meta: {e}")
-                        send_message(
-                            "❌ Hubo un problema procesando el archivo. Intentalo de nuevo.",
-                            sender_number,
-                        )
-                        continue
-
-                else:
-                    print(f"⚠️ Tipo de mensaje Meta no soportado aún: {msg_type}")
-                    continue
-
-                print(f"✅ Meta INCOMING from {sender_number}: {text_body[:120]}")
-
-                if not sender_number or not text_body:
-                    print("⚠️ Meta webhook sin sender_number o sin texto útil, se omite.")
-                    continue
-
-                # Llamamos al mismo engine que usa Twilio
-                import app.message_p as engine
-
-                engine.handle_incoming_message(
-                    text_body,      # message_body (texto, transcripción, caption+desc, etc.)
-                    sender_number,  # sender_number (whatsapp:+549...)
-                    tiene_adjunto,  # 0 / 1
-                    media_type,     # p.ej. "image/jpeg", "audio/ogg", "application/pdf"
-                    file_path,      # ruta local del archivo
-                    transcription,  # si era audio
-                    description,    # si era imagen
-                    pdf_text        # si era pdf
-                )
-
-
+        process_meta_event(data)
         return "EVENT_RECEIVED", 200
 
     except Exception as e:
         print(f"❌ Error procesando webhook Meta: {e}")
         return "ERROR", 500
 
+
+def _meta_messages(data: dict) -> list:
+    """Todos los mensajes de la entrega (todas las entries / changes), en el orden en que vienen."""
+    return [
+        msg
+        for entry in (data.get("entry") or [])
+        for change in (entry.get("changes") or [])
+        for msg in ((change.get("value") or {}).get("messages") or [])
+    ]
+
+
+def process_meta_event(data: dict) -> None:
+    """
+    Turnos de un webhook de Meta (JSON del evento): media + engine. Sync o desde el worker.
+    Todos los mensajes de la entrega (no solo el primero), agrupados por remitente: la media se
+    analiza en paralelo (media_pool) y cada remitente tiene UN turno con sus mensajes en orden.
+    """
+    # Este es el phone_id PROPIO del entorno (distinto en dev y en prod)
+    my_phone_id = os.getenv("META_WABA_PHONE_ID")
+
+    by_sender: dict = {}  # wa_from -> [msg, ...] (en orden de llegada de los remitentes)
+    entries = data.get("entry", [])
+    for entry in entries:
+        changes = entry.get("changes", [])
+        for change in changes:
+            value = change.get("value", {})
+
+            # 🔎 Filtramos por número: si el evento no es para mi línea, lo ignoro
+            metadata = (value.get("metadata") or {})
+            event_phone_id = metadata.get("phone_number_id")
+
+            if my_phone_id and event_phone_id and event_phone_id != my_phone_id:
+                op_log(
+                    provider="meta",
+                    operation="meta_webhook_skip_other_phone",
+                    status="OK",
+                    extra={
+                        "event_phone_id": event_phone_id,
+                        "my_phone_id": my_phone_id,
+                    },
+                )
+                continue
+
+
+            # Si viene solo status (sent/delivered/read), lo ignoramos por ahora
+            if value.get("statuses") and not value.get("messages"):
+                print("ℹ️ Evento de status de Meta (lo ignoramos por ahora)")
+                continue
+
+            for msg in value.get("messages") or []:
+                by_sender.setdefault(msg.get("from"), []).append(msg)
+
+    if not by_sender:
+        return
+    for msgs in by_sender.values():
+        msgs.sort(key=_meta_timestamp)  # sort estable: mismo timestamp -> orden del payload
+
+    if len(by_sender) == 1:
+        wa_from, msgs = next(iter(by_sender.items()))
+        _run_meta_sender(wa_from, msgs)
+        return
+
+    # Varios remitentes en la misma entrega: en paralelo (phone_lock serializa dentro de cada uno)
+    with ThreadPoolExecutor(max_workers=len(by_sender), thread_name_prefix="px-meta-sender") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, _run_meta_sender, wa_from, msgs)
+                   for wa_from, msgs in by_sender.items()]
+    errors = [f.exception() for f in futures if f.exception()]
+    if errors:
+        raise errors[0]
+
+
+def _meta_timestamp(msg: dict) -> int:
+    try:
+        return int(msg.get("timestamp") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _run_meta_sender(wa_from: Optional[str], msgs: list) -> None:
+    """Los mensajes de un remitente: dedupe de cada uno y un solo turno con los nuevos."""
+    with ExitStack() as stack:
+        fresh = [msg for msg in msgs
+                 if stack.enter_context(inbound_dedupe.guard("meta", msg.get("id"), wa_from))]
+        if not fresh:
+            return  # reintento de Meta de mensajes ya procesados (o en curso)
+        _run_meta_messages(wa_from, fresh)
+
+
+META_MEDIA_TYPES = ("image", "audio", "document")
+META_KIND = {"image": "image", "audio": "audio", "document": "pdf"}  # tipo de Meta -> _analyze_media
+META_COURTESY = {
+    "image": "Dejame ver tu imagen ...",
+    "audio": "Estoy escuchando tu audio ...",
+    "document": "Dejame ver tu archivo ...",
+}
+META_MEDIA_ERROR = {
+    "image": "❌ Hubo un problema procesando la imagen. Intentalo de nuevo.",
+    "audio": "❌ Hubo un problema procesando el audio. Intentalo de nuevo.",
+    "document": "❌ Hubo un problema procesando el archivo. Intentalo de nuevo.",
+}
+
+
+class _NotPdf(Exception):
+    """Documento de Meta que no es PDF (no se procesa)."""
+
+
+def _run_meta_messages(wa_from: Optional[str], msgs: list) -> None:
+    """Mensajes de Meta de un remitente (texto / imagen / audio / documento): media + un turno del engine."""
+    # Normalizamos al formato Twilio-like: whatsapp:+<numero>
+    sender_number = f"whatsapp:+{wa_from}" if wa_from else None  # ej: "5492477661029"
+
+    usable = []
+    for msg in msgs:
+        msg_type = msg.get("type")
+        if msg_type == "text":
+            usable.append(msg)
+        elif msg_type in META_MEDIA_TYPES:
+            if not (msg.get(msg_type) or {}).get("id"):
+                print(f"⚠️ {msg_type} Meta sin media_id, se omite.")
+                continue
+            usable.append(msg)
+        else:
+            print(f"⚠️ Tipo de mensaje Meta no soportado aún: {msg_type}")
+
+    # Mensaje de cortesía al toque (uno por tipo) y después descarga + análisis en paralelo
+    for msg_type in dict.fromkeys(m.get("type") for m in usable if m.get("type") in META_MEDIA_TYPES):
+        send_message(META_COURTESY[msg_type], sender_number)
+
+    turns = []
+    for msg, (turn, err) in zip(usable, media_pool.map_ordered(_meta_item, usable)):
+        msg_type = msg.get("type")
+        if isinstance(err, _NotPdf):
+            print(f"⚠️ Documento no-PDF ({err}), no se procesa.")
+            send_message(
+                "⚠️ Sólo puedo procesar documentos PDF por ahora.",
+                sender_number,
+            )
+        elif err:
+            print(f"❌ Error procesando {msg_type} Meta: {err}")
+            send_message(META_MEDIA_ERROR[msg_type], sender_number)
+        elif turn and turn.body:
+            turns.append(turn)
+
+    turn = coalesce.merge(turns) if turns else coalesce.Turn("")
+    print(f"✅ Meta INCOMING from {sender_number} ({len(turns)} msgs): {turn.body[:120]}")
+
+    if not sender_number or not turn.body:
+        print("⚠️ Meta webhook sin sender_number o sin texto útil, se omite.")
+        return
+
+    # Mismo engine que usa Twilio (pasando por la ventana de coalescing)
+    coalesce.submit(sender_number, [m.get("id") for m in msgs], turn, partial(_run_engine, sender_number))
+
+
+def _meta_item(msg: dict) -> "coalesce.Turn":
+    """Un mensaje de Meta -> Turn (corre en media_pool: descarga + análisis de la media)."""
+    msg_type = msg.get("type")
+
+    # 🧾 TEXTO
+    if msg_type == "text":
+        return coalesce.Turn((msg.get("text", {}) or {}).get("body", "") or "")
+
+    # 🖼 IMAGEN / 🎙 AUDIO / 📄 DOCUMENTO (tratamos PDFs)
+    media = (msg.get(msg_type) or {})
+    caption = (media.get("caption") or "")
+    mime = media.get("mime_type") or ""
+    if msg_type == "document" and mime and mime != "application/pdf":
+        raise _NotPdf(mime)  # sin bajarlo: ya sabemos que no es PDF
+    file_path, media_type = download_meta_media(media.get("id"))
+    if msg_type == "document":
+        # Sólo procesamos de verdad si es PDF
+        effective_mime = mime or media_type
+        if effective_mime != "application/pdf":
+            raise _NotPdf(effective_mime)
+    # combinamos caption + descripción / texto del PDF para el engine
+    return _analyze_media(file_path, media_type, caption, kind=META_KIND[msg_type])
+
+
 def download_meta_media(media_id: str) -> tuple[str, str]:
     """
     Descarga un archivo multimedia desde la API de Meta usando el media_id.
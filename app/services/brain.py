@@ -1,23 +1,23 @@
 import os
+import threading
 import time
+from collections import Counter
 from dotenv import load_dotenv
-from openai import OpenAI
 import json
 
-# Cargar variables de entorno y crear cliente
+from app.obs.logs import op_log
+from app.services.llm_client import get_llm_client
+from app.services.llm_schemas import OutputSchema, parse_json_lenient
+
+# Cargar variables de entorno (el cliente OpenAI es el compartido de llm_client)
 load_dotenv()  # ← ¡Esto es clave!
-api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
 
 
 
 #############################
 # RESPONSE MODE
 #############################
-import os
-from openai import OpenAI
-
-def ask_openai(messages, temperature=0, model="gpt-4.1"):
+def ask_openai(messages, temperature=0, model="gpt-4.1", timeout=None):
     """
     Realiza una consulta a la API de OpenAI (Responses API) con los parámetros dados.
 
@@ -27,17 +27,13 @@ def ask_openai(messages, temperature=0, model="gpt-4.1"):
             - Si es string: prompt sencillo para el modelo.
         temperature (float): Configuración de temperatura para la creatividad de las respuestas.
         model (str): Nombre del modelo de OpenAI a utilizar (ej. "gpt-4o", "gpt-4o-mini", "o4-mini").
+        timeout (float|None): timeout de lectura de esta llamada en segundos (default OPENAI_TIMEOUT).
 
     Retorna:
         str: Respuesta generada por el modelo o un mensaje predeterminado en caso de error.
     """
-    # Obtener la clave de API desde las variables de entorno
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("API key no encontrada. Configura la variable de entorno OPENAI_API_KEY.")
-
-    # Inicializar el cliente de OpenAI
-    client = OpenAI(api_key=api_key)
+    # Cliente compartido del proceso (reutiliza el pool de conexiones entre llamadas)
+    client = get_llm_client(timeout=timeout)
 
     try:
         # Llamada al Responses API
@@ -57,6 +53,142 @@ def ask_openai(messages, temperature=0, model="gpt-4.1"):
         raise RuntimeError(f"Error en la API de OpenAI (Responses API): {e}")
 
 
+#############################
+# STRUCTURED OUTPUT MODE
+#############################
+# "1": text.format=json_schema (strict) -> el modelo solo puede devolver el objeto del schema.
+# "0": texto libre + reparaciones (fences / {...}) como antes; sirve para comparar las métricas.
+PX_STRUCTURED_OUTPUTS = os.getenv("PX_STRUCTURED_OUTPUTS", "1") == "1"
+STRUCTURED_RETRIES = int(os.getenv("PX_STRUCTURED_RETRIES", "1"))  # reintentos si no valida
+
+_structured_stats = Counter()  # (schema, modo, resultado) -> cantidad, por proceso
+_structured_lock = threading.Lock()
+
+
+class StructuredOutputError(RuntimeError):
+    """El modelo no devolvió un objeto válido para el schema (ni reparando ni reintentando)."""
+
+
+def structured_stats() -> dict:
+    """Contadores del proceso: {"schema|modo|resultado": n} (resultado: ok, repaired, retried, failed)."""
+    with _structured_lock:
+        return {"|".join(k): v for k, v in _structured_stats.items()}
+
+
+def ask_openai_json(messages, schema: OutputSchema, temperature=0, model="gpt-4.1", timeout=None) -> dict:
+    """
+    Como ask_openai pero devuelve un dict validado con schema.validate.
+    - Con PX_STRUCTURED_OUTPUTS=1 pide la respuesta con el JSON schema (strict).
+    - Si igual no parsea/valida: reparaciones de siempre y hasta STRUCTURED_RETRIES reintentos.
+    - Métrica: op_log("openai", "structured_output") con schema, mode, repair y attempts.
+    Lanza StructuredOutputError si no hay objeto válido (el caller decide el fallback).
+    """
+    value, _ = _ask_json(messages, schema, temperature=temperature, model=model, timeout=timeout)
+    return value
+
+
+def _ask_json(messages, schema: OutputSchema, temperature=0, model="gpt-4.1", timeout=None, **create_kwargs):
+    """ask_openai_json que además devuelve la Response (id para encadenar); create_kwargs van a responses.create."""
+    mode = "json_schema" if PX_STRUCTURED_OUTPUTS else "text"
+    client = get_llm_client(timeout=timeout)
+    extra = dict(create_kwargs)
+    if PX_STRUCTURED_OUTPUTS:
+        extra["text"] = {"format": {"type": "json_schema", "name": schema.name, "schema": schema.schema, "strict": True}}
+
+    t0 = time.perf_counter()
+    error = None
+    for attempt in range(1, STRUCTURED_RETRIES + 2):
+        try:
+            response = client.responses.create(model=model, input=messages, temperature=temperature, **extra)
+        except Exception as e:
+            raise RuntimeError(f"Error en la API de OpenAI (Responses API): {e}") from e
+
+        data, repair = parse_json_lenient(getattr(response, "output_text", "") or "")
+        if data is None:
+            error = "JSON inválido"
+            continue
+        try:
+            value = schema.validate(data)
+        except ValueError as e:
+            error = str(e)
+            continue
+
+        outcome = "ok" if repair == "none" else "repaired"
+        if attempt > 1:
+            outcome = "retried"
+        with _structured_lock:
+            _structured_stats[(schema.name, mode, outcome)] += 1
+        op_log("openai", "structured_output", "OK", t0=t0,
+               extra={"schema": schema.name, "mode": mode, "outcome": outcome, "repair": repair, "attempts": attempt})
+        return value, response
+
+    with _structured_lock:
+        _structured_stats[(schema.name, mode, "failed")] += 1
+    op_log("openai", "structured_output", "ERROR", t0=t0, error=error,
+           extra={"schema": schema.name, "mode": mode, "outcome": "failed", "attempts": STRUCTURED_RETRIES + 1})
+    raise StructuredOutputError(f"{schema.name}: {error}")
+
+
+def ask_routed(task, messages, schema: OutputSchema = None, event_config=None, timeout=None):
+    """
+    Llamada ruteada por tarea (app/services/model_routing.py): modelo y temperatura según
+    defaults < events.model_routing < PX_MODEL_ROUTES. Con schema devuelve el dict validado
+    (ask_openai_json); sin schema, el texto (ask_openai).
+    Si la tarea tiene candidato en sombra, se corre después, fuera del turno, y solo se loguea.
+    """
+    from app.services import model_routing
+
+    route = model_routing.resolve(task, event_config)
+    t0 = time.perf_counter()
+    if schema is not None:
+        value = ask_openai_json(messages, schema, temperature=route.temperature, model=route.model, timeout=timeout)
+    else:
+        value = ask_openai(messages, temperature=route.temperature, model=route.model, timeout=timeout)
+    if route.shadow_model:
+        model_routing.schedule_shadow(route, messages, schema, value, int((time.perf_counter() - t0) * 1000), timeout)
+    return value
+
+
+def ask_chained(task, tx_id, history, instructions, schema: OutputSchema, full_input=None,
+                event_config=None, timeout=None) -> dict:
+    """
+    Llamada estructurada encadenada por TX (app/services/response_chain.py, PX_RESPONSE_CHAIN=1):
+    - con cadena vigente manda solo los mensajes nuevos de `history` + previous_response_id
+    - si no hay cadena (o venció) manda `full_input` (default: history) y arranca una nueva
+    `instructions` es la tarea (no se arrastra entre respuestas). Modelo según model_routing.
+    Devuelve el dict validado; StructuredOutputError igual que ask_openai_json.
+    """
+    from app.services import model_routing, response_chain
+
+    route = model_routing.resolve(task, event_config)
+    kwargs = {"instructions": instructions, "temperature": route.temperature, "model": route.model,
+              "timeout": timeout, "store": True}  # store: la respuesta tiene que quedar para encadenar la próxima
+    previous_id, delta = response_chain.chained_input(tx_id, history)
+
+    t0 = time.perf_counter()
+    mode = "full"
+    response = None
+    if previous_id:
+        try:
+            value, response = _ask_json(delta, schema, previous_response_id=previous_id, **kwargs)
+            mode = "chained"
+        except RuntimeError as e:
+            if not response_chain.is_expired_error(e):
+                raise
+            response_chain.forget(tx_id)
+            mode = "expired"
+    if response is None:
+        value, response = _ask_json(full_input if full_input is not None else history, schema, **kwargs)
+
+    if tx_id and response_chain.enabled() and getattr(response, "id", None):
+        response_chain.save(tx_id, response.id, history)
+    op_log("openai", "response_chain", "OK", t0=t0, extra={
+        "tx_id": tx_id, "task": task, "mode": mode, "model": route.model,
+        "sent_messages": len(delta) if mode == "chained" else len(full_input if full_input is not None else history),
+    })
+    return value
+
+
 
 '''
 def ask_openai(messages, temperature=0, model="gpt-4.1"):
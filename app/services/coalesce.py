@@ -0,0 +1,278 @@
+# app/services/coalesce.py
+"""
+Ventana de coalescing por teléfono delante del engine (message_p.handle_incoming_message).
+
+Los pacientes mandan ráfagas ("me duele" / "la panza" / "desde ayer"): sin esto cada mensaje corre
+un turno entero (clasificación del 201/203, escrituras en Supabase) y compiten por la misma TX abierta.
+Con PX_COALESCE_WINDOW_S > 0:
+  1) cada mensaje, ya procesado (texto / transcripción / imagen / PDF), se agrega al buffer del teléfono
+  2) espera la ventana
+  3) si llegó otro mensaje después, no hace nada: el más nuevo se encarga (debounce)
+  4) el más nuevo (o el primero que ve la ráfaga abierta hace más de PX_COALESCE_MAX_WAIT_S) se lleva
+     todo el buffer y corre UN turno con los textos unidos -> una sola respuesta
+
+Buffer: tabla inbound_bursts (el DELETE ... RETURNING hace que la ráfaga la tome un solo container);
+si la tabla no está, en memoria del proceso (solo junta mensajes que caen en el mismo container).
+En procesos largos (worker thread / sqlite, ver inbound_queue.run_worker) la espera es un timer y el
+consumidor sigue con el próximo mensaje; en un request / Lambda se espera bloqueando.
+
+Dedupe (inbound_dedupe): un mensaje que queda en el buffer no se marca done al volver de submit();
+coalesce guarda sus ids con la fila y el que corre la ráfaga marca done / failed TODOS los ids con
+el resultado de ese turno (si falla, el reintento del proveedor los vuelve a tomar).
+
+Métrica: op_log("coalesce", "turn") con result = buffered | merged | flush | direct, messages y store.
+"""
+import itertools
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.obs.logs import op_log
+from app.services import inbound_dedupe
+
+PX_COALESCE_WINDOW_S = float(os.getenv("PX_COALESCE_WINDOW_S", "0"))      # 0 = apagado (un turno por mensaje)
+PX_COALESCE_MAX_WAIT_S = float(os.getenv("PX_COALESCE_MAX_WAIT_S", "10"))  # tope para ráfagas que no cortan
+PX_COALESCE_STALE_S = float(os.getenv("PX_COALESCE_STALE_S", "120"))      # filas huérfanas (turno que murió)
+
+_missing = False      # por proceso: si inbound_bursts no está, buffer en memoria
+_background = False   # True en workers de larga vida: la ventana corre en un timer
+_timers: "set[threading.Timer]" = set()
+_timers_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Turn:
+    """Los argumentos de handle_incoming_message de un mensaje (sin el teléfono)."""
+    body: str
+    tiene_adjunto: int = 0
+    media_type: Optional[str] = None
+    file_path: str = ""
+    transcription: str = ""
+    description: str = ""
+    pdf_text: str = ""
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "Turn":
+        return cls(**{f.name: payload.get(f.name) for f in fields(cls) if f.name in (payload or {})})
+
+
+def merge(turns: List[Turn]) -> Turn:
+    """
+    Una ráfaga -> un turno: los textos en orden, uno por línea. El adjunto que queda es el último
+    (su resumen ya viene en el body de cada mensaje, así que no se pierde el de los anteriores).
+    """
+    if len(turns) == 1:
+        return turns[0]
+    body = "\n".join(t.body.strip() for t in turns if (t.body or "").strip())
+    media = next((t for t in reversed(turns) if t.tiene_adjunto), None)
+    if media is None:
+        return Turn(body=body)
+    return Turn(body=body, tiene_adjunto=1, media_type=media.media_type, file_path=media.file_path,
+                transcription=media.transcription, description=media.description, pdf_text=media.pdf_text)
+
+
+# ===== Buffers =====
+class _MemoryBuffer:
+    name = "memory"
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._rows: Dict[str, List[Tuple[int, float, Turn, List[str]]]] = {}
+        self._lock = threading.Lock()
+
+    def push(self, phone: str, message_ids: List[str], turn: Turn) -> int:
+        with self._lock:
+            row_id = next(self._ids)
+            self._rows.setdefault(phone, []).append((row_id, time.monotonic(), turn, message_ids))
+            return row_id
+
+    def pending(self, phone: str) -> List[Tuple[int, float]]:
+        now = time.monotonic()
+        with self._lock:
+            return [(row[0], now - row[1]) for row in self._rows.get(phone, [])]
+
+    def take(self, phone: str, upto_id: int) -> List[Tuple[Turn, float, List[str]]]:
+        now = time.monotonic()
+        with self._lock:
+            rows = self._rows.get(phone, [])
+            taken = [r for r in rows if r[0] <= upto_id]
+            rest = [r for r in rows if r[0] > upto_id]
+            if rest:
+                self._rows[phone] = rest
+            else:
+                self._rows.pop(phone, None)
+        return [(turn, now - at, ids) for _, at, turn, ids in taken]
+
+
+class _TableBuffer:
+    name = "db"
+
+    def __init__(self):
+        from app.Model.inbound_bursts import InboundBursts
+        self._model = InboundBursts()
+
+    @staticmethod
+    def _age(row: Dict[str, Any]) -> float:
+        try:
+            created = datetime.fromisoformat(row["created_at"])
+            return (datetime.now(timezone.utc) - created).total_seconds()
+        except Exception:
+            return 0.0
+
+    def push(self, phone: str, message_ids: List[str], turn: Turn) -> int:
+        payload = dict(asdict(turn), message_ids=message_ids)
+        return int(self._model.push(phone, (message_ids or [None])[0], payload)["id"])
+
+    def pending(self, phone: str) -> List[Tuple[int, float]]:
+        return [(int(r["id"]), self._age(r)) for r in self._model.pending(phone)]
+
+    def take(self, phone: str, upto_id: int) -> List[Tuple[Turn, float, List[str]]]:
+        return [(Turn.from_payload(r.get("payload") or {}), self._age(r), (r.get("payload") or {}).get("message_ids") or [])
+                for r in self._model.take(phone, upto_id)]
+
+
+_memory = _MemoryBuffer()
+
+
+def _buffer():
+    return _memory if _missing else _TableBuffer()
+
+
+def _db_failed(e: Exception, operation: str, phone: str) -> None:
+    global _missing
+    if "PGRST205" in str(e) or "42P01" in str(e):
+        _missing = True
+    op_log("supabase", operation, "ERROR", error=str(e), to_phone=phone)
+
+
+# ===== API =====
+def enabled() -> bool:
+    return PX_COALESCE_WINDOW_S > 0
+
+
+def set_background(on: bool = True) -> None:
+    """Lo llama el loop de un worker de larga vida: submit() deja un timer y vuelve enseguida."""
+    global _background
+    _background = on
+
+
+def submit(phone: Optional[str], message_ids: Sequence[Optional[str]], turn: Turn,
+           run: Callable[[Turn], Any]) -> bool:
+    """
+    Entrega el turno (uno o más mensajes del proveedor, `message_ids`) a la ventana del teléfono.
+    `run(turn)` corre el turno del engine (una vez por ráfaga).
+    True si este llamado corrió el turno; False si quedó para el turno de otro mensaje.
+    Los errores de run() se propagan al que lo corrió (como sin coalescing).
+    """
+    t0 = time.perf_counter()
+    message_ids = [m for m in message_ids if m]
+    if not enabled() or not phone:
+        run(turn)
+        return True
+
+    buf = _buffer()
+    try:
+        row_id = buf.push(phone, message_ids, turn)
+    except Exception as e:
+        _db_failed(e, "inbound_bursts_push", phone)
+        if not _missing:
+            op_log("coalesce", "turn", "OK", t0=t0, to_phone=phone, extra={"result": "direct", "messages": 1})
+            run(turn)  # fail-open: sin buffer, el mensaje va solo (el guard de dedupe lo marca)
+            return True
+        buf = _memory
+        row_id = buf.push(phone, message_ids, turn)
+
+    # desde acá el estado de dedupe de estos mensajes lo marca el turno de la ráfaga, no el guard
+    inbound_dedupe.defer(message_ids)
+    op_log("coalesce", "turn", "OK", t0=t0, to_phone=phone,
+           extra={"result": "buffered", "store": buf.name, "message_ids": message_ids, "deferred": _background})
+    if _background:
+        timer = threading.Timer(PX_COALESCE_WINDOW_S, _settle_in_background,
+                                args=(buf, phone, row_id, turn, message_ids, run))
+        timer.daemon = True
+        with _timers_lock:
+            _timers.add(timer)
+        timer.start()
+        return False
+
+    time.sleep(PX_COALESCE_WINDOW_S)
+    return _settle(buf, phone, row_id, turn, message_ids, run)
+
+
+def _run_and_finish(run: Callable[[Turn], Any], turn: Turn, message_ids: List[str]) -> None:
+    """Corre el turno y marca done / failed todos los mensajes que lo componen."""
+    try:
+        run(turn)
+    except Exception:
+        for message_id in message_ids:
+            inbound_dedupe.finish(message_id, ok=False)
+        raise
+    for message_id in message_ids:
+        inbound_dedupe.finish(message_id, ok=True)
+
+
+def _settle(buf, phone: str, row_id: int, turn: Turn, message_ids: List[str],
+            run: Callable[[Turn], Any]) -> bool:
+    """Fin de la ventana de `row_id`: si le toca, se lleva la ráfaga y corre el turno."""
+    t0 = time.perf_counter()
+    upto = row_id
+    try:
+        rows = buf.pending(phone)
+    except Exception as e:
+        _db_failed(e, "inbound_bursts_pending", phone)
+        rows = None  # sin lectura: se lleva hasta su propia fila
+    if rows is not None:
+        ids = [r[0] for r in rows]
+        if row_id not in ids:
+            op_log("coalesce", "turn", "OK", t0=t0, to_phone=phone, extra={"result": "merged", "store": buf.name})
+            return False  # ya lo tomó otro mensaje de la ráfaga
+        oldest_age = max((age for rid, age in rows if age < PX_COALESCE_STALE_S), default=0.0)
+        if ids[-1] != row_id and oldest_age < PX_COALESCE_MAX_WAIT_S:
+            op_log("coalesce", "turn", "OK", t0=t0, to_phone=phone, extra={"result": "merged", "store": buf.name})
+            return False  # llegó otro después: ese cierra la ráfaga
+        upto = ids[-1]
+
+    try:
+        taken = buf.take(phone, upto)
+    except Exception as e:
+        _db_failed(e, "inbound_bursts_take", phone)
+        op_log("coalesce", "turn", "OK", t0=t0, to_phone=phone, extra={"result": "direct", "messages": 1})
+        _run_and_finish(run, turn, message_ids)  # fail-open: el mensaje va solo
+        return True
+    if not taken:
+        return False
+
+    # las filas huérfanas (su turno murió) no se marcan: el reintento del proveedor las vuelve a tomar
+    fresh = [(t, ids) for t, age, ids in taken if age < PX_COALESCE_STALE_S]
+    dropped = len(taken) - len(fresh)
+    op_log("coalesce", "turn", "OK", t0=t0, to_phone=phone,
+           extra={"result": "flush", "store": buf.name, "messages": len(fresh), "stale_dropped": dropped})
+    if not fresh:
+        return False
+    _run_and_finish(run, merge([t for t, _ in fresh]), [m for _, ids in fresh for m in ids])
+    return True
+
+
+def _settle_in_background(buf, phone: str, row_id: int, turn: Turn, message_ids: List[str],
+                          run: Callable[[Turn], Any]) -> None:
+    try:
+        _settle(buf, phone, row_id, turn, message_ids, run)
+    except Exception as e:
+        op_log("coalesce", "turn", "ERROR", error=str(e), to_phone=phone, extra={"result": "flush"})
+    finally:
+        with _timers_lock:
+            _timers.discard(threading.current_thread())
+
+
+def drain(timeout: float) -> None:
+    """Espera las ventanas abiertas en timers (Lambda congela el proceso al devolver)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with _timers_lock:
+            pending = [t for t in _timers if t.is_alive()]
+        if not pending:
+            return
+        pending[0].join(max(0.0, deadline - time.monotonic()))
@@ -0,0 +1,176 @@
+# app/services/compaction.py
+"""
+Compactación incremental de la conversación para el nodo 203 (Sherlock).
+
+Cuando lo no resumido del historial pasa PX_COMPACTION_TRIGGER_TOKENS, los mensajes viejos
+(todo menos los últimos PX_COMPACTION_KEEP_RECENT, sin partir un par pregunta/respuesta) se pliegan
+en un resumen clínico por TX (conversation_summaries). Cada fold parte del resumen anterior + los
+mensajes nuevos: no se regenera desde cero. El fold corre en background (precompute); el turno usa el resumen que haya.
+
+Prompt del 203 = system del evento + resumen + mensajes posteriores al resumen (y sobre eso la
+ventana de prompt_window), así el tamaño queda acotado aunque la sesión siga.
+
+El resumen guarda el sha256 del prefijo que cubre (covered_sha256): si el historial se reescribió
+(message_p._reescribir_historial) el prefijo ya no coincide y el resumen se ignora / se rehace.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.obs.logs import op_log
+from app.services import prompt_window
+
+PX_COMPACTION = os.getenv("PX_COMPACTION", "1") == "1"
+COMPACTION_TRIGGER_TOKENS = int(os.getenv("PX_COMPACTION_TRIGGER_TOKENS", "1200"))
+COMPACTION_KEEP_RECENT = int(os.getenv("PX_COMPACTION_KEEP_RECENT", "6"))  # mensajes que siempre van textuales
+COMPACTION_TIMEOUT = float(os.getenv("PX_COMPACTION_TIMEOUT", "30"))
+COMPACTION_LRU_SIZE = int(os.getenv("PX_COMPACTION_LRU_SIZE", "256"))
+
+COMPACTION_PROMPT = (
+    "Sos un médico de guardia que mantiene un RESUMEN CLÍNICO acumulado de un triage por WhatsApp.\n"
+    "Te paso el resumen previo (puede estar vacío) y los mensajes NUEVOS de la conversación (JSON {role, content}).\n"
+    "Devolvé el resumen ACTUALIZADO: el previo + lo nuevo, en español, registro clínico, frases cortas.\n"
+    "- Conservá siempre el motivo de consulta, síntomas con tiempos, antecedentes, medicación, alergias, "
+    "resultados de adjuntos (imágenes/PDF/audio) y las preguntas ya hechas con su respuesta (resumidas).\n"
+    "- No inventes ni infieras datos que no estén en el texto.\n"
+    "- Omití saludos, avisos de fuera de tema y mensajes administrativos.\n"
+    "Respondé SOLO con el texto del resumen, sin títulos ni backticks."
+)
+
+_missing = False  # por proceso: si la tabla no está instalada no se reintenta en cada turno
+# tx_id -> (summary, covered_until, covered_sha256) (write-through, LRU)
+_cache: "OrderedDict[int, Tuple[str, int, str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return PX_COMPACTION and not _missing
+
+
+def _head_len(history: List[Dict[str, Any]]) -> int:
+    """El system del evento (primer mensaje) no se resume: lo maneja cada nodo."""
+    return 1 if history and isinstance(history[0], dict) and history[0].get("role") == "system" else 0
+
+
+def _pair_boundary(history: List[Dict[str, Any]], end: int) -> int:
+    """
+    Corre `end` hacia atrás para no cortar entre una pregunta del asistente y la respuesta del
+    paciente que la sigue (la pregunta queda con los mensajes recientes, como en prompt_window).
+    """
+    if 0 < end < len(history):
+        prev, nxt = history[end - 1], history[end]
+        if (isinstance(prev, dict) and isinstance(nxt, dict)
+                and prev.get("role") == "assistant" and nxt.get("role") == "user"):
+            return end - 1
+    return end
+
+
+def _cache_get(tx_id: int) -> Optional[Tuple[str, int, str]]:
+    with _cache_lock:
+        cached = _cache.get(tx_id)
+        if cached is not None:
+            _cache.move_to_end(tx_id)
+        return cached
+
+
+def _cache_put(tx_id: int, value: Tuple[str, int, str]) -> None:
+    with _cache_lock:
+        _cache[tx_id] = value
+        _cache.move_to_end(tx_id)
+        while len(_cache) > COMPACTION_LRU_SIZE:
+            _cache.popitem(last=False)
+
+
+def _load(tx_id: int) -> Optional[Tuple[str, int, str]]:
+    global _missing
+    cached = _cache_get(tx_id)
+    if cached is not None:
+        return cached
+    from app.Model.conversation_summaries import ConversationSummaries
+    try:
+        row = ConversationSummaries().get_for_tx(tx_id)
+    except Exception as e:
+        if "PGRST205" in str(e) or "42P01" in str(e):
+            _missing = True
+        op_log("compaction", "load_summary", "ERROR", error=str(e), extra={"tx_id": tx_id})
+        return None
+    if row is None or not row.summary:
+        return None
+    loaded = (row.summary, int(row.covered_until or 0), getattr(row, "covered_sha256", None) or "")
+    _cache_put(tx_id, loaded)
+    return loaded
+
+
+def _load_for(tx_id: int, history: List[Dict[str, Any]]) -> Tuple[Optional[Tuple[str, int, str]], bool]:
+    """
+    (resumen, stale). El resumen solo vale si su prefijo es el de este historial;
+    stale=True si hay uno pero es de otro historial (reescritura) o de una fila sin hash.
+    """
+    prev = _load(tx_id)
+    if prev is None:
+        return None, False
+    covered = prev[1]
+    if covered > len(history) or not prev[2] or prompt_window.prefix_sha256(history, covered) != prev[2]:
+        return None, True
+    return prev, False
+
+
+def fold(tx_id: int, history: List[Dict[str, Any]]) -> None:
+    """Agrega al resumen de la TX los mensajes entre lo ya resumido y los últimos KEEP_RECENT."""
+    import app.services.brain as brain
+    from app.Model.conversation_summaries import ConversationSummaries
+
+    prev, stale = _load_for(tx_id, history)
+    summary, start = prev[:2] if prev else ("", _head_len(history))
+    end = _pair_boundary(history, len(history) - COMPACTION_KEEP_RECENT)
+    if end <= start:
+        return
+
+    chunk = history[start:end]
+    messages = [
+        {"role": "system", "content": COMPACTION_PROMPT},
+        {"role": "user", "content": (
+            f"RESUMEN PREVIO:\n{summary or '(vacío)'}\n\n"
+            f"MENSAJES NUEVOS:\n{json.dumps(chunk, ensure_ascii=False)}"
+        )},
+    ]
+    new_summary = (brain.ask_routed("compaction", messages, timeout=COMPACTION_TIMEOUT) or "").strip()
+    if not new_summary:
+        return
+
+    sha = prompt_window.prefix_sha256(history, end)
+    if not ConversationSummaries().save(tx_id, new_summary, end, sha, replace=stale):
+        with _cache_lock:
+            _cache.pop(tx_id, None)  # otro fold guardó uno que cubre más: la próxima lectura lo trae de la base
+        return
+    _cache_put(tx_id, (new_summary, end, sha))
+    op_log("compaction", "fold", "OK", extra={
+        "tx_id": tx_id, "folded": len(chunk), "covered_until": end, "restarted": stale,
+        "summary_tokens": prompt_window.count_tokens(new_summary),
+    })
+
+
+def compact_history(tx_id: Optional[int], history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Historial para el prompt: system del evento + resumen (si hay) + mensajes posteriores.
+    Si lo no resumido ya pasa el umbral, agenda un fold en background para los próximos turnos.
+    """
+    if not enabled() or not tx_id or not history:
+        return history
+
+    head = _head_len(history)
+    prev, _ = _load_for(tx_id, history)  # resumen de otro historial (reescritura): se ignora
+    covered = prev[1] if prev else head
+
+    tail = history[covered:]
+    tail_tokens = sum(prompt_window.message_tokens(m) for m in tail if isinstance(m, dict))
+    if tail_tokens > COMPACTION_TRIGGER_TOKENS and len(tail) > COMPACTION_KEEP_RECENT:
+        from app.services import precompute
+        precompute.submit("compaction", tx_id, fold, tx_id, list(history))
+
+    if prev is None:
+        return history
+    summary_msg = {"role": "system", "content": f"{prompt_window.SUMMARY_PREFIX} {prev[0]}"}
+    return history[:head] + [summary_msg] + tail
@@ -0,0 +1,161 @@
+# app/services/inbound_dedupe.py
+"""
+Idempotencia de los mensajes entrantes por id del proveedor (Twilio MessageSid / Meta wamid).
+
+Un reintento del proveedor (turno lento, timeout) no vuelve a correr el pipeline:
+  1) LRU en proceso (mismo container: ni siquiera va a la base)
+  2) tabla inbound_messages con PK en el id: INSERT ... ON CONFLICT DO NOTHING (1 lookup por índice)
+Estados: received (modo ack, ya encolado) -> processing -> done | failed.
+Se puede volver a tomar un mensaje en failed, o en received / processing si quedó colgado más de
+PX_DEDUPE_STALE_S (el encolado o el turno que lo tenía murió sin marcarlo).
+
+Si la tabla no está o la base falla, sigue solo con el LRU (fail-open: mejor un duplicado
+que perder el mensaje del paciente).
+Métrica: op_log("dedupe", "inbound") con result = new | duplicate | takeover | no_db.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+from app.obs.logs import op_log
+
+PX_DEDUPE = os.getenv("PX_DEDUPE", "1") == "1"
+DEDUPE_LRU_SIZE = int(os.getenv("PX_DEDUPE_LRU_SIZE", "2048"))
+DEDUPE_STALE_S = float(os.getenv("PX_DEDUPE_STALE_S", "180"))  # > duración máx. de un turno (y de la espera en cola)
+
+_missing = False  # por proceso: si la tabla no está instalada no se reintenta en cada mensaje
+_lru: "OrderedDict[str, str]" = OrderedDict()  # provider_message_id -> último estado visto
+_lru_lock = threading.Lock()
+_deferred: set = set()  # ids que quedaron en el buffer de coalesce: los marca el turno de la ráfaga
+_deferred_lock = threading.Lock()
+
+
+def _lru_get(message_id: str) -> Optional[str]:
+    with _lru_lock:
+        status = _lru.get(message_id)
+        if status is not None:
+            _lru.move_to_end(message_id)
+        return status
+
+
+def _lru_put(message_id: str, status: Optional[str]) -> None:
+    with _lru_lock:
+        if status is None:
+            _lru.pop(message_id, None)
+            return
+        _lru[message_id] = status
+        _lru.move_to_end(message_id)
+        while len(_lru) > DEDUPE_LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def claim(provider: str, message_id: Optional[str], phone: Optional[str] = None,
+          status: str = "processing") -> bool:
+    """
+    True si este proceso tiene que procesar el mensaje (y queda en `status`); False si es un duplicado.
+    status="received" lo usa el webhook en modo ack; el worker después pide "processing".
+    Sin message_id (payload raro) no hay cómo deduplicar: se procesa.
+    """
+    global _missing
+    if not PX_DEDUPE or not message_id:
+        return True
+
+    t0 = time.perf_counter()
+    seen = _lru_get(message_id)
+    # lo único que se puede tomar desde el LRU es received -> processing (el worker del mismo mensaje)
+    if seen is not None and not (seen == "received" and status == "processing") and seen != "failed":
+        op_log("dedupe", "inbound", "OK", t0=t0,
+               extra={"channel": provider, "message_id": message_id, "result": "duplicate", "source": "lru"})
+        return False
+
+    result = "new"
+    if not _missing:
+        from app.Model.inbound_messages import InboundMessages
+        model = InboundMessages()
+        try:
+            if not model.insert_new(message_id, provider, phone, status):
+                from_statuses = ("received", "failed") if status == "processing" else ("failed",)
+                if model.take_over(message_id, from_statuses, status):
+                    result = "takeover"
+                elif model.take_over(message_id, (), status, stale_before=model.stale_cutoff(DEDUPE_STALE_S)):
+                    result = "takeover"
+                else:
+                    result = "duplicate"
+        except Exception as e:
+            if "PGRST205" in str(e) or "42P01" in str(e):
+                _missing = True
+            op_log("supabase", "inbound_messages_claim", "ERROR", t0=t0, error=str(e),
+                   extra={"channel": provider, "message_id": message_id})
+            result = "no_db"
+    else:
+        result = "no_db"
+
+    if result == "duplicate":
+        _lru_put(message_id, "done")  # no sabemos si terminó, pero no es nuestro: que el LRU lo corte
+    else:
+        _lru_put(message_id, status)
+    op_log("dedupe", "inbound", "OK", t0=t0,
+           extra={"channel": provider, "message_id": message_id, "result": result, "source": "db"})
+    return result != "duplicate"
+
+
+def finish(message_id: Optional[str], ok: bool = True) -> None:
+    """
+    Marca el mensaje como done / failed (failed: un reintento del proveedor lo vuelve a procesar).
+    El webhook en modo ack lo llama con ok=False si no pudo encolar lo que reclamó como received.
+    """
+    if not PX_DEDUPE or not message_id:
+        return
+    status = "done" if ok else "failed"
+    _lru_put(message_id, status)
+    if _missing:
+        return
+    from app.Model.inbound_messages import InboundMessages
+    try:
+        InboundMessages().set_status(message_id, status)
+    except Exception as e:
+        op_log("supabase", "inbound_messages_status", "ERROR", error=str(e), extra={"message_id": message_id})
+
+
+def defer(message_ids: Iterable[Optional[str]]) -> None:
+    """
+    El mensaje quedó en la ventana de coalescing: el guard no lo marca al salir.
+    Lo marca coalesce (finish) con el resultado del turno de la ráfaga que lo incluye.
+    """
+    if not PX_DEDUPE:
+        return
+    with _deferred_lock:
+        _deferred.update(m for m in message_ids if m)
+
+
+def _take_deferred(message_id: Optional[str]) -> bool:
+    with _deferred_lock:
+        if message_id in _deferred:
+            _deferred.discard(message_id)
+            return True
+        return False
+
+
+@contextmanager
+def guard(provider: str, message_id: Optional[str], phone: Optional[str] = None):
+    """
+    with guard("meta", wamid, phone) as fresh:
+        if fresh: ... turno ...
+    Marca done al salir bien y failed si el turno levanta una excepción
+    (salvo que el mensaje haya quedado diferido en coalesce: ver defer).
+    """
+    fresh = claim(provider, message_id, phone, status="processing")
+    if not fresh:
+        yield False
+        return
+    try:
+        yield True
+    except Exception:
+        if not _take_deferred(message_id):
+            finish(message_id, ok=False)
+        raise
+    if not _take_deferred(message_id):
+        finish(message_id, ok=True)
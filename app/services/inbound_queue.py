@@ -0,0 +1,374 @@
+# app/services/inbound_queue.py
+"""
+Modo "ack-then-process" de los webhooks de WhatsApp (Twilio / Meta).
+
+PX_INGEST_MODE:
+  "sync" (default) -> el webhook procesa el turno entero antes de responder (como siempre)
+  "ack"            -> el webhook valida, guarda el evento crudo (inbound_events), lo encola
+                      y devuelve 200 al toque; un worker corre el turno (media + engine)
+
+La cola tiene la forma de SQS (send / receive / delete con receipt) y el backend sale de PX_QUEUE_BACKEND:
+  "inline" -> se procesa en el mismo request al encolar (debug: mismo camino que el worker)
+  "thread" -> cola en memoria + un thread worker en el mismo proceso (flask run local)
+  "sqlite" -> archivo PX_QUEUE_SQLITE_PATH; el worker es otro proceso (scripts/run_inbound_worker.py)
+  "sqs"    -> Amazon SQS (PX_QUEUE_URL); en Lambda lo consume wsgi.worker_handler (evento SQS)
+
+En Lambda el modo ack necesita "sqs": la Lambda HTTP no espera la cola antes de devolver.
+
+Cuerpo de cada mensaje: {"provider", "payload", "event_id", "received_at"}.
+consume(body) es el consumidor: despacha a app/routes/whatsapp.py (process_twilio_form /
+process_meta_event), que terminan en message_p.handle_incoming_message; provider "precompute"
+son trabajos de app/services/precompute.py (PX_PRECOMPUTE=queue), sin fila en inbound_events.
+Métricas: op_log("queue", "enqueue" | "consume") con backend, channel (twilio|meta), event_id y queue_ms.
+"""
+import json
+import os
+import queue as _queue
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.obs.logs import op_log
+
+PX_INGEST_MODE = os.getenv("PX_INGEST_MODE", "sync").lower()
+PX_QUEUE_BACKEND = os.getenv("PX_QUEUE_BACKEND", "thread").lower()
+PX_QUEUE_URL = os.getenv("PX_QUEUE_URL", "")
+PX_QUEUE_SQLITE_PATH = os.getenv("PX_QUEUE_SQLITE_PATH", "/tmp/px_inbound_queue.db")
+PX_QUEUE_VISIBILITY_S = int(os.getenv("PX_QUEUE_VISIBILITY_S", "120"))  # > duración de un turno
+PX_QUEUE_DRAIN_S = float(os.getenv("PX_QUEUE_DRAIN_S", "25"))           # espera máx. de drain() (thread)
+PX_QUEUE_WORKERS = int(os.getenv("PX_QUEUE_WORKERS", "4"))             # turnos en paralelo (teléfonos distintos)
+
+_events_missing = False  # por proceso: si inbound_events no está, no se reintenta en cada webhook
+
+
+def ack_mode() -> bool:
+    return PX_INGEST_MODE == "ack"
+
+
+@dataclass(frozen=True)
+class QueueMessage:
+    message_id: str
+    body: Dict[str, Any]
+    receipt: str
+
+
+# ===== Backends (misma forma que SQS) =====
+class InlineQueue:
+    """send() procesa en el momento: sirve para probar el camino del worker sin otro proceso."""
+    name = "inline"
+
+    def send(self, body: Dict[str, Any]) -> str:
+        message_id = uuid.uuid4().hex
+        consume(body)
+        return message_id
+
+    def receive(self, max_messages: int = 1, wait_s: float = 0) -> List[QueueMessage]:
+        return []
+
+    def delete(self, receipt: str) -> None:
+        pass
+
+
+class ThreadQueue:
+    """Cola en memoria con un thread consumidor (run_worker: en orden por teléfono, teléfonos en paralelo)."""
+    name = "thread"
+
+    def __init__(self):
+        self._q: "_queue.Queue[QueueMessage]" = _queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def send(self, body: Dict[str, Any]) -> str:
+        message_id = uuid.uuid4().hex
+        self._q.put(QueueMessage(message_id, body, message_id))
+        self._ensure_worker()
+        return message_id
+
+    def receive(self, max_messages: int = 1, wait_s: float = 0) -> List[QueueMessage]:
+        out: List[QueueMessage] = []
+        try:
+            out.append(self._q.get(timeout=wait_s) if wait_s else self._q.get_nowait())
+            while len(out) < max_messages:
+                out.append(self._q.get_nowait())
+        except _queue.Empty:
+            pass
+        return out
+
+    def delete(self, receipt: str) -> None:
+        self._q.task_done()
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=run_worker, args=(self,), daemon=True,
+                                                name="px-inbound-worker")
+                self._worker.start()
+
+    def join(self, timeout: float) -> None:
+        """Espera a que se procese lo encolado (hasta timeout)."""
+        deadline = time.monotonic() + timeout
+        while self._q.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+class SQLiteQueue:
+    """Cola durable local: un archivo SQLite con visibilidad por mensaje (como SQS)."""
+    name = "sqlite"
+
+    def __init__(self, path: str = PX_QUEUE_SQLITE_PATH):
+        self.path = path
+        with self._conn() as conn:
+            conn.execute(
+                "create table if not exists jobs ("
+                " id text primary key, body text not null, visible_at real not null,"
+                " receipt text, attempts integer not null default 0, created_at real not null)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("pragma journal_mode=wal")
+        return conn
+
+    def send(self, body: Dict[str, Any]) -> str:
+        message_id = uuid.uuid4().hex
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("insert into jobs (id, body, visible_at, created_at) values (?, ?, ?, ?)",
+                         (message_id, json.dumps(body, ensure_ascii=False), now, now))
+        return message_id
+
+    def receive(self, max_messages: int = 1, wait_s: float = 0) -> List[QueueMessage]:
+        deadline = time.monotonic() + wait_s
+        while True:
+            out: List[QueueMessage] = []
+            conn = self._conn()
+            try:
+                conn.execute("begin immediate")  # dos workers no toman el mismo mensaje
+                now = time.time()
+                rows = conn.execute(
+                    "select id, body from jobs where visible_at <= ? order by created_at limit ?",
+                    (now, max_messages),
+                ).fetchall()
+                for message_id, body in rows:
+                    receipt = uuid.uuid4().hex
+                    conn.execute(
+                        "update jobs set visible_at = ?, receipt = ?, attempts = attempts + 1 where id = ?",
+                        (now + PX_QUEUE_VISIBILITY_S, receipt, message_id),
+                    )
+                    out.append(QueueMessage(message_id, json.loads(body), receipt))
+                conn.execute("commit")
+            finally:
+                conn.close()
+            if out or time.monotonic() >= deadline:
+                return out
+            time.sleep(0.2)
+
+    def delete(self, receipt: str) -> None:
+        with self._conn() as conn:
+            conn.execute("delete from jobs where receipt = ?", (receipt,))
+
+
+class SQSQueue:
+    """Amazon SQS (boto3 viene en el runtime de Lambda)."""
+    name = "sqs"
+
+    def __init__(self, url: str = PX_QUEUE_URL):
+        if not url:
+            raise ValueError("PX_QUEUE_URL no está configurado")
+        import boto3
+        self.url = url
+        self._client = boto3.client("sqs")
+
+    def send(self, body: Dict[str, Any]) -> str:
+        r = self._client.send_message(QueueUrl=self.url, MessageBody=json.dumps(body, ensure_ascii=False))
+        return r["MessageId"]
+
+    def receive(self, max_messages: int = 1, wait_s: float = 0) -> List[QueueMessage]:
+        r = self._client.receive_message(QueueUrl=self.url, MaxNumberOfMessages=min(max_messages, 10),
+                                         WaitTimeSeconds=int(wait_s), VisibilityTimeout=PX_QUEUE_VISIBILITY_S)
+        return [QueueMessage(m["MessageId"], json.loads(m["Body"]), m["ReceiptHandle"])
+                for m in r.get("Messages", [])]
+
+    def delete(self, receipt: str) -> None:
+        self._client.delete_message(QueueUrl=self.url, ReceiptHandle=receipt)
+
+
+_BACKENDS = {"inline": InlineQueue, "thread": ThreadQueue, "sqlite": SQLiteQueue, "sqs": SQSQueue}
+_queue_instance = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue_instance
+    if _queue_instance is None:
+        with _queue_lock:
+            if _queue_instance is None:
+                _queue_instance = _BACKENDS.get(PX_QUEUE_BACKEND, ThreadQueue)()
+    return _queue_instance
+
+
+# ===== Productor (webhook) =====
+def _record_event(provider: str, payload: Dict[str, Any]) -> Optional[int]:
+    global _events_missing
+    if _events_missing:
+        return None
+    from app.Model.inbound_events import InboundEvents
+    t0 = time.perf_counter()
+    try:
+        return InboundEvents().record(provider, payload)
+    except Exception as e:
+        if "PGRST205" in str(e) or "42P01" in str(e):
+            _events_missing = True
+        op_log("supabase", "inbound_event_insert", "ERROR", t0=t0, error=str(e), extra={"channel": provider})
+        return None
+
+
+def enqueue(provider: str, payload: Dict[str, Any], record_event: bool = True) -> str:
+    """Guarda el evento crudo y lo encola. Lo llama el webhook antes de devolver 200."""
+    t0 = time.perf_counter()
+    body = {
+        "provider": provider,
+        "payload": payload,
+        "event_id": _record_event(provider, payload) if record_event else None,
+        "received_at": datetime.now(timezone.utc).isoformat(),
+    }
+    q = get_queue()
+    message_id = q.send(body)
+    op_log("queue", "enqueue", "OK", t0=t0,
+           extra={"backend": q.name, "channel": provider, "event_id": body["event_id"], "message_id": message_id})
+    return message_id
+
+
+# ===== Consumidor (worker) =====
+def _set_status(event_id: Optional[int], status: str, error: Optional[str] = None) -> None:
+    if not event_id or _events_missing:
+        return
+    from app.Model.inbound_events import InboundEvents
+    try:
+        InboundEvents().set_status(event_id, status, error)
+    except Exception as e:
+        op_log("supabase", "inbound_event_status", "ERROR", error=str(e), extra={"event_id": event_id})
+
+
+def consume(body: Dict[str, Any]) -> None:
+    """
+    Procesa un evento encolado. Los errores del turno se manejan adentro (el paciente recibe el
+    aviso de error como en modo sync); lo que se escapa acá hace que la cola lo reintente.
+    """
+    from app.routes import whatsapp
+
+    t0 = time.perf_counter()
+    provider = body.get("provider")
+    event_id = body.get("event_id")
+    queue_ms = None
+    try:
+        received = datetime.fromisoformat(body["received_at"])
+        queue_ms = int((datetime.now(timezone.utc) - received).total_seconds() * 1000)
+    except Exception:
+        pass
+    try:
+        if provider == "twilio":
+            whatsapp.process_twilio_form(body.get("payload") or {})
+        elif provider == "meta":
+            whatsapp.process_meta_event(body.get("payload") or {})
+        elif provider == "precompute":
+            from app.services import precompute
+            precompute.run_queued(body.get("payload") or {})
+        else:
+            raise ValueError(f"provider desconocido: {provider!r}")
+    except Exception as e:
+        _set_status(event_id, "failed", str(e))
+        op_log("queue", "consume", "ERROR", t0=t0, error=str(e),
+               extra={"channel": provider, "event_id": event_id, "queue_ms": queue_ms})
+        raise
+    _set_status(event_id, "done")
+    op_log("queue", "consume", "OK", t0=t0, extra={"channel": provider, "event_id": event_id, "queue_ms": queue_ms})
+
+
+def _phone_key(body: Dict[str, Any]) -> str:
+    """Teléfono del evento encolado (clave del KeyedExecutor): mismo paciente -> en orden."""
+    payload = body.get("payload") or {}
+    if body.get("provider") == "precompute":
+        return f"precompute:{payload.get('kind')}:{payload.get('tx_id')}"
+    if body.get("provider") == "twilio":
+        phone = payload.get("From") or ""
+    else:
+        phone = next((m.get("from") for entry in (payload.get("entry") or [])
+                      for change in (entry.get("changes") or [])
+                      for m in ((change.get("value") or {}).get("messages") or []) if m.get("from")), "")
+    return phone.replace("whatsapp:", "").replace("+", "")
+
+
+def run_worker(q=None, max_messages: int = 1, wait_s: float = 5, stop_when_empty: bool = False,
+               workers: Optional[int] = None) -> int:
+    """
+    Loop del worker (thread / sqlite / sqs fuera de Lambda). Devuelve cuántos mensajes procesó.
+    Los turnos corren en un KeyedExecutor: en orden por teléfono, teléfonos distintos en paralelo.
+    """
+    from app.services import coalesce
+    from app.services.keyed_executor import KeyedExecutor
+
+    q = q or get_queue()
+    coalesce.set_background(True)  # la ventana de coalescing no frena al consumidor (corre en un timer)
+    workers = PX_QUEUE_WORKERS if workers is None else workers
+    executor = KeyedExecutor(workers, name="px-inbound")
+    in_flight = threading.BoundedSemaphore(workers * 2)  # no recibir más de lo que se puede procesar
+    done = [0]
+    done_lock = threading.Lock()
+
+    def _process(m: QueueMessage) -> None:
+        try:
+            consume(m.body)
+        except Exception:
+            if isinstance(q, ThreadQueue):
+                q.delete(m.receipt)  # en memoria no hay reintento: ya quedó logueado
+            return  # sqlite / sqs: vuelve a ser visible después de PX_QUEUE_VISIBILITY_S
+        finally:
+            in_flight.release()
+        q.delete(m.receipt)
+        with done_lock:
+            done[0] += 1
+
+    try:
+        while True:
+            messages = q.receive(max_messages=max_messages, wait_s=wait_s)
+            if not messages and stop_when_empty:
+                break
+            for m in messages:
+                in_flight.acquire()
+                executor.submit(_phone_key(m.body), _process, m)
+    finally:
+        executor.shutdown(wait=True)
+        if stop_when_empty:
+            coalesce.drain(PX_QUEUE_DRAIN_S)
+    return done[0]
+
+
+def handle_sqs_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Consumidor de Lambda con trigger SQS (wsgi.worker_handler). Devuelve los mensajes fallidos
+    (ReportBatchItemFailures) para que SQS reintente solo esos.
+    """
+    failures = []
+    for record in event.get("Records") or []:
+        try:
+            consume(json.loads(record.get("body") or "{}"))
+        except Exception:
+            failures.append({"itemIdentifier": record.get("messageId")})
+    return {"batchItemFailures": failures}
+
+
+def drain(timeout: Optional[float] = None) -> None:
+    """Backend thread en un proceso que se va a cortar: esperar lo encolado (hasta timeout)."""
+    from app.services import coalesce
+
+    q = _queue_instance
+    if isinstance(q, ThreadQueue):
+        timeout = PX_QUEUE_DRAIN_S if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        q.join(timeout)
+        coalesce.drain(max(0.0, deadline - time.monotonic()))  # ventanas abiertas en timers
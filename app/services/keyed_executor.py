@@ -0,0 +1,50 @@
+# app/services/keyed_executor.py
+"""
+Pool de threads con orden por clave: las tareas con la misma clave (teléfono) corren una a la vez y en
+el orden en que llegaron; claves distintas corren en paralelo (hasta max_workers).
+
+Lo usa el worker del modo ack (inbound_queue.run_worker) para no frenar a todos los pacientes detrás
+del turno lento de uno. Dentro del turno, phone_lock.hold sigue cuidando el caso entre instancias.
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Tuple
+
+_Task = Tuple[Future, Callable[..., Any], tuple, dict]
+
+
+class KeyedExecutor:
+    def __init__(self, max_workers: int, name: str = "px-keyed"):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix=name)
+        self._pending: Dict[Hashable, Deque[_Task]] = {}  # clave presente = hay un thread vaciándola
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        fut: Future = Future()
+        with self._lock:
+            tasks = self._pending.get(key)
+            if tasks is not None:
+                tasks.append((fut, fn, args, kwargs))  # la toma el thread que ya corre esta clave
+                return fut
+            self._pending[key] = deque([(fut, fn, args, kwargs)])
+        self._pool.submit(self._run_key, key)
+        return fut
+
+    def _run_key(self, key: Hashable) -> None:
+        while True:
+            with self._lock:
+                tasks = self._pending[key]
+                if not tasks:
+                    del self._pending[key]
+                    return
+                fut, fn, args, kwargs = tasks.popleft()
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                fut.set_exception(e)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
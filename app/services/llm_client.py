@@ -0,0 +1,68 @@
+# app/services/llm_client.py
+import os
+import threading
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+from openai import OpenAI
+
+load_dotenv()
+
+# ===== Config (override por env)
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "10"))                  # conexiones keep-alive a api.openai.com
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120"))  # s que una conexión ociosa sigue abierta
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))                      # default por llamada (lectura)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+_client: Optional[OpenAI] = None
+_lock = threading.Lock()
+
+
+def _build_client() -> OpenAI:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("API key no encontrada. Configura la variable de entorno OPENAI_API_KEY.")
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=OPENAI_POOL_SIZE,
+            max_keepalive_connections=OPENAI_POOL_SIZE,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    )
+    # base_url: OPENAI_BASE_URL (lo lee el SDK) -> permite apuntar a un endpoint fake en benchmarks
+    return OpenAI(
+        api_key=api_key,
+        http_client=http_client,
+        max_retries=OPENAI_MAX_RETRIES,
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    )
+
+
+def get_llm_client(timeout: Optional[float] = None) -> OpenAI:
+    """
+    Cliente OpenAI compartido por todo el proceso (brain, vision, wisper, reporting...).
+    - Se crea una sola vez (lazy): en Lambda "warm" se reutilizan las conexiones TLS
+      abiertas entre las 2-4 llamadas al LLM de cada turno y entre invocaciones.
+    - Pool keep-alive configurable (OPENAI_POOL_SIZE / OPENAI_KEEPALIVE_EXPIRY).
+    - timeout: override por llamada (segundos de lectura); comparte el mismo pool.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _build_client()
+    if timeout is not None:
+        return _client.with_options(timeout=httpx.Timeout(timeout, connect=OPENAI_CONNECT_TIMEOUT))
+    return _client
+
+
+def reset_llm_client() -> None:
+    """Cierra y descarta el cliente compartido (útil en tests/benchmarks o si cambia la API key)."""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client = None
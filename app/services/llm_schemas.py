@@ -0,0 +1,158 @@
+# app/services/llm_schemas.py
+"""
+Salidas estructuradas (JSON schema) para las llamadas que clasifican o extraen datos.
+
+Cada OutputSchema tiene:
+  - schema:   JSON schema "strict" que se manda a la Responses API (text.format=json_schema)
+  - validate: valida/normaliza el dict parseado; ValueError si no sirve (-> brain reintenta)
+
+brain.ask_openai_json(messages, SCHEMA) devuelve el dict ya validado.
+Los schemas de digest y reporte se arman en sus módulos con object_schema(...).
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class OutputSchema:
+    name: str
+    schema: Dict[str, Any]
+    validate: Callable[[Dict[str, Any]], Dict[str, Any]]
+    compare_keys: Tuple[str, ...] = ()  # claves que definen "acuerdo" en modo sombra (vacío = todas)
+
+
+def object_schema(properties: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Objeto strict: todas las claves requeridas y sin claves extra (requisito de strict=True)."""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def string_fields(keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    return {k: {"type": "string"} for k in keys}
+
+
+def require_strings(data: Dict[str, Any], keys: Iterable[str]) -> Dict[str, Any]:
+    """Validador genérico: cada clave presente y string (vacío permitido: el caller pone defaults)."""
+    out = dict(data)
+    for k in keys:
+        v = data.get(k)
+        if v is None:
+            v = ""
+        if not isinstance(v, str):
+            raise ValueError(f"'{k}' debe ser string")
+        out[k] = v.strip()
+    return out
+
+
+def parse_json_lenient(text: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Parseo con las reparaciones de siempre. Devuelve (dict|None, reparación usada):
+    "none" (JSON directo), "fences" (```json ...```), "slice" (primer {...}), "failed".
+    """
+    t = (text or "").strip()
+    try:
+        data = json.loads(t)
+        return (data, "none") if isinstance(data, dict) else (None, "failed")
+    except Exception:
+        pass
+    unfenced = re.sub(r"^```(?:json)?\s*|\s*```$", "", t, flags=re.I | re.S).strip()
+    if unfenced != t:
+        try:
+            data = json.loads(unfenced)
+            if isinstance(data, dict):
+                return data, "fences"
+        except Exception:
+            pass
+    s, e = unfenced.find("{"), unfenced.rfind("}")
+    if s != -1 and e > s:
+        try:
+            data = json.loads(unfenced[s:e + 1])
+            if isinstance(data, dict):
+                return data, "slice"
+        except Exception:
+            pass
+    return None, "failed"
+
+
+# ===== nodo_201: motivo de consulta + urgencia =====
+URGENCY_VALUES = ("urgent", "need_more_questions", "n/a")
+
+
+def _validate_triage_urgency(data: Dict[str, Any]) -> Dict[str, Any]:
+    is_medical = data.get("is_medical_reason")
+    urgency = data.get("urgency")
+    if not isinstance(is_medical, bool):
+        raise ValueError("is_medical_reason debe ser booleano")
+    if urgency not in URGENCY_VALUES:
+        raise ValueError(f"urgency inválida: {urgency!r}")
+    if not is_medical:
+        urgency = "n/a"
+    elif urgency == "n/a":
+        raise ValueError("urgency 'n/a' con motivo médico")
+    return {"is_medical_reason": is_medical, "urgency": urgency}
+
+
+TRIAGE_URGENCY = OutputSchema(
+    name="triage_urgency",
+    schema=object_schema({
+        "is_medical_reason": {"type": "boolean"},
+        "urgency": {"type": "string", "enum": list(URGENCY_VALUES)},
+    }),
+    validate=_validate_triage_urgency,
+)
+
+
+# ===== nodo_203: respuesta on-topic + próxima pregunta =====
+def _validate_next_question(data: Dict[str, Any]) -> Dict[str, Any]:
+    is_on_topic = data.get("is_on_topic")
+    next_question = data.get("next_question")
+    if not isinstance(is_on_topic, bool):
+        raise ValueError("is_on_topic debe ser booleano")
+    if not isinstance(next_question, str):
+        raise ValueError("next_question debe ser string")
+    next_question = next_question.strip()
+    if is_on_topic and not next_question:
+        raise ValueError("next_question vacía con respuesta on-topic")
+    return {"is_on_topic": is_on_topic, "next_question": next_question}
+
+
+NEXT_QUESTION = OutputSchema(
+    name="next_question",
+    schema=object_schema({
+        "is_on_topic": {"type": "boolean"},
+        "next_question": {"type": "string"},
+    }),
+    validate=_validate_next_question,
+    compare_keys=("is_on_topic",),  # la pregunta es texto libre: no cuenta para el acuerdo
+)
+
+
+# ===== nodo_201 fusionado: urgencia + primera pregunta de Sherlock en una sola llamada =====
+def _validate_triage_entry(data: Dict[str, Any]) -> Dict[str, Any]:
+    out = _validate_triage_urgency(data)
+    next_question = data.get("next_question")
+    if next_question is None:
+        next_question = ""
+    if not isinstance(next_question, str):
+        raise ValueError("next_question debe ser string")
+    # la pregunta solo sirve si se sigue preguntando; si falta, el 203 la genera como siempre
+    out["next_question"] = next_question.strip() if out["urgency"] == "need_more_questions" else ""
+    return out
+
+
+TRIAGE_ENTRY = OutputSchema(
+    name="triage_entry",
+    schema=object_schema({
+        "is_medical_reason": {"type": "boolean"},
+        "urgency": {"type": "string", "enum": list(URGENCY_VALUES)},
+        "next_question": {"type": "string"},
+    }),
+    validate=_validate_triage_entry,
+    compare_keys=("is_medical_reason", "urgency"),
+)
@@ -0,0 +1,54 @@
+# app/services/media_pool.py
+"""
+Descarga + análisis de la media de una entrega (audios, imágenes, PDFs) en paralelo, con un tope
+de threads para todo el proceso (PX_MEDIA_WORKERS): una foto de 8 imágenes no abre 8 llamadas a
+vision por cada webhook que llega al mismo tiempo.
+
+map_ordered(fn, items) devuelve [(resultado, error)] en el orden de items: el turno que arma
+app/routes/whatsapp.py respeta el orden en que el paciente mandó las cosas aunque terminen desordenadas.
+Métrica: op_log("media", "fanout") con items, errors y workers.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from app.obs.logs import op_log
+
+PX_MEDIA_WORKERS = int(os.getenv("PX_MEDIA_WORKERS", "4"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, PX_MEDIA_WORKERS), thread_name_prefix="px-media")
+    return _executor
+
+
+def _call(fn: Callable[[Any], Any], item: Any) -> Tuple[Any, Optional[Exception]]:
+    try:
+        return fn(item), None
+    except Exception as e:
+        return None, e
+
+
+def map_ordered(fn: Callable[[Any], Any], items: Sequence[Any]) -> List[Tuple[Any, Optional[Exception]]]:
+    """fn(item) para cada item (en paralelo si hay más de uno); los errores vuelven en su lugar, no cortan al resto."""
+    if len(items) <= 1:
+        return [_call(fn, item) for item in items]
+
+    t0 = time.perf_counter()
+    executor = _get_executor()
+    # cada tarea con una copia del contexto (request_id / tx_id de los op_log)
+    futures = [executor.submit(contextvars.copy_context().run, _call, fn, item) for item in items]
+    results = [f.result() for f in futures]
+    op_log("media", "fanout", "OK", t0=t0,
+           extra={"items": len(items), "errors": sum(1 for _, e in results if e), "workers": PX_MEDIA_WORKERS})
+    return results
@@ -0,0 +1,139 @@
+# app/services/model_routing.py
+"""
+Tabla de ruteo: tarea del engine -> (modelo, temperatura) y candidato en modo sombra.
+
+Prioridad (de menor a mayor): DEFAULT_ROUTES < events.model_routing (por evento) < PX_MODEL_ROUTES (env).
+Formato (igual en la columna y en el env, JSON):
+    {"triage_urgency": {"model": "gpt-4.1-mini", "temperature": 0},
+     "shadow": {"triage_urgency": "gpt-4.1-nano"}}
+
+Modo sombra: con un candidato configurado para la tarea, después de la llamada real se corre
+la misma llamada con el candidato fuera del turno (precompute) y se loguea acuerdo y latencia:
+    op_log("llm_routing", "shadow", ...) -> task, primary_model, shadow_model, agree, diff, latencias
+La respuesta del candidato nunca se usa. PX_MODEL_SHADOW_RATE (0..1) muestrea qué llamadas se sombrean.
+"""
+import itertools
+import json
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.obs.logs import CTX_TX_ID, op_log
+
+DEFAULT_MODEL = "gpt-4.1"
+SHADOW_RATE = float(os.getenv("PX_MODEL_SHADOW_RATE", "1"))
+_shadow_seq = itertools.count(1)  # clave de precompute cuando la llamada no tiene TX en el contexto
+
+# Tareas que pasan por brain.ask_routed (el nombre coincide con el OutputSchema cuando hay uno)
+DEFAULT_ROUTES: Dict[str, Dict[str, Any]] = {
+    "triage_urgency":    {"model": DEFAULT_MODEL, "temperature": 0},  # nodo 201
+    "triage_entry":      {"model": DEFAULT_MODEL, "temperature": 0},  # nodo 201 + primera pregunta del 203
+    "next_question":     {"model": DEFAULT_MODEL, "temperature": 0},  # nodo 203
+    "report":            {"model": DEFAULT_MODEL, "temperature": 0},  # nodo 202
+    "report_and_digest": {"model": DEFAULT_MODEL, "temperature": 0},  # nodo 202 (modo combinado)
+    "medical_digest":    {"model": DEFAULT_MODEL, "temperature": 0},
+    "report_cards":      {"model": DEFAULT_MODEL, "temperature": 0},  # /consulta
+    "compaction":        {"model": DEFAULT_MODEL, "temperature": 0},
+}
+
+
+@dataclass(frozen=True)
+class Route:
+    task: str
+    model: str
+    temperature: float = 0.0
+    shadow_model: Optional[str] = None
+
+
+def _env_routes() -> Dict[str, Any]:
+    raw = os.getenv("PX_MODEL_ROUTES")
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        op_log("llm_routing", "env_routes", "ERROR", error=str(e))
+        return {}
+
+
+def _event_routes(event_config) -> Dict[str, Any]:
+    data = getattr(event_config, "model_routing", None) if event_config is not None else None
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except Exception:
+            return {}
+    return data if isinstance(data, dict) else {}
+
+
+def resolve(task: str, event_config=None) -> Route:
+    """Ruta efectiva de la tarea para el evento (si se pasa su EventConfig)."""
+    route = dict(DEFAULT_ROUTES.get(task) or {"model": DEFAULT_MODEL, "temperature": 0})
+    shadow = None
+    for layer in (_event_routes(event_config), _env_routes()):
+        override = layer.get(task)
+        if isinstance(override, str):
+            override = {"model": override}
+        if isinstance(override, dict):
+            route.update({k: v for k, v in override.items() if k in ("model", "temperature") and v is not None})
+        shadows = layer.get("shadow")
+        if isinstance(shadows, dict) and task in shadows:
+            shadow = shadows[task] or None  # "" / null en el env apaga la sombra del evento
+    if shadow == route["model"]:
+        shadow = None
+    return Route(task=task, model=route["model"], temperature=float(route.get("temperature") or 0), shadow_model=shadow)
+
+
+def _diff(primary: Any, candidate: Any) -> List[str]:
+    if isinstance(primary, dict) and isinstance(candidate, dict):
+        return sorted(k for k in set(primary) | set(candidate) if primary.get(k) != candidate.get(k))
+    return [] if primary == candidate else ["text"]
+
+
+def _run_shadow(route: Route, messages, schema, primary_value, primary_ms: int, timeout) -> None:
+    import app.services.brain as brain
+
+    t0 = time.perf_counter()
+    try:
+        if schema is not None:
+            value = brain.ask_openai_json(messages, schema, temperature=route.temperature,
+                                          model=route.shadow_model, timeout=timeout)
+        else:
+            value = brain.ask_openai(messages, temperature=route.temperature, model=route.shadow_model, timeout=timeout)
+    except Exception as e:
+        op_log("llm_routing", "shadow", "ERROR", t0=t0, error=str(e),
+               extra={"task": route.task, "primary_model": route.model, "shadow_model": route.shadow_model})
+        return
+
+    diff = _diff(primary_value, value)
+    keys = getattr(schema, "compare_keys", ()) if schema is not None else ()
+    extra = {
+        "task": route.task,
+        "primary_model": route.model,
+        "shadow_model": route.shadow_model,
+        "primary_ms": primary_ms,
+        "shadow_ms": int((time.perf_counter() - t0) * 1000),
+    }
+    if schema is not None:
+        extra.update({"agree": not [k for k in diff if not keys or k in keys], "diff": diff})
+    else:
+        # texto libre: no hay "acuerdo" exacto, solo tamaño y latencia
+        extra.update({"primary_len": len(primary_value or ""), "shadow_len": len(value or "")})
+    op_log("llm_routing", "shadow", "OK", extra=extra)
+
+
+def schedule_shadow(route: Route, messages, schema, primary_value, primary_ms: int, timeout=None) -> None:
+    """Corre el candidato fuera del turno (precompute, una sombra por tarea y TX a la vez)."""
+    if not route.shadow_model or random.random() >= SHADOW_RATE:
+        return
+    from app.services import precompute
+    try:
+        key = int(CTX_TX_ID.get() or 0)
+    except (TypeError, ValueError):
+        key = 0
+    precompute.submit(f"shadow_{route.task}", key or -next(_shadow_seq), _run_shadow,
+                      route, list(messages) if isinstance(messages, list) else messages,
+                      schema, primary_value, primary_ms, timeout)
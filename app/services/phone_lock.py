@@ -0,0 +1,120 @@
+# app/services/phone_lock.py
+"""
+Un turno del engine a la vez por teléfono (numero_limpio).
+
+Sin esto dos entregas del mismo paciente (reintento, ráfaga, dos workers) leen la misma TX abierta,
+avanzan question_cursor las dos y la última en escribir transactions.conversation gana.
+message_p.handle_incoming_message corre adentro de hold(numero_limpio); teléfonos distintos no se esperan.
+
+PX_PHONE_LOCK:
+  "local" (default) -> lock en memoria por teléfono (alcanza con un solo proceso: flask run / worker thread)
+  "lease"           -> además un lease en la tabla phone_leases (varios containers / workers);
+                       si la tabla no está, queda solo el lock en memoria
+  "off"             -> sin lock (como antes)
+Si no se consigue el lock en PX_PHONE_LOCK_WAIT_S el turno corre igual (fail-open: mejor una carrera
+que perder el mensaje) y queda logueado como timeout.
+
+Métricas: op_log("lock", "phone") con wait_ms, mode y result = acquired | timeout | no_db;
+op_log("lock", "phone_release") con held_ms.
+"""
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from app.obs.logs import op_log
+
+PX_PHONE_LOCK = os.getenv("PX_PHONE_LOCK", "local").lower()
+PX_PHONE_LOCK_WAIT_S = float(os.getenv("PX_PHONE_LOCK_WAIT_S", "25"))    # < timeout del request / worker
+PX_PHONE_LEASE_TTL_S = float(os.getenv("PX_PHONE_LEASE_TTL_S", "120"))   # > duración máx. de un turno
+
+_missing = False  # por proceso: si phone_leases no está, no se reintenta en cada turno
+_locks: Dict[str, List] = {}  # phone -> [Lock, cuántos lo usan] (se borra cuando nadie lo usa)
+_locks_lock = threading.Lock()
+
+
+def _ref(phone: str) -> threading.Lock:
+    with _locks_lock:
+        entry = _locks.setdefault(phone, [threading.Lock(), 0])
+        entry[1] += 1
+        return entry[0]
+
+
+def _unref(phone: str) -> None:
+    with _locks_lock:
+        entry = _locks.get(phone)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            _locks.pop(phone, None)
+
+
+def _acquire_lease(phone: str, deadline: float) -> Tuple[Optional[str], str]:
+    """(holder, result). holder None = sin lease (timeout o sin tabla)."""
+    global _missing
+    from app.Model.phone_leases import PhoneLeases
+    model = PhoneLeases()
+    holder = uuid.uuid4().hex
+    delay = 0.05
+    while True:
+        try:
+            if model.try_acquire(phone, holder, PX_PHONE_LEASE_TTL_S):
+                return holder, "acquired"
+        except Exception as e:
+            if "PGRST205" in str(e) or "42P01" in str(e):
+                _missing = True
+            op_log("supabase", "phone_lease_acquire", "ERROR", error=str(e), to_phone=phone)
+            return None, "no_db"
+        if time.monotonic() >= deadline:
+            return None, "timeout"
+        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        delay = min(delay * 2, 0.5)
+
+
+def _release_lease(phone: str, holder: str) -> None:
+    from app.Model.phone_leases import PhoneLeases
+    try:
+        PhoneLeases().release(phone, holder)
+    except Exception as e:
+        op_log("supabase", "phone_lease_release", "ERROR", error=str(e), to_phone=phone)
+
+
+@contextmanager
+def hold(phone: Optional[str]):
+    """
+    with hold(numero_limpio):
+        ... turno ...
+    Serializa los turnos del mismo teléfono (en el proceso y, con lease, entre instancias).
+    """
+    if PX_PHONE_LOCK == "off" or not phone:
+        yield
+        return
+
+    t0 = time.perf_counter()
+    deadline = time.monotonic() + PX_PHONE_LOCK_WAIT_S
+    lock = _ref(phone)
+    got_local = lock.acquire(timeout=PX_PHONE_LOCK_WAIT_S)
+    result = "acquired" if got_local else "timeout"
+    mode = "local"
+    holder = None
+    if got_local and PX_PHONE_LOCK == "lease" and not _missing:
+        mode = "lease"
+        holder, result = _acquire_lease(phone, deadline)
+    wait_ms = int((time.perf_counter() - t0) * 1000)
+    op_log("lock", "phone", "OK" if result != "timeout" else "ERROR", t0=t0, to_phone=phone,
+           extra={"mode": mode, "result": result, "wait_ms": wait_ms})
+
+    t_held = time.perf_counter()
+    try:
+        yield
+    finally:
+        if holder:
+            _release_lease(phone, holder)
+        if got_local:
+            lock.release()
+        _unref(phone)
+        op_log("lock", "phone_release", "OK", t0=t_held, to_phone=phone,
+               extra={"mode": mode, "held_ms": int((time.perf_counter() - t_held) * 1000)})
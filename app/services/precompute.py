@@ -0,0 +1,239 @@
+# app/services/precompute.py
+"""
+Precomputo en background de lo que el médico va a mirar, para que /consulta y el
+nodo 210 sean lecturas y no esperen al LLM:
+
+- digest médico (generar_medical_digest -> medical_digests): al terminar nodo_202.
+- reporte de /consulta (reporting.build_report_cards_cached -> report_cache): al cerrar la TX.
+  (no antes: el intercambio del nodo 210 cambia la conversación y el hash del reporte)
+
+Modo (PX_PRECOMPUTE):
+  "thread" (default) -> ThreadPoolExecutor del proceso (flask run / worker de larga vida)
+  "queue"            -> el trabajo viaja como mensaje {"provider": "precompute"} por la cola de
+                        inbound_queue (SQS en Lambda) y lo corre el worker; el webhook no espera nada.
+                        Si el trabajo no se puede serializar (ej: sombras de model_routing) o la cola
+                        falla, cae al thread pool (en la Lambda HTTP es best-effort: no se drena)
+  "inline" | "off"
+En Lambda el proceso se congela al devolver: solo wsgi.worker_handler llama a drain(); la Lambda
+HTTP no puede quedarse esperando (Twilio corta a los 15 s y Meta reintenta), por eso usa "queue".
+"""
+import importlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, Tuple
+
+from app.obs.logs import op_log
+
+PX_PRECOMPUTE = os.getenv("PX_PRECOMPUTE", "thread").lower()
+PX_PRECOMPUTE_WORKERS = int(os.getenv("PX_PRECOMPUTE_WORKERS", "2"))
+PX_PRECOMPUTE_DRAIN_S = float(os.getenv("PX_PRECOMPUTE_DRAIN_S", "20"))  # espera máx. en wsgi.worker_handler
+PX_PRECOMPUTE_WAIT_S = float(os.getenv("PX_PRECOMPUTE_WAIT_S", "15"))    # espera máx. del nodo 210 por el digest
+PX_PRECOMPUTE_POLL_S = float(os.getenv("PX_PRECOMPUTE_POLL_S", "1"))     # modo queue: cada cuánto mira medical_digests
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_lock = threading.Lock()
+_inflight: Dict[Tuple[str, int], Future] = {}  # (tipo, tx_id) -> trabajo en curso (sin duplicados)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PX_PRECOMPUTE_WORKERS, thread_name_prefix="px-precompute")
+    return _executor
+
+
+def _run(kind: str, tx_id: int, fn: Callable, *args) -> None:
+    t0 = time.perf_counter()
+    try:
+        fn(*args)
+        op_log("precompute", kind, "OK", t0=t0, extra={"tx_id": tx_id})
+    except Exception as e:
+        op_log("precompute", kind, "ERROR", t0=t0, error=str(e), extra={"tx_id": tx_id})
+
+
+def _enqueue(kind: str, tx_id: int, fn: Callable, args: tuple) -> bool:
+    """Manda el trabajo al worker (modo "queue"). False si no se puede serializar o encolar."""
+    from app.services import inbound_queue
+
+    if "<" in fn.__qualname__ or not fn.__module__.startswith("app."):
+        return False  # lambdas / funciones locales: no se pueden importar del otro lado
+    try:
+        args = json.loads(json.dumps(list(args)))
+    except (TypeError, ValueError):
+        return False
+    try:
+        inbound_queue.enqueue("precompute", {"kind": kind, "tx_id": tx_id,
+                                             "job": f"{fn.__module__}:{fn.__qualname__}", "args": args},
+                              record_event=False)
+    except Exception as e:
+        op_log("precompute", kind, "ERROR", error=str(e), extra={"tx_id": tx_id, "mode": "queue"})
+        return False
+    return True
+
+
+def run_queued(payload: Dict) -> None:
+    """Consumidor de los mensajes {"provider": "precompute"} (inbound_queue.consume)."""
+    module, _, name = (payload.get("job") or "").partition(":")
+    if not module.startswith("app.") or not name:
+        raise ValueError(f"trabajo de precompute inválido: {payload.get('job')!r}")
+    fn = getattr(importlib.import_module(module), name)
+    _run(payload.get("kind") or name, payload.get("tx_id"), fn, *(payload.get("args") or []))
+
+
+def submit(kind: str, tx_id: int, fn: Callable, *args) -> Optional[Future]:
+    """Corre fn(*args) fuera del turno (según PX_PRECOMPUTE); uno solo en curso por (kind, tx_id)."""
+    if PX_PRECOMPUTE == "off" or not tx_id:
+        return None
+    if PX_PRECOMPUTE == "inline":
+        _run(kind, tx_id, fn, *args)
+        return None
+    if PX_PRECOMPUTE == "queue" and _enqueue(kind, tx_id, fn, args):
+        return None
+
+    key = (kind, int(tx_id))
+    with _lock:
+        fut = _inflight.get(key)
+        if fut is not None and not fut.done():
+            return fut
+        fut = _get_executor().submit(_run, kind, tx_id, fn, *args)
+        _inflight[key] = fut
+
+    def _forget(done: Future, key=key):
+        with _lock:
+            if _inflight.get(key) is done:
+                _inflight.pop(key, None)
+
+    fut.add_done_callback(_forget)
+    return fut
+
+
+def wait_for(kind: str, tx_id: Optional[int], timeout: Optional[float] = None) -> None:
+    """Si hay un precomputo en curso para (kind, tx_id), lo espera (ej: nodo 210 antes de leer el digest)."""
+    if not tx_id:
+        return
+    with _lock:
+        fut = _inflight.get((kind, int(tx_id)))
+    if fut is not None:
+        wait([fut], timeout=timeout)
+
+
+def drain(timeout: Optional[float] = None) -> int:
+    """Espera lo pendiente (hasta timeout). Devuelve cuántos trabajos quedaron sin terminar."""
+    with _lock:
+        pending = [f for f in _inflight.values() if not f.done()]
+    if not pending:
+        return 0
+    _, not_done = wait(pending, timeout=PX_PRECOMPUTE_DRAIN_S if timeout is None else timeout)
+    return len(not_done)
+
+
+def _read_digest(tx_id: int) -> Optional[str]:
+    from app.Model.medical_digests import MedicalDigests
+    rows = MedicalDigests().get("tx_id", tx_id)
+    return (getattr(rows[0], "digest_text", None) or None) if rows else None
+
+
+def wait_for_digest(tx_id: int, timeout: Optional[float] = None) -> Optional[str]:
+    """
+    Digest persistido de la TX (nodo 210), esperando el precomputo del nodo 202 si está en curso:
+    - thread: el trabajo es de este proceso -> wait_for sobre su future
+    - queue: lo corre el worker SQS (acá no hay future) -> se consulta medical_digests cada
+      PX_PRECOMPUTE_POLL_S hasta timeout. None si no apareció: el 210 lo genera él mismo.
+    """
+    timeout = PX_PRECOMPUTE_WAIT_S if timeout is None else timeout
+    if PX_PRECOMPUTE != "queue":
+        wait_for("digest", tx_id, timeout=timeout)
+        return _read_digest(tx_id)
+
+    t0 = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    polls = 0
+    while True:
+        polls += 1
+        digest_text = _read_digest(tx_id)
+        remaining = deadline - time.monotonic()
+        if digest_text or remaining <= 0:
+            break
+        time.sleep(min(PX_PRECOMPUTE_POLL_S, remaining))
+    op_log("precompute", "digest_poll", "OK", t0=t0,
+           extra={"tx_id": tx_id, "found": bool(digest_text), "polls": polls})
+    return digest_text
+
+
+# ===== Trabajos =====
+
+def ensure_medical_digest(tx_id: int, contact_id: int, national_id: Optional[str],
+                          conversation_str: str, digest_instructions: Optional[str] = None,
+                          event_config=None) -> Optional[str]:
+    """
+    Digest persistido de la TX: lo lee si ya existe; si no, lo genera y lo guarda. Devuelve digest_text.
+    Sin lock entre el leer y el guardar: si el nodo 210 lo generó en paralelo, el upsert por tx_id
+    (add_row) deja una sola fila.
+    """
+    from app.Model.medical_digests import MedicalDigests
+    from app.flows import workflows_utils
+
+    existing = _read_digest(tx_id)
+    if existing:
+        return existing
+
+    digest_text, digest_json = workflows_utils.generar_medical_digest(
+        conversation_str or "[]",
+        national_id,
+        digest_instructions,
+        event_config=event_config,
+    )
+    MedicalDigests().add_row(
+        contact_id=contact_id or 0,
+        tx_id=tx_id,
+        digest_text=digest_text,
+        digest_json=json.dumps(digest_json, ensure_ascii=False),
+    )
+    return digest_text
+
+
+def precompute_report(tx_id: int) -> None:
+    """Reporte de /consulta sobre la conversación tal como la va a leer la vista (mismo hash)."""
+    import app.services.brain as brain
+    from app.Model.transactions import Transactions
+    from app.services import reporting
+
+    conversation_str = Transactions().get_conversation_by_id(tx_id)
+    if not conversation_str or conversation_str == "[]":
+        return
+    reporting.build_report_cards_cached(
+        tx_id=tx_id,
+        conversation_str=conversation_str,
+        prompt=reporting.report_prompt(),
+        brain=brain,
+    )
+
+
+def _digest_for_event(tx_id: int, contact_id: int, national_id: Optional[str],
+                      conversation_str: str, digest_instructions: Optional[str], event_id: Optional[int]) -> None:
+    """ensure_medical_digest desde la cola: el EventConfig viaja como event_id."""
+    event_config = None
+    if event_id is not None:
+        from app.Model.events import Events
+        event_config = Events().get_config(event_id)
+    ensure_medical_digest(tx_id, contact_id, national_id, conversation_str, digest_instructions, event_config)
+
+
+def schedule_digest(tx_id: int, contact_id: int, national_id: Optional[str],
+                    conversation_str: str, digest_instructions: Optional[str] = None,
+                    event_config=None) -> Optional[Future]:
+    if PX_PRECOMPUTE == "queue":
+        return submit("digest", tx_id, _digest_for_event, tx_id, contact_id, national_id,
+                      conversation_str, digest_instructions, getattr(event_config, "event_id", None))
+    return submit("digest", tx_id, ensure_medical_digest,
+                  tx_id, contact_id, national_id, conversation_str, digest_instructions, event_config)
+
+
+def schedule_report(tx_id: int) -> Optional[Future]:
+    return submit("report", tx_id, precompute_report, tx_id)
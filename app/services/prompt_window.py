@@ -0,0 +1,235 @@
+# app/services/prompt_window.py
+"""
+Ventana de conversación para los prompts: en vez de mandar el conversation_str entero
+(descripción del evento + resúmenes de adjuntos de varios KB + todas las preguntas),
+cada nodo manda lo relevante dentro de un presupuesto de tokens (tiktoken).
+
+Prioridad al recortar:
+  1) system del evento (solo si keep_system=True, ej. reporte del 202)
+  2) resumen clínico de la compactación (compaction.py) o, si no hay, el motivo de consulta
+     (último mensaje del paciente antes de la primera pregunta "1/N - ")
+  3) resúmenes de adjuntos ("[Adjunto ...]"), recortados a PX_PROMPT_ATTACHMENT_TOKENS c/u
+  4) los últimos pares pregunta/respuesta, hacia atrás y contiguos, hasta agotar el presupuesto
+     (un par entra entero o no entra: nunca una respuesta sin su pregunta)
+Cada hueco que queda lleva su nota OMITTED_NOTE con la cantidad de mensajes omitidos.
+
+Presupuestos por nodo: NODE_BUDGETS, override con PX_PROMPT_BUDGET_<NODO> (ej. PX_PROMPT_BUDGET_203=1500).
+PX_PROMPT_WINDOW=0 desactiva el recorte (se manda todo como antes).
+Si tiktoken no puede cargar el encoding (ej. sin red para bajarlo), se estima con ~4 caracteres por token.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.obs.logs import op_log
+
+PX_PROMPT_WINDOW = os.getenv("PX_PROMPT_WINDOW", "1") == "1"
+PX_PROMPT_MODEL = os.getenv("PX_PROMPT_MODEL", "gpt-4.1")
+ATTACHMENT_MAX_TOKENS = int(os.getenv("PX_PROMPT_ATTACHMENT_TOKENS", "300"))
+
+# Tokens de conversación (no cuenta las instrucciones propias del nodo)
+NODE_BUDGETS: Dict[Union[int, str], int] = {
+    201: 800,        # clasificación del motivo de consulta: alcanza con el último mensaje y el contexto cercano
+    203: 2000,       # próxima pregunta: motivo + adjuntos + últimas preguntas/respuestas
+    202: 6000,       # reporte final: casi todo el triage
+    "digest": 4000,  # digest médico: triage + reporte
+}
+
+ATTACHMENT_PREFIX = "[Adjunto "
+SUMMARY_PREFIX = "[Resumen clínico de la conversación previa]"
+QUESTION_RE = re.compile(r"^\d+/\d+ - ", re.MULTILINE)
+OMITTED_NOTE = "(se omitieron {n} mensajes anteriores de la conversación)"
+TRUNCATED_MARK = " …[recortado]"
+MESSAGE_OVERHEAD = 4  # tokens de "envoltorio" por mensaje (role, separadores)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    try:
+                        _encoding = tiktoken.encoding_for_model(PX_PROMPT_MODEL)
+                    except KeyError:
+                        _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    _encoding_failed = True
+                    op_log("prompt", "tiktoken_load", "ERROR", error=str(e), extra={"fallback": "chars/4"})
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _get_encoding()
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def message_tokens(msg: Dict[str, Any]) -> int:
+    content = msg.get("content")
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    return count_tokens(content) + MESSAGE_OVERHEAD
+
+
+def prefix_sha256(history: List[Dict[str, Any]], n: int) -> str:
+    """Hash de history[:n] (JSON canónico): lo guardan compaction y response_chain para detectar reescrituras."""
+    text = json.dumps(history[:n], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    enc = _get_encoding()
+    if enc is None:
+        return text[: max_tokens * 4].rstrip() + TRUNCATED_MARK
+    return enc.decode(enc.encode(text, disallowed_special=())[:max_tokens]).rstrip() + TRUNCATED_MARK
+
+
+def node_budget(node: Union[int, str]) -> Optional[int]:
+    env = os.getenv(f"PX_PROMPT_BUDGET_{node}".upper())
+    if env:
+        return int(env)
+    return NODE_BUDGETS.get(node)
+
+
+def _is_attachment(msg: Dict[str, Any]) -> bool:
+    return msg.get("role") == "user" and str(msg.get("content") or "").startswith(ATTACHMENT_PREFIX)
+
+
+def _is_summary(msg: Dict[str, Any]) -> bool:
+    return msg.get("role") == "system" and str(msg.get("content") or "").startswith(SUMMARY_PREFIX)
+
+
+def _chief_complaint_index(history: List[Dict[str, Any]]) -> Optional[int]:
+    """Último mensaje del paciente (no adjunto) antes de la primera pregunta numerada del triage."""
+    first_q = next(
+        (i for i, m in enumerate(history)
+         if m.get("role") == "assistant" and QUESTION_RE.search(str(m.get("content") or ""))),
+        len(history),
+    )
+    for i in range(first_q - 1, -1, -1):
+        if history[i].get("role") == "user" and not _is_attachment(history[i]):
+            return i
+    return None
+
+
+def build_window(history: List[Dict[str, Any]], budget: int,
+                 keep_system: bool = False) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Devuelve (mensajes, stats). Los mensajes salen en el orden original; en cada hueco de historia
+    cortada va una nota con cuántos mensajes faltan. stats: tokens_in, tokens_out, dropped
+    (dropped = lo que cuentan las notas; el system del evento sin keep_system no cuenta).
+    Sin keep_system, el system del evento (primer mensaje) no va nunca: el nodo trae sus propias instrucciones.
+    """
+    msgs = [m for m in history if isinstance(m, dict)]
+    costs = [message_tokens(m) for m in msgs]
+    tokens_in = sum(costs)
+    start = 1 if (not keep_system and msgs and msgs[0].get("role") == "system" and not _is_summary(msgs[0])) else 0
+
+    if budget is None or budget <= 0 or sum(costs[start:]) <= budget:
+        out = msgs[start:]
+        return out, {"tokens_in": tokens_in, "tokens_out": sum(costs[start:]), "dropped": 0}
+
+    picked: Dict[int, Dict[str, Any]] = {}
+    used = 0
+
+    def prepared(i: int) -> Tuple[Dict[str, Any], int]:
+        msg, cost = msgs[i], costs[i]
+        if _is_attachment(msg) and cost > ATTACHMENT_MAX_TOKENS + MESSAGE_OVERHEAD:
+            msg = {**msg, "content": truncate_tokens(msg["content"], ATTACHMENT_MAX_TOKENS)}
+            cost = message_tokens(msg)
+        return msg, cost
+
+    def take(*idxs: int) -> bool:
+        """Entran todos los mensajes (ej: pregunta + respuesta) o ninguno."""
+        nonlocal used
+        items = [(i, *prepared(i)) for i in idxs]
+        cost = sum(c for _, _, c in items)
+        if used + cost > budget:
+            return False
+        for i, msg, _ in items:
+            picked[i] = msg
+        used += cost
+        return True
+
+    # 1) system del evento
+    if keep_system and msgs and msgs[0].get("role") == "system":
+        take(0)
+    # 2) resumen de lo compactado (ya incluye el motivo de consulta) o motivo de consulta
+    summaries = [i for i in range(start, len(msgs)) if _is_summary(msgs[i])]
+    for i in summaries:
+        take(i)
+    cc = None if summaries else _chief_complaint_index(msgs)
+    if cc is not None:
+        take(cc)
+    # 3) adjuntos (los más nuevos primero)
+    for i in range(len(msgs) - 1, start - 1, -1):
+        if i not in picked and _is_attachment(msgs[i]):
+            take(i)
+    # 4) cola contigua de la conversación, de a pares (pregunta del asistente + respuesta del paciente)
+    i = len(msgs) - 1
+    while i >= start:
+        if i in picked:
+            i -= 1
+            continue
+        pair = (i - 1 >= start and i - 1 not in picked and msgs[i].get("role") == "user"
+                and msgs[i - 1].get("role") == "assistant")
+        unit = (i - 1, i) if pair else (i,)
+        if not take(*unit):
+            break
+        i = unit[0] - 1
+
+    out: List[Dict[str, Any]] = []
+    dropped = gap = 0
+    for i in range(start, len(msgs) + 1):
+        if i < len(msgs) and i not in picked:
+            gap += 1
+            continue
+        if gap:
+            out.append({"role": "system", "content": OMITTED_NOTE.format(n=gap)})
+            dropped += gap
+            gap = 0
+        if i < len(msgs):
+            out.append(picked[i])
+    tokens_out = sum(message_tokens(m) for m in out)
+    return out, {"tokens_in": tokens_in, "tokens_out": tokens_out, "dropped": dropped}
+
+
+def window_messages(history: List[Dict[str, Any]], node: Union[int, str],
+                    keep_system: bool = False) -> List[Dict[str, Any]]:
+    """Ventana de `history` con el presupuesto del nodo (sin recorte si PX_PROMPT_WINDOW=0)."""
+    if not PX_PROMPT_WINDOW:
+        return list(history)
+    budget = node_budget(node)
+    if not budget:
+        return list(history)
+    out, stats = build_window(history, budget, keep_system=keep_system)
+    if stats["dropped"] or stats["tokens_out"] < stats["tokens_in"]:
+        op_log("prompt", "window", "OK", extra={"node": node, "budget": budget, **stats})
+    return out
+
+
+def window_str(conversation_str: str, node: Union[int, str], keep_system: bool = False) -> str:
+    """Igual que window_messages pero para los prompts que embeben el conversation_str (JSON)."""
+    if not PX_PROMPT_WINDOW:
+        return conversation_str
+    try:
+        history = json.loads(conversation_str or "[]")
+    except Exception:
+        return conversation_str
+    if not isinstance(history, list):
+        return conversation_str
+    return json.dumps(window_messages(history, node, keep_system=keep_system), ensure_ascii=False)
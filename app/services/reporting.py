@@ -1,8 +1,16 @@
 import json
+import os
 import re
 import hashlib
+import threading
+import time
+from collections import OrderedDict
 from typing import Dict, List, Tuple, Optional, Any
 
+from app.Model.report_cache import ReportCache
+from app.services.llm_schemas import OutputSchema, object_schema, require_strings, string_fields
+from app.obs.logs import op_log
+
 # === Esquema para ordenar/rotular cards ===================================
 SCHEMA_ORDER: List[Tuple[str, str]] = [
     # Header (leído por la vista para edad y chip)
@@ -58,6 +66,15 @@ DEFAULTS = {
 }
 
 
+# Salida estructurada del reporte (brain.ask_openai_json): una string por card
+REPORT_KEYS = [key for key, _label in SCHEMA_ORDER if not key.startswith("__section_")]
+REPORT_CARDS_SCHEMA = OutputSchema(
+    name="report_cards",
+    schema=object_schema(string_fields(REPORT_KEYS)),
+    validate=lambda data: require_strings(data, REPORT_KEYS),
+)
+
+
 # === Parsing robusto del JSON del modelo ==================================
 def _strip_md_fences(t: str) -> str:
     """Quita ```json ... ``` si el modelo lo agrega por error."""
@@ -124,18 +141,113 @@ def cards_from_report(report, schema=SCHEMA_ORDER):
             cards.append({"type": "field", "key": key, "label": label, "value": report.get(key)})
     return cards
 
-def build_report_cards(conversation_history: List[Dict], brain, model: str = "gpt-4.1", temperature: float = 0.0):
+def build_report_cards(conversation_history: List[Dict], brain, model: Optional[str] = None,
+                       temperature: Optional[float] = None):
     """
-    - Llama al modelo y obtiene JSON.
+    - Llama al modelo y obtiene JSON (modelo de la ruta "report_cards" salvo que se pase uno).
     - Normaliza y arma cards.
     Devuelve: (report_dict_normalizado, cards)
     """
-    out = brain.ask_openai(conversation_history, temperature=temperature, model=model)
-    data = _extract_json(out)
+    if model is None:
+        data = brain.ask_routed("report_cards", conversation_history, REPORT_CARDS_SCHEMA)
+    else:
+        data = brain.ask_openai_json(conversation_history, REPORT_CARDS_SCHEMA,
+                                     temperature=temperature or 0.0, model=model)
     report = normalize_report_dict(data, use_defaults=True)
     cards = cards_from_report(report)
     return report, cards
 
+# === Cache del reporte de /consulta ========================================
+# Clave: (tx_id, sha256 de la conversación, versión del prompt). Si la conversación cambia, cambia la clave.
+REPORT_SCHEMA_VERSION = "v1"   # subir si cambia SCHEMA_ORDER / normalize_report_dict
+REPORT_LRU_SIZE = int(os.getenv("PX_REPORT_LRU_SIZE", "128"))
+REPORT_PROMPT_EVENT_ID = int(os.getenv("PX_REPORT_PROMPT_EVENT_ID", "1"))  # evento cuyo assistant es el prompt del reporte
+
+_REPORT_LRU: "OrderedDict[Tuple[int, str, str], Dict]" = OrderedDict()
+_REPORT_LRU_LOCK = threading.Lock()
+
+
+def conversation_sha256(conversation_str: str) -> str:
+    """
+    Hash de la conversación. Si es JSON se canonicaliza antes (el jsonb::text de la vista
+    y el json.dumps de Python formatean distinto la misma conversación).
+    """
+    text = conversation_str or ""
+    try:
+        text = json.dumps(json.loads(text), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    except Exception:
+        pass
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def report_prompt() -> str:
+    """Prompt del reporte de /consulta (assistant del evento PX_REPORT_PROMPT_EVENT_ID)."""
+    from app.Model.events import Events
+    return Events().get_assistant_by_event_id(REPORT_PROMPT_EVENT_ID)
+
+
+def report_prompt_version(prompt: str, model: str) -> str:
+    """Hash corto de todo lo que (además de la conversación) define el reporte."""
+    raw = f"{REPORT_SCHEMA_VERSION}\n{model}\n{prompt or ''}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _lru_get(key) -> Optional[Dict]:
+    with _REPORT_LRU_LOCK:
+        report = _REPORT_LRU.get(key)
+        if report is not None:
+            _REPORT_LRU.move_to_end(key)
+        return report
+
+
+def _lru_put(key, report: Dict) -> None:
+    with _REPORT_LRU_LOCK:
+        _REPORT_LRU[key] = report
+        _REPORT_LRU.move_to_end(key)
+        while len(_REPORT_LRU) > REPORT_LRU_SIZE:
+            _REPORT_LRU.popitem(last=False)
+
+
+def build_report_cards_cached(tx_id: int, conversation_str: str, prompt: str, brain,
+                              model: Optional[str] = None, temperature: Optional[float] = None):
+    """
+    Igual que build_report_cards pero cacheado por (tx_id, sha256(conversation_str), versión del prompt):
+      1) LRU en proceso  2) tabla report_cache en Supabase  3) LLM (y se guarda en ambos).
+    Un refresh o un segundo médico mirando la misma TX no vuelve a llamar al modelo.
+    Si la tabla no está o falla, sigue con el LRU solo.
+    Devuelve: (report_dict_normalizado, cards)
+    """
+    t0 = time.perf_counter()
+    from app.services import model_routing
+    used_model = model or model_routing.resolve("report_cards").model  # el modelo entra en la clave del cache
+    key = (int(tx_id), conversation_sha256(conversation_str), report_prompt_version(prompt, used_model))
+
+    source = "lru"
+    report = _lru_get(key)
+    if report is None:
+        source = "db"
+        try:
+            report = ReportCache().get_report(*key)
+        except Exception as e:
+            op_log("reporting", "report_cache_read", "ERROR", error=str(e), extra={"tx_id": key[0]})
+        if report is None:
+            source = "llm"
+            conversation_history = [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": conversation_str},
+            ]
+            report, _ = build_report_cards(conversation_history, brain, model=model, temperature=temperature)
+            try:
+                ReportCache().put(*key, report=report, model=used_model)
+            except Exception as e:
+                op_log("reporting", "report_cache_write", "ERROR", error=str(e), extra={"tx_id": key[0]})
+        _lru_put(key, report)
+
+    op_log("reporting", "report_cache", "OK", t0=t0, extra={"tx_id": key[0], "source": source})
+    report = dict(report)
+    return report, cards_from_report(report)
+
+
 def build_report_cards_from_json_text(json_text: str):
     """
     Usa un JSON (string) ya dado: lo normaliza y arma cards.
@@ -0,0 +1,135 @@
+# app/services/response_chain.py
+"""
+Estado de la conversación del lado de OpenAI (Responses API, previous_response_id) para el nodo 203.
+
+Con PX_RESPONSE_CHAIN=1 cada llamada de Sherlock guarda (response_id, covered_until) por TX
+(tabla response_chains). El turno siguiente manda solo history[covered_until:] (la última pregunta
+y la respuesta del paciente) + la instrucción de la tarea, encadenado con previous_response_id;
+la instrucción va en `instructions`, que la API no arrastra entre respuestas encadenadas.
+
+Se vuelve al historial completo (y arranca una cadena nueva) cuando:
+  - la TX no tiene cadena o la tabla no está
+  - el historial se reescribió (message_p._reescribir_historial): el sha256 de history[:covered_until]
+    no es el que se guardó con la respuesta (covered_sha256), aunque el historial nuevo sea más largo
+  - OpenAI ya no tiene la respuesta (error previous_response_not_found) -> se reintenta en el mismo turno;
+    cualquier otro error (ej. un 404 por modelo mal ruteado) se propaga
+Métrica: op_log("openai", "response_chain") con mode = chained | full | expired.
+
+Ojo: encadenar requiere store=True (OpenAI guarda las respuestas de la cadena).
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from app.obs.logs import op_log
+from app.services import prompt_window
+
+PX_RESPONSE_CHAIN = os.getenv("PX_RESPONSE_CHAIN", "0") == "1"
+RESPONSE_CHAIN_LRU_SIZE = int(os.getenv("PX_RESPONSE_CHAIN_LRU_SIZE", "256"))
+
+_missing = False  # por proceso: si la tabla no está instalada no se reintenta en cada turno
+# tx_id -> (response_id, covered_until, covered_sha256) (write-through, LRU)
+_cache: "OrderedDict[int, Tuple[str, int, str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return PX_RESPONSE_CHAIN and not _missing
+
+
+def _table_missing(e: Exception) -> bool:
+    return "PGRST205" in str(e) or "42P01" in str(e)
+
+
+def _cache_get(tx_id: int) -> Optional[Tuple[str, int, str]]:
+    with _cache_lock:
+        cached = _cache.get(tx_id)
+        if cached is not None:
+            _cache.move_to_end(tx_id)
+        return cached
+
+
+def _cache_put(tx_id: int, value: Tuple[str, int, str]) -> None:
+    with _cache_lock:
+        _cache[tx_id] = value
+        _cache.move_to_end(tx_id)
+        while len(_cache) > RESPONSE_CHAIN_LRU_SIZE:
+            _cache.popitem(last=False)
+
+
+def load(tx_id: int) -> Optional[Tuple[str, int, str]]:
+    """(response_id, covered_until, covered_sha256) de la TX o None."""
+    global _missing
+    cached = _cache_get(tx_id)
+    if cached is not None:
+        return cached
+    from app.Model.response_chains import ResponseChains
+    try:
+        row = ResponseChains().get_for_tx(tx_id)
+    except Exception as e:
+        if _table_missing(e):
+            _missing = True
+        op_log("supabase", "response_chain_read", "ERROR", error=str(e), extra={"tx_id": tx_id})
+        return None
+    if row is None or not row.response_id:
+        return None
+    loaded = (row.response_id, int(row.covered_until or 0), getattr(row, "covered_sha256", None) or "")
+    _cache_put(tx_id, loaded)
+    return loaded
+
+
+def save(tx_id: int, response_id: str, history) -> None:
+    """Cadena de la TX: la respuesta ya vio todo `history`."""
+    global _missing
+    covered_until = len(history)
+    sha = prompt_window.prefix_sha256(history, covered_until)
+    _cache_put(tx_id, (response_id, covered_until, sha))
+    from app.Model.response_chains import ResponseChains
+    try:
+        ResponseChains().save(tx_id, response_id, covered_until, sha)
+    except Exception as e:
+        if _table_missing(e):
+            _missing = True
+        op_log("supabase", "response_chain_write", "ERROR", error=str(e), extra={"tx_id": tx_id})
+
+
+def forget(tx_id: int) -> None:
+    """Descarta la cadena en memoria (la fila se pisa con la próxima respuesta)."""
+    with _cache_lock:
+        _cache.pop(tx_id, None)
+
+
+def is_expired_error(e: Exception) -> bool:
+    """
+    La respuesta previa ya no existe del lado de OpenAI: solo el error que nombra a
+    previous_response_id (code previous_response_not_found / param previous_response_id).
+    Otros 404 (modelo inexistente, etc.) no son una cadena vencida.
+    """
+    cause = e.__cause__ or e
+    code = getattr(cause, "code", None)
+    param = getattr(cause, "param", None)
+    body = getattr(cause, "body", None)
+    if isinstance(body, dict):
+        err = body.get("error") if isinstance(body.get("error"), dict) else body
+        code = code or err.get("code")
+        param = param or err.get("param")
+    return code == "previous_response_not_found" or param == "previous_response_id"
+
+
+def chained_input(tx_id: Optional[int], history) -> Tuple[Optional[str], Any]:
+    """
+    (previous_response_id, mensajes nuevos) si se puede encadenar; (None, None) si hay que mandar todo.
+    """
+    if not enabled() or not tx_id:
+        return None, None
+    state = load(tx_id)
+    if state is None:
+        return None, None
+    response_id, covered, sha = state
+    if covered <= 0 or covered >= len(history):
+        return None, None  # reescritura del historial o nada nuevo desde la última llamada
+    if not sha or prompt_window.prefix_sha256(history, covered) != sha:
+        op_log("openai", "response_chain_stale", "OK", extra={"tx_id": tx_id, "covered_until": covered})
+        return None, None  # el historial que vio la respuesta ya no es este (reescritura / fila sin hash)
+    return response_id, history[covered:]
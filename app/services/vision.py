@@ -8,11 +8,10 @@ from dotenv import load_dotenv
 from flask import Flask, request
 from twilio.twiml.messaging_response import MessagingResponse
 import app.services.twilio_service as twilio
-from openai import OpenAI
+from app.services.llm_client import get_llm_client
 
-# Cargar variables de entorno
+# Cargar variables de entorno (el cliente OpenAI es el compartido de llm_client)
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # Capturar warnings silenciosos de librerías como pdfplumber
 warnings.filterwarnings("always")
@@ -39,7 +38,7 @@ def describe_image(image_path):
     base64_image = encode_image(image_path)
 
     try:
-        response = client.responses.create(
+        response = get_llm_client().responses.create(
             model="gpt-4o",
             input=[
                 {
@@ -71,9 +70,6 @@ def describe_image(image_path):
         return f"❌ Error procesando imagen: {str(e)}"
 
 
-import os
-from openai import OpenAI
-
 def resumir_texto_largo(texto_original):
     """
     Usa OpenAI GPT (Responses API) para resumir un texto largo en ~1000 caracteres.
@@ -88,13 +84,8 @@ def resumir_texto_largo(texto_original):
     if not texto_original or texto_original.strip() == "":
         return "❌ No se encontró texto para resumir."
 
-    # Obtener la clave de API desde la variable de entorno
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("API key no encontrada. Configura la variable de entorno OPENAI_API_KEY.")
-
-    # Inicializar el cliente de OpenAI
-    client = OpenAI(api_key=api_key)
+    # Cliente compartido del proceso (reutiliza el pool de conexiones entre llamadas)
+    client = get_llm_client()
 
     try:
         # Construir el prompt como un único string, igual que antes
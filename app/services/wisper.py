@@ -7,10 +7,9 @@ from dotenv import load_dotenv
 from flask import Flask, request
 from twilio.twiml.messaging_response import MessagingResponse
 import app.services.twilio_service as twilio
-from openai import OpenAI
+from app.services.llm_client import get_llm_client
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 warnings.filterwarnings("always")
 logging.captureWarnings(True)
@@ -64,7 +63,7 @@ def transcribir_audio_cloud(ruta_audio: str) -> str:
     with open(ruta_audio, "rb") as audio_file:
         # Llamada a la API de transcripción SIN stream y con response_format="text"
         # Dado response_format="text", la variable 'response' será directamente un string
-        response = client.audio.transcriptions.create(
+        response = get_llm_client().audio.transcriptions.create(
             file=audio_file,
             model="whisper-1",
             response_format="text"
@@ -0,0 +1,82 @@
+# scripts/bench_llm_client.py
+"""
+Benchmark: las llamadas al LLM de un turno de triage contra un endpoint OpenAI fake local.
+
+  before -> OpenAI(api_key=...) nuevo en cada llamada (pool descartado: handshake por llamada)
+  after  -> app.services.llm_client.get_llm_client() (cliente y pool compartidos por el proceso)
+
+Uso:
+    python scripts/bench_llm_client.py --turns 30 --calls-per-turn 3 --handshake-ms 60 --rtt-ms 10
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from scripts.stub_openai import start_stub  # noqa: E402
+from scripts.stub_postgrest import percentile  # noqa: E402
+
+MESSAGES = [
+    {"role": "system", "content": "Sos un asistente de guardia."},
+    {"role": "user", "content": "me duele la panza desde ayer"},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--calls-per-turn", type=int, default=3, help="llamadas al LLM por turno (2-4 en triage)")
+    parser.add_argument("--handshake-ms", type=float, default=60.0, help="costo simulado de conexión TLS nueva")
+    parser.add_argument("--rtt-ms", type=float, default=10.0, help="latencia simulada por request")
+    args = parser.parse_args()
+
+    server, base_url = start_stub(handshake_ms=args.handshake_ms, rtt_ms=args.rtt_ms)
+    counters = server.RequestHandlerClass.counters
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+    from openai import OpenAI
+    from app.services.llm_client import get_llm_client, reset_llm_client
+    import app.services.brain as brain
+
+    def before():
+        # Lo que hacía ask_openai: un cliente nuevo por llamada
+        client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        try:
+            return client.responses.create(model="gpt-4.1", input=MESSAGES, temperature=0).output_text
+        finally:
+            client.close()
+
+    def after():
+        return brain.ask_openai(MESSAGES)
+
+    def run(label, fn):
+        samples = []
+        counters["connections"] = counters["requests"] = 0
+        for _ in range(args.turns):
+            t0 = time.perf_counter()
+            for _ in range(args.calls_per_turn):
+                assert fn() == "ok"
+            samples.append((time.perf_counter() - t0) * 1000.0)
+        print(f"{label:<7} turns={args.turns:<4} llm_calls/turn={args.calls_per_turn:<3} "
+              f"conns={counters['connections']:<5} p50={percentile(samples, 50):8.1f}ms  "
+              f"p95={percentile(samples, 95):8.1f}ms")
+        return samples
+
+    try:
+        reset_llm_client()
+        get_llm_client()
+        b = run("before", before)
+        a = run("after", after)
+        print(f"speedup p50: x{percentile(b, 50) / percentile(a, 50):.2f}")
+    finally:
+        reset_llm_client()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
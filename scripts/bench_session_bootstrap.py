@@ -0,0 +1,112 @@
+# scripts/bench_session_bootstrap.py
+"""
+Benchmark: arranque de sesión de un turno (antes de cualquier lógica de negocio)
+contra un PostgREST stub local.
+
+  before -> camino REST: contacto, config del evento, última TX, TX abierta, último msg_key
+  after  -> SessionLoader: 1 RPC px_session_bootstrap (app/Model/sql/px_session_bootstrap.sql)
+
+Ambos caminos ejecutan las funciones reales de app/message_p.py (con la session keep-alive).
+
+Uso:
+    python scripts/bench_session_bootstrap.py --turns 50 --rtt-ms 20
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from scripts.stub_postgrest import ROWS, RPC_HANDLERS, start_stub, percentile  # noqa: E402
+
+PHONE = ROWS["contacts"][0]["phone"]
+
+
+def _bootstrap_rpc(payload):
+    """Equivalente en el stub de public.px_session_bootstrap(p_phone)."""
+    phone = payload.get("p_phone")
+    contact = next((c for c in ROWS["contacts"] if c["phone"] == phone), None)
+    if contact is None:
+        return {"contact": None}
+    event_id = contact.get("event_id") or 1
+    txs = [t for t in ROWS["transactions"] if t["phone"] == phone]
+    txs.sort(key=lambda t: (t["timestamp"], t["id"]), reverse=True)
+    abiertas = [t for t in txs if t["contact_id"] == contact["contact_id"] and t["name"] == "Abierta"]
+    msgs = [m for m in ROWS["messages"] if m["phone"] == phone and m["event_id"] == event_id]
+    last_tx = txs[0] if txs else None
+    return {
+        "contact": contact,
+        "event": next((e for e in ROWS["events"] if e["event_id"] == event_id), None),
+        "last_tx": {k: last_tx[k] for k in ("id", "name", "timestamp", "event_id")} if last_tx else None,
+        "open_tx": abiertas[0] if abiertas else None,
+        "last_msg_key": max(msgs, key=lambda m: m["message_id"])["msg_key"] if msgs else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--handshake-ms", type=float, default=40.0, help="costo simulado de conexión nueva")
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="latencia simulada por request (Lambda -> Supabase)")
+    args = parser.parse_args()
+
+    RPC_HANDLERS["px_session_bootstrap"] = _bootstrap_rpc
+    server, base_url = start_stub(handshake_ms=args.handshake_ms, rtt_ms=args.rtt_ms)
+    counters = server.RequestHandlerClass.counters
+
+    # Config mínima para importar el engine contra el stub (no se envía nada a proveedores)
+    os.environ["SUPABASE_URL"] = base_url
+    os.environ.setdefault("SUPABASE_API_KEY", "bench")
+    for key, dummy in (("TWILIO_ACCOUNT_SID", "ACbench"), ("TWILIO_AUTH_TOKEN", "bench"),
+                       ("TWILIO_WHATSAPP_NUMBER", "+10000000000"), ("OPENAI_API_KEY", "sk-bench")):
+        os.environ.setdefault(key, dummy)
+
+    import app.message_p as engine
+    from app.Model.events import Events, invalidate_event_config
+    from app.Model.messages import Messages
+    from app.Model.transactions import Transactions
+
+    def before():
+        # El camino REST de siempre, con el cache de eventos frío (peor caso: Lambda recién levantada)
+        invalidate_event_config()
+        contacto, event_id = engine.obtener_o_crear_contacto(PHONE)
+        _, _, nodo_inicio, ttl_min, _ = engine._build_session_context(Events(), event_id)
+        engine.message1(Transactions(), PHONE, ttl_min)
+        Transactions().get_open_row(contacto.contact_id, include_conversation=True)
+        Messages().get_latest_by_phone_and_event_id(PHONE, event_id)
+
+    def after():
+        invalidate_event_config()
+        snapshot = engine.SessionLoader().load(PHONE)
+        assert snapshot is not None, "la RPC del stub no respondió"
+        _, _, nodo_inicio, ttl_min, _ = engine._build_session_context(Events(), snapshot.event_id)
+        engine.message1(Transactions(), PHONE, ttl_min, snapshot=snapshot)
+
+    def run(label, fn):
+        samples = []
+        counters["requests"] = 0
+        for _ in range(args.turns):
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # op_log imprime JSON por operación
+                fn()
+            samples.append((time.perf_counter() - t0) * 1000.0)
+        print(f"{label:<7} turns={args.turns:<4} requests/turn={counters['requests'] / args.turns:<5.1f} "
+              f"p50={percentile(samples, 50):8.1f}ms  p95={percentile(samples, 95):8.1f}ms")
+        return samples
+
+    try:
+        run("warmup", after)  # abre la conexión keep-alive para que ambos caminos la reutilicen
+        b = run("before", before)
+        a = run("after", after)
+        print(f"speedup p50: x{percentile(b, 50) / percentile(a, 50):.2f}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# scripts/bench_supabase_session.py
+"""
+Benchmark: un turno de WhatsApp grabado (todas las llamadas REST a Supabase, en orden)
+reproducido contra un PostgREST stub local.
+
+  before -> requests.<método>() suelto (una conexión nueva por llamada, como antes)
+  after  -> app.Model.http_session.get_session() (pool keep-alive compartido)
+
+Uso:
+    python scripts/bench_supabase_session.py --turns 50 --handshake-ms 40 --rtt-ms 5
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+import requests  # noqa: E402
+
+from scripts.stub_postgrest import start_stub, percentile  # noqa: E402
+
+PHONE = "5491100000000"
+
+# Turno grabado (nodo 203, paciente recurrente): método, path+query, body
+RECORDED_TURN = [
+    ("GET",   f"/rest/v1/contacts?phone=eq.{PHONE}", None),
+    ("GET",   "/rest/v1/events?event_id=eq.1", None),                      # description
+    ("GET",   "/rest/v1/events?event_id=eq.1", None),                      # nodo_inicio
+    ("GET",   "/rest/v1/events?event_id=eq.1", None),                      # tiempo_sesion
+    ("GET",   f"/rest/v1/transactions?phone=eq.{PHONE}&order=timestamp.asc,id.asc", None),
+    ("GET",   "/rest/v1/transactions?contact_id=eq.1&order=timestamp", None),
+    ("GET",   f"/rest/v1/messages?phone=eq.{PHONE}", None),
+    ("POST",  "/rest/v1/messages", {"msg_key": 203, "text": "me duele la panza", "phone": PHONE, "event_id": 1}),
+    ("GET",   f"/rest/v1/contacts?phone=eq.{PHONE}", None),
+    ("GET",   f"/rest/v1/contacts?phone=eq.{PHONE}", None),
+    ("GET",   "/rest/v1/transactions?contact_id=eq.1&order=timestamp", None),
+    ("GET",   "/rest/v1/events?event_id=eq.1", None),                      # cant_preguntas
+    ("GET",   "/rest/v1/transactions?contact_id=eq.1&order=timestamp", None),
+    ("PATCH", "/rest/v1/transactions?id=eq.10", {"name": "Abierta"}),
+    ("PATCH", "/rest/v1/transactions?id=eq.10", {"question_cursor": 2}),
+    ("PATCH", "/rest/v1/transactions?id=eq.10", {"conversation": "[]", "name": "Abierta"}),
+    ("POST",  "/rest/v1/messages", {"msg_key": 203, "text": "2/5 - ¿Desde cuándo?", "phone": PHONE, "event_id": 1}),
+]
+
+HEADERS = {
+    "apikey": "bench",
+    "Authorization": "Bearer bench",
+    "Content-Type": "application/json",
+    "Prefer": "return=representation",
+}
+
+
+def replay_turn(base_url: str, send) -> float:
+    t0 = time.perf_counter()
+    for method, path, body in RECORDED_TURN:
+        r = send(method, base_url + path, headers=HEADERS, json=body)
+        r.raise_for_status()
+        r.json()
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def run(label: str, base_url: str, send, turns: int, counters: dict):
+    counters["connections"] = 0
+    counters["requests"] = 0
+    samples = [replay_turn(base_url, send) for _ in range(turns)]
+    print(
+        f"{label:<7} turns={turns:<4} calls/turn={len(RECORDED_TURN):<3} "
+        f"p50={percentile(samples, 50):8.1f}ms  p95={percentile(samples, 95):8.1f}ms  "
+        f"conexiones_abiertas={counters['connections']}"
+    )
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--handshake-ms", type=float, default=40.0, help="costo simulado de conexión nueva")
+    parser.add_argument("--rtt-ms", type=float, default=5.0, help="latencia simulada por request")
+    args = parser.parse_args()
+
+    server, base_url = start_stub(handshake_ms=args.handshake_ms, rtt_ms=args.rtt_ms)
+    counters = server.RequestHandlerClass.counters
+
+    os.environ.setdefault("SUPABASE_URL", base_url)
+    from app.Model.http_session import get_session, reset_session
+
+    try:
+        before = run("before", base_url, requests.request, args.turns, counters)
+        reset_session()
+        session = get_session()
+        after = run("after", base_url, session.request, args.turns, counters)
+        p50_b, p50_a = percentile(before, 50), percentile(after, 50)
+        print(f"speedup p50: x{p50_b / p50_a:.2f}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
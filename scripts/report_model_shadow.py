@@ -0,0 +1,70 @@
+# scripts/report_model_shadow.py
+"""
+Reporte del modo sombra de model_routing: acuerdo y latencia del candidato vs. el modelo actual,
+por tarea, a partir de los OP_LOG "llm_routing/shadow" (export de CloudWatch o logs locales).
+
+  agree   -> % de llamadas donde el candidato coincide en las claves del schema (compare_keys)
+  p50/p95 -> latencia en ms del modelo actual (primary) y del candidato (shadow)
+
+Las tareas sin schema (texto libre) no tienen acuerdo: solo latencias.
+
+Uso:
+    python scripts/report_model_shadow.py logs.jsonl [otros.jsonl ...]
+    aws logs filter-log-events ... | jq -c '.events[].message | fromjson?' | python scripts/report_model_shadow.py
+"""
+import json
+import sys
+from collections import defaultdict
+
+
+def _records(paths):
+    streams = [open(p, encoding="utf-8") for p in paths] if paths else [sys.stdin]
+    for stream in streams:
+        for line in stream:
+            line = line.strip()
+            start = line.find("{")
+            if start == -1:
+                continue
+            try:
+                rec = json.loads(line[start:])
+            except Exception:
+                continue
+            if rec.get("provider") == "llm_routing" and rec.get("operation") == "shadow":
+                yield rec
+
+
+def _pct(values, q):
+    if not values:
+        return "-"
+    values = sorted(values)
+    return str(values[min(len(values) - 1, int(q * len(values)))])
+
+
+def main():
+    groups = defaultdict(lambda: {"n": 0, "errors": 0, "agree": [], "primary": [], "shadow": []})
+    for rec in _records(sys.argv[1:]):
+        g = groups[(rec.get("task"), rec.get("primary_model"), rec.get("shadow_model"))]
+        g["n"] += 1
+        if rec.get("status") != "OK":
+            g["errors"] += 1
+            continue
+        if "agree" in rec:
+            g["agree"].append(bool(rec["agree"]))
+        for side in ("primary", "shadow"):
+            if isinstance(rec.get(f"{side}_ms"), int):
+                g[side].append(rec[f"{side}_ms"])
+
+    if not groups:
+        print("sin registros llm_routing/shadow")
+        return
+    print(f"{'task':<20}{'primary':<16}{'shadow':<16}{'calls':>7}{'errors':>8}{'agree':>9}"
+          f"{'p50 prim':>10}{'p95 prim':>10}{'p50 shad':>10}{'p95 shad':>10}")
+    for (task, primary, shadow), g in sorted(groups.items(), key=lambda kv: tuple(map(str, kv[0]))):
+        agree = f"{sum(g['agree']) / len(g['agree']) * 100:.1f}%" if g["agree"] else "-"
+        print(f"{str(task):<20}{str(primary):<16}{str(shadow):<16}{g['n']:>7}{g['errors']:>8}{agree:>9}"
+              f"{_pct(g['primary'], .5):>10}{_pct(g['primary'], .95):>10}"
+              f"{_pct(g['shadow'], .5):>10}{_pct(g['shadow'], .95):>10}")
+
+
+if __name__ == "__main__":
+    main()
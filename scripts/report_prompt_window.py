@@ -0,0 +1,148 @@
+# scripts/report_prompt_window.py
+"""
+Reporte: tokens de conversación que manda cada nodo con el conversation_str entero (before)
+vs. la ventana de app/services/prompt_window.py con los presupuestos actuales (after).
+
+Simula las llamadas de un triage sobre conversaciones grabadas:
+  201    -> una vez, con la conversación hasta el motivo de consulta
+  203    -> una por cada respuesta del paciente después de la primera pregunta "N/M - "
+  202    -> una vez, sobre el triage completo (con el system del evento)
+  digest -> una vez, sobre la conversación completa
+
+Fuentes (se pueden combinar):
+  --file conversaciones.jsonl   una conversación por línea: lista [{role, content}] u objeto con "conversation"
+  --from-db N                   las últimas N transacciones de Supabase (blob + conversation_turns)
+  --demo                        una conversación sintética (adjunto largo + 8 preguntas)
+
+Uso:
+    python scripts/report_prompt_window.py --from-db 200
+    PX_PROMPT_BUDGET_203=1200 python scripts/report_prompt_window.py --file convs.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from app.services import prompt_window as pw  # noqa: E402
+
+NODES = (201, 203, 202, "digest")
+
+
+def _as_history(obj: Any) -> List[Dict[str, Any]]:
+    if isinstance(obj, dict):
+        obj = obj.get("conversation")
+    if isinstance(obj, str):
+        try:
+            obj = json.loads(obj)
+        except Exception:
+            return []
+    return [m for m in obj if isinstance(m, dict)] if isinstance(obj, list) else []
+
+
+def _from_file(path: str) -> Iterable[List[Dict[str, Any]]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield _as_history(json.loads(line))
+
+
+def _from_db(limit: int) -> Iterable[List[Dict[str, Any]]]:
+    from app.Model.transactions import Transactions
+    tx = Transactions()
+    rows = tx.query().select("id", "conversation").order("id", desc=True).limit(limit).all()
+    for row in rows:
+        yield tx.load_conversation(row)
+
+
+def _demo() -> List[Dict[str, Any]]:
+    history = [
+        {"role": "system", "content": "Sos el asistente de triage de la guardia. " * 60},
+        {"role": "user", "content": "30111222"},
+        {"role": "assistant", "content": "Gracias. ¿Cuál es el motivo de su consulta?"},
+        {"role": "user", "content": "me duele mucho la panza del lado derecho desde ayer a la noche"},
+        {"role": "user", "content": "[Adjunto pdf] " + "Informe de laboratorio: hemograma, glucemia, urea... " * 150},
+    ]
+    for n in range(1, 9):
+        history.append({"role": "assistant", "content": f"{n}/8 - ¿Pregunta médica número {n} sobre el dolor? 📋"})
+        history.append({"role": "user", "content": f"respuesta {n}: " + "tengo náuseas y no pude comer nada " * 3})
+    history.append({"role": "system", "content": "Generá el reporte."})
+    history.append({"role": "assistant", "content": "Reporte\n🟧🟧🟧⬜⬜ Urgencia Estimada Media\n" + "detalle " * 120})
+    return history
+
+
+def _calls(history: List[Dict[str, Any]]) -> Dict[Any, List[tuple]]:
+    """node -> lista de (before_tokens, after_tokens) de las llamadas simuladas."""
+    out: Dict[Any, List[tuple]] = {n: [] for n in NODES}
+
+    def embedded(prefix, node):
+        before = pw.count_tokens(json.dumps(prefix))  # lo que se embebía: json.dumps del historial entero
+        window, _ = pw.build_window(prefix, pw.node_budget(node))
+        return before, pw.count_tokens(json.dumps(window, ensure_ascii=False))  # igual que window_str
+
+    cc = pw._chief_complaint_index(history)
+    if cc is not None:
+        out[201].append(embedded(history[: cc + 1], 201))
+
+    first_q = next((i for i, m in enumerate(history)
+                    if m.get("role") == "assistant" and pw.QUESTION_RE.search(str(m.get("content") or ""))), None)
+    if first_q is not None:
+        for i in range(first_q + 1, len(history)):
+            if history[i].get("role") == "user":
+                out[203].append(embedded(history[: i + 1], 203))
+
+    triage = [m for m in history if not (m.get("role") == "assistant" and "Urgencia Estimada" in str(m.get("content")))]
+    before = sum(pw.message_tokens(m) for m in triage)
+    window, _ = pw.build_window(triage, pw.node_budget(202), keep_system=True)
+    after = sum(pw.message_tokens(m) for m in window)
+    out[202].append((before, after))
+
+    out["digest"].append(embedded(history, "digest"))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", action="append", default=[])
+    parser.add_argument("--from-db", type=int, default=0)
+    parser.add_argument("--demo", action="store_true")
+    args = parser.parse_args()
+
+    sources: List[List[Dict[str, Any]]] = []
+    for path in args.file:
+        sources.extend(_from_file(path))
+    if args.from_db:
+        sources.extend(_from_db(args.from_db))
+    if args.demo or not sources:
+        sources.append(_demo())
+    sources = [h for h in sources if h]
+
+    totals = {n: [0, 0, 0] for n in NODES}  # calls, before, after
+    for history in sources:
+        for node, calls in _calls(history).items():
+            for before, after in calls:
+                totals[node][0] += 1
+                totals[node][1] += before
+                totals[node][2] += after
+
+    enc = "tiktoken" if pw._get_encoding() is not None else "chars/4 (sin tiktoken)"
+    print(f"conversaciones={len(sources)}  conteo={enc}")
+    print(f"{'nodo':<8}{'budget':>8}{'llamadas':>10}{'before':>12}{'after':>12}{'ahorro':>9}")
+    all_b = all_a = 0
+    for node in NODES:
+        calls, before, after = totals[node]
+        all_b += before
+        all_a += after
+        saved = (1 - after / before) * 100 if before else 0.0
+        print(f"{str(node):<8}{pw.node_budget(node) or '-':>8}{calls:>10}{before:>12}{after:>12}{saved:>8.1f}%")
+    saved = (1 - all_a / all_b) * 100 if all_b else 0.0
+    print(f"{'total':<8}{'':>8}{'':>10}{all_b:>12}{all_a:>12}{saved:>8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
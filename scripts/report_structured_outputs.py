@@ -0,0 +1,54 @@
+# scripts/report_structured_outputs.py
+"""
+Reporte: cuántas respuestas del LLM necesitaron reparación, por schema y por modo,
+a partir de los OP_LOG "openai/structured_output" (export de CloudWatch o logs locales).
+
+  mode=text         -> PX_STRUCTURED_OUTPUTS=0 (texto libre + reparaciones, como antes)
+  mode=json_schema  -> PX_STRUCTURED_OUTPUTS=1 (salida con JSON schema strict)
+
+outcome: ok (JSON directo) | repaired (fences / {...}) | retried (hizo falta otra llamada) | failed
+
+Uso:
+    python scripts/report_structured_outputs.py logs.jsonl [otros.jsonl ...]
+    aws logs filter-log-events ... | jq -c '.events[].message | fromjson?' | python scripts/report_structured_outputs.py
+"""
+import json
+import sys
+from collections import Counter, defaultdict
+
+OUTCOMES = ("ok", "repaired", "retried", "failed")
+
+
+def _records(paths):
+    streams = [open(p, encoding="utf-8") for p in paths] if paths else [sys.stdin]
+    for stream in streams:
+        for line in stream:
+            line = line.strip()
+            start = line.find("{")
+            if start == -1:
+                continue
+            try:
+                rec = json.loads(line[start:])
+            except Exception:
+                continue
+            if rec.get("provider") == "openai" and rec.get("operation") == "structured_output":
+                yield rec
+
+
+def main():
+    counts = defaultdict(Counter)  # (schema, mode) -> outcome -> n
+    for rec in _records(sys.argv[1:]):
+        counts[(rec.get("schema"), rec.get("mode"))][rec.get("outcome")] += 1
+
+    if not counts:
+        print("sin registros openai/structured_output")
+        return
+    print(f"{'schema':<20}{'mode':<13}{'calls':>7}" + "".join(f"{o:>10}" for o in OUTCOMES))
+    for (schema, mode), c in sorted(counts.items(), key=lambda kv: (str(kv[0][0]), str(kv[0][1]))):
+        total = sum(c.values())
+        pct = "".join(f"{c[o] / total * 100:>9.1f}%" for o in OUTCOMES)
+        print(f"{str(schema):<20}{str(mode):<13}{total:>7}{pct}")
+
+
+if __name__ == "__main__":
+    main()
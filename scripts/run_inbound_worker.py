@@ -0,0 +1,43 @@
+# scripts/run_inbound_worker.py
+"""
+Worker local del modo ack (app/services/inbound_queue.py): consume la cola y corre cada turno.
+
+Con PX_QUEUE_BACKEND=sqlite el webhook (flask run) y este worker comparten PX_QUEUE_SQLITE_PATH.
+También sirve contra SQS (PX_QUEUE_BACKEND=sqs, PX_QUEUE_URL) fuera de Lambda.
+
+Uso:
+    PX_INGEST_MODE=ack PX_QUEUE_BACKEND=sqlite flask run            # webhook: encola y responde 200
+    PX_QUEUE_BACKEND=sqlite python scripts/run_inbound_worker.py     # worker
+    PX_QUEUE_BACKEND=sqlite python scripts/run_inbound_worker.py --once
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from app.services import inbound_queue, precompute  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="procesa lo que haya y termina")
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--wait", type=float, default=5, help="long polling en segundos")
+    args = parser.parse_args()
+
+    q = inbound_queue.get_queue()
+    print(f"worker: backend={q.name}")
+    try:
+        done = inbound_queue.run_worker(q, max_messages=args.batch, wait_s=args.wait, stop_when_empty=args.once)
+        print(f"worker: {done} mensajes procesados")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        precompute.drain()
+
+
+if __name__ == "__main__":
+    main()
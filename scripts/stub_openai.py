@@ -0,0 +1,102 @@
+# scripts/stub_openai.py
+"""
+Endpoint OpenAI "de juguete" para benchmarks locales (sin llamar a la API real).
+
+- POST /v1/responses devuelve un objeto Response mínimo con output_text = REPLY(payload).
+- handshake_ms simula el costo de abrir una conexión nueva (TCP+TLS a api.openai.com).
+- rtt_ms simula la latencia de cada request (sin contar la generación del modelo).
+- Cada respuesta tiene un id distinto; un previous_response_id que está en EXPIRED devuelve 404
+  (como una respuesta vencida en la API real) para probar el fallback de response_chain.
+Apuntar el SDK con OPENAI_BASE_URL=<base_url>/v1.
+"""
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict
+
+# payload del request -> texto de respuesta del "modelo"
+REPLY: Dict[str, Callable[[Dict[str, Any]], str]] = {"responses": lambda payload: "ok"}
+EXPIRED: set = set()  # previous_response_id que el stub ya "no tiene"
+_ids = itertools.count(1)
+
+
+def _response_body(text: str, model: str) -> Dict[str, Any]:
+    return {
+        "id": f"resp_stub_{next(_ids)}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": "completed",
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+        "output": [{
+            "type": "message",
+            "id": "msg_stub",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    handshake_ms = 0.0
+    rtt_ms = 0.0
+    counters: Dict[str, int] = {"connections": 0, "requests": 0}
+
+    def setup(self):
+        super().setup()
+        type(self).counters["connections"] += 1
+        if self.handshake_ms:
+            time.sleep(self.handshake_ms / 1000.0)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: Any):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        type(self).counters["requests"] += 1
+        if self.rtt_ms:
+            time.sleep(self.rtt_ms / 1000.0)
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        if self.path.rstrip("/").endswith("/responses"):
+            if payload.get("previous_response_id") in EXPIRED:
+                return self._send(404, {"error": {
+                    "message": f"Previous response with id '{payload['previous_response_id']}' not found.",
+                    "type": "invalid_request_error", "param": "previous_response_id",
+                    "code": "previous_response_not_found",
+                }})
+            text = REPLY["responses"](payload)
+            return self._send(200, _response_body(text, payload.get("model") or "stub"))
+        return self._send(404, {"error": {"message": f"stub: {self.path} no implementado"}})
+
+
+def start_stub(handshake_ms: float = 0.0, rtt_ms: float = 0.0, port: int = 0):
+    """
+    Levanta el stub en un thread daemon.
+    Devuelve (server, base_url). Usar OPENAI_BASE_URL=f"{base_url}/v1".
+    """
+    handler = type("StubOpenAIHandler", (_Handler,), {
+        "handshake_ms": handshake_ms,
+        "rtt_ms": rtt_ms,
+        "counters": {"connections": 0, "requests": 0},
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, real_port = server.server_address
+    return server, f"http://{host}:{real_port}"
@@ -0,0 +1,137 @@
+# scripts/stub_postgrest.py
+"""
+Servidor PostgREST "de juguete" para benchmarks locales (sin Supabase real).
+
+- Responde GET /rest/v1/<tabla>?... con filas fijas por tabla.
+- Responde POST/PATCH/DELETE devolviendo el payload como representación.
+- POST /rest/v1/rpc/<fn> se resuelve con los handlers registrados en RPC_HANDLERS.
+- handshake_ms simula el costo de abrir una conexión nueva (TCP+TLS a sa-east-1).
+- rtt_ms simula la latencia de cada request.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+ROWS: Dict[str, List[Dict[str, Any]]] = {
+    "contacts": [{"contact_id": 1, "event_id": 1, "name": "Juan", "phone": "5491100000000",
+                  "national_id": "30111222", "coverage": None, "plan": None, "member_id": None, "token": None}],
+    "events": [{"event_id": 1, "user_id": 1, "name": "Guardia", "start_timestamp": None, "end_timestamp": None,
+                "reporte": "Generá el reporte.", "description": "Sos un asistente de guardia.",
+                "nodo_inicio": 206, "cant_preguntas": 5, "tiempo_sesion": 30, "assistant": "Devolvé JSON."}],
+    "transactions": [{"id": 10, "event_id": 1, "contact_id": 1, "name": "Abierta", "phone": "5491100000000",
+                      "conversation": json.dumps([{"role": "system", "content": "x" * 2000}]),
+                      "timestamp": "2025-01-01 10:00:00.000000", "puntuacion": None, "comentario": None,
+                      "data_created": "2025-01-01 10:00:00.000000", "question_cursor": 1,
+                      "last_question_fingerprint": None, "last_question_sent_at": None}],
+    "messages": [{"message_id": 100, "msg_key": 203, "text": "hola", "phone": "5491100000000",
+                  "question_id": 0, "group_id": 0, "question_name": None, "event_id": 1}],
+    "privacy_consents": [{"id": 1, "contact_id": 1, "phone_hash": "", "dni_hash": "abc",
+                          "privacy_notice_version": "v1.0"}],
+}
+
+# fn_name -> callable(payload_dict) -> respuesta JSON-serializable
+RPC_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive real (si el cliente lo reutiliza)
+    disable_nagle_algorithm = True  # sin esto, Nagle + delayed ACK agregan ~40ms por respuesta
+    handshake_ms = 0.0
+    rtt_ms = 0.0
+    counters: Dict[str, int] = {"connections": 0, "requests": 0}
+
+    def setup(self):
+        super().setup()
+        type(self).counters["connections"] += 1
+        if self.handshake_ms:
+            time.sleep(self.handshake_ms / 1000.0)
+
+    def log_message(self, *args):  # silencio
+        pass
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"null")
+        except Exception:
+            return None
+
+    def _send(self, status: int, body: Any):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _table(self) -> str:
+        path = urlsplit(self.path).path
+        return path.rsplit("/", 1)[-1]
+
+    def _handle(self, method: str):
+        type(self).counters["requests"] += 1
+        if self.rtt_ms:
+            time.sleep(self.rtt_ms / 1000.0)
+        path = urlsplit(self.path).path
+        payload = self._read_json() if method in ("POST", "PATCH") else None
+
+        if "/rpc/" in path:
+            fn = path.rsplit("/", 1)[-1]
+            handler = RPC_HANDLERS.get(fn)
+            if handler is None:
+                return self._send(404, {"code": "PGRST202", "message": f"Could not find the function {fn}"})
+            return self._send(200, handler(payload or {}))
+
+        table = self._table()
+        if method == "GET":
+            return self._send(200, ROWS.get(table, []))
+        if method == "POST":
+            rows = payload if isinstance(payload, list) else [payload or {}]
+            return self._send(201, [dict(r, id=i + 1, message_id=i + 1) for i, r in enumerate(rows)])
+        if method == "PATCH":
+            base = (ROWS.get(table) or [{}])[0]
+            return self._send(200, [dict(base, **(payload or {}))])
+        return self._send(200, ROWS.get(table, [])[:1])
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+def start_stub(handshake_ms: float = 0.0, rtt_ms: float = 0.0, port: int = 0):
+    """
+    Levanta el stub en un thread daemon.
+    Devuelve (server, base_url). base_url es el equivalente a SUPABASE_URL.
+    """
+    handler = type("StubHandler", (_Handler,), {
+        "handshake_ms": handshake_ms,
+        "rtt_ms": rtt_ms,
+        "counters": {"connections": 0, "requests": 0},
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, real_port = server.server_address
+    return server, f"http://{host}:{real_port}"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Percentil por rango más cercano (suficiente para reportar p50/p95)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
@@ -1,5 +1,15 @@
 from app import app
+from app.services import inbound_queue, precompute
 from serverless_wsgi import handle_request
 
 def handler(event, context):
+    # sin drain: la respuesta al webhook no espera trabajo en background (Twilio corta a los 15 s).
+    # El precomputo va a la cola del worker (PX_PRECOMPUTE=queue) y el modo ack usa SQS.
     return handle_request(app, event, context)
+
+
+def worker_handler(event, context):
+    """Worker del modo ack (PX_INGEST_MODE=ack, PX_QUEUE_BACKEND=sqs) y del precomputo: Lambda con trigger SQS."""
+    result = inbound_queue.handle_sqs_event(event)
+    precompute.drain()
+    return result